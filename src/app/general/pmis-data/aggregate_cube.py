@@ -0,0 +1,209 @@
+"""Precomputed (highway, reference marker, year) aggregate cube.
+
+The yearly charts only need additive per-year totals, so the cube stores one
+cell per (highway, begin RM, end RM, year, length band) holding row counts,
+sums and length-weighted sums. A dashboard query is answered by summing the
+matching cells instead of scanning the segment rows.
+
+The length band stands in for TX_LENGTH: displacement filters only compare
+TX_LENGTH against DISPLACEMENT_THRESHOLDS, so each cell keeps a representative
+length that falls on the same side of every threshold as the rows it holds.
+Filters using any other threshold, or a milepoint range, fall back to the
+row-level path.
+
+Float sums are stored as an exact (hi, lo) pair per cell and combined with
+math.fsum, so yearly totals are correctly rounded rather than accumulating the
+rounding error of every partial sum. pandas' row-order Kahan sums are not
+always correctly rounded either, so the two paths can still differ in the
+last bit of a mean.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from filter_index import FilterIndex
+from grouped_stats import grouped_statistics
+
+DISPLACEMENT_THRESHOLDS = (0, 0.5, 0.7)
+
+KEY_COLUMNS = ['TX_SIGNED_HIGHWAY_RDBD_ID', 'TX_BEG_REF_MARKER_NBR', 'TX_END_REF_MARKER_NBR', 'EFF_YEAR']
+SCORE_COLUMNS = ['TX_DISTRESS_SCORE', 'TX_CONDITION_SCORE', 'TX_RIDE_SCORE']
+DISTRESS_COLUMNS = [
+    'TX_CRCP_SPALLED_CRACKS_QTY', 'TX_JCP_PCC_PATCHES_QTY',
+    'TX_CRCP_PUNCHOUT_QTY', 'TX_CRCP_ACP_PATCHES_QTY'
+]
+SUM_COLUMNS = DISTRESS_COLUMNS + ['TX_LENGTH']
+YEARLY_METRICS = (
+    [('mean', column) for column in SCORE_COLUMNS]
+    + [('sum', column) for column in SUM_COLUMNS]
+    + [('per_mile', column) for column in DISTRESS_COLUMNS]
+)
+
+
+def band_lengths(lengths):
+    """Map each length to a representative value of its threshold band.
+
+    Values equal to a threshold keep that threshold; values between two
+    thresholds become their midpoint; values outside the range move one mile
+    past the outermost threshold. NaN stays NaN so it never passes a filter.
+    """
+    thresholds = np.asarray(DISPLACEMENT_THRESHOLDS, dtype=float)
+    edges = np.concatenate([[thresholds[0] - 1], thresholds, [thresholds[-1] + 1]])
+    midpoints = (edges[:-1] + edges[1:]) / 2
+    midpoints[0], midpoints[-1] = edges[0], edges[-1]
+
+    lengths = np.asarray(lengths, dtype=float)
+    i = np.searchsorted(thresholds, lengths, side='left')
+    nearest = thresholds[np.minimum(i, len(thresholds) - 1)]
+    banded = np.where((i < len(thresholds)) & (nearest == lengths), nearest, midpoints[i])
+    return np.where(np.isnan(lengths), np.nan, banded)
+
+
+def compensated_group_sums(group_ids, values, n_groups):
+    """Per-group sums as (hi, lo) pairs with hi + lo equal to the exact sum.
+
+    Rows are folded in with the TwoSum error-free transformation, one rank
+    within the group at a time. NaN is skipped like pandas' sum.
+    """
+    values = np.where(np.isnan(values), 0.0, values)
+    order = np.argsort(group_ids, kind='stable')
+    ids, values = group_ids[order], values[order]
+    rank = np.arange(len(ids)) - np.searchsorted(ids, np.arange(n_groups))[ids]
+
+    hi = np.zeros(n_groups)
+    lo = np.zeros(n_groups)
+    by_rank = np.argsort(rank, kind='stable')
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(rank))])
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        step = by_rank[start:end]
+        g, b = ids[step], values[step]
+        a = hi[g]
+        total = a + b
+        b_virtual = total - a
+        lo[g] += (a - (total - b_virtual)) + (b - b_virtual)
+        hi[g] = total
+    return hi, lo
+
+
+def add_per_mile(bar_data):
+    """Add ``per_mile:<column>`` distress rates to per-year sums; NaN where the length is 0."""
+    length = bar_data['TX_LENGTH']
+    for column in DISTRESS_COLUMNS:
+        bar_data[f'per_mile:{column}'] = (bar_data[column] / length).where(length != 0)
+    return bar_data
+
+
+def yearly_aggregates_from_rows(filtered_df):
+    """Row-level reference path: the per-year frames straight from segment rows."""
+    if filtered_df.empty:
+        return None
+    stats = grouped_statistics(filtered_df, ['EFF_YEAR'], YEARLY_METRICS)
+    stats.columns = [name.split(':', 1)[-1] if name.startswith(('mean:', 'sum:')) else name
+                     for name in stats.columns]
+    yearly_data = stats[['EFF_YEAR', *SCORE_COLUMNS]]
+    bar_data = stats[['EFF_YEAR', *SUM_COLUMNS, *(f'per_mile:{column}' for column in DISTRESS_COLUMNS)]]
+    length_sum = filtered_df['TX_LENGTH'].sum()
+    condition_score = 0 if length_sum == 0 else (
+        (filtered_df['TX_CONDITION_SCORE'] * filtered_df['TX_LENGTH']).sum() / length_sum
+    )
+    return {
+        'rows': len(filtered_df),
+        'yearly_data': yearly_data,
+        'bar_data': bar_data,
+        'condition_score': condition_score,
+    }
+
+
+class AggregateCube:
+    def __init__(self, df):
+        keys = pd.DataFrame({column: df[column] for column in KEY_COLUMNS})
+        keys['TX_LENGTH'] = band_lengths(df['TX_LENGTH'])
+        grouped = keys.groupby(list(keys.columns), sort=False, dropna=False, observed=True)
+        cell_ids = grouped.ngroup().to_numpy()
+        n_cells = grouped.ngroups
+
+        # sort=False numbers groups by first appearance, like ngroup() above
+        cells = grouped.size().reset_index(name='rows')
+        sources = {f'count:{column}': df[column].notna() for column in SCORE_COLUMNS}
+        sources.update({f'sum:{column}': df[column] for column in SCORE_COLUMNS + SUM_COLUMNS})
+        sources['sum:weighted:TX_CONDITION_SCORE'] = df['TX_CONDITION_SCORE'] * df['TX_LENGTH']
+        for name, series in sources.items():
+            if series.dtype.kind == 'f':
+                hi, lo = compensated_group_sums(cell_ids, series.to_numpy(), n_cells)
+                cells[name] = hi
+                cells[name.replace('sum:', 'err:', 1)] = lo
+            else:
+                cells[name] = np.bincount(cell_ids, weights=series.to_numpy(), minlength=n_cells).astype('int64')
+
+        self.cells = cells
+        self.index = FilterIndex(cells)
+        self.year_codes, self.years = pd.factorize(cells['EFF_YEAR'], sort=True)
+        self.arrays = {name: cells[name].to_numpy() for name in cells.columns[len(KEY_COLUMNS) + 1:]}
+
+    def supports(self, filters):
+        if filters.get('rm_range'):
+            return False
+        for key in ('displacement1', 'displacement2'):
+            value = filters.get(key)
+            if value and value != 'all':
+                values = value if isinstance(value, (list, tuple)) else [value]
+                if any(v not in DISPLACEMENT_THRESHOLDS for v in values if v != 'all'):
+                    return False
+        return True
+
+    def _totals(self, name, rows, bounds):
+        """Sum cell column ``name`` over each ``rows[start:end]`` slice in ``bounds``."""
+        values = self.arrays[name][rows]
+        errors = self.arrays.get(name.replace('sum:', 'err:', 1)) if name.startswith('sum:') else None
+        if errors is None:
+            return np.add.reduceat(values, bounds[:-1]) if len(values) else values
+        values, errors = values.tolist(), errors[rows].tolist()
+        return np.array([
+            math.fsum(values[start:end] + errors[start:end])
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ])
+
+    def yearly_aggregates(self, filters):
+        """Per-year frames for ``filters`` from the cube cells.
+
+        Returns the same dict as ``yearly_aggregates_from_rows``, None when
+        no rows match, or NotImplemented when the filter needs raw rows.
+        """
+        if not self.supports(filters):
+            return NotImplemented
+        positions = self.index.query(filters)
+        if len(positions) == 0:
+            return None
+
+        everything = np.array([0, len(positions)])
+        length_sum = self._totals('sum:TX_LENGTH', positions, everything)[0]
+        condition_score = 0 if length_sum == 0 else (
+            self._totals('sum:weighted:TX_CONDITION_SCORE', positions, everything)[0] / length_sum
+        )
+
+        # NaN years have code -1 and are left out, like groupby('EFF_YEAR')
+        codes = self.year_codes[positions]
+        order = np.argsort(codes, kind='stable')
+        rows = positions[order][codes[order] >= 0]
+        year_codes, counts = np.unique(codes[codes >= 0], return_counts=True)
+        bounds = np.concatenate([[0], np.cumsum(counts)])
+        years = self.years[year_codes]
+
+        yearly_data = pd.DataFrame({'EFF_YEAR': years})
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for column in SCORE_COLUMNS:
+                yearly_data[column] = (
+                    self._totals(f'sum:{column}', rows, bounds) / self._totals(f'count:{column}', rows, bounds)
+                )
+        bar_data = pd.DataFrame({'EFF_YEAR': years})
+        for column in SUM_COLUMNS:
+            bar_data[column] = self._totals(f'sum:{column}', rows, bounds)
+        add_per_mile(bar_data)
+
+        return {
+            'rows': int(self.arrays['rows'][positions].sum()),
+            'yearly_data': yearly_data,
+            'bar_data': bar_data,
+            'condition_score': condition_score,
+        }
@@ -1,18 +1,72 @@
-from tempfile import template
 import dash
 import pandas as pd
-import plotly.graph_objects as go
-from dash import Dash, dcc, html, Input, Output, State, callback_context
+from dash import Dash, dcc, html, Input, Output, State, ClientsideFunction, callback_context
 import dash_bootstrap_components as dbc
-from flask import Flask, jsonify
-import io
-from dash_bootstrap_templates import ThemeChangerAIO, template_from_url
+from flask import Flask, Response, jsonify, request, send_file, stream_with_context
+import functools
+import itertools
+import os
+import threading
+from columnar_cache import load_table
+from columnar_store import ColumnarStore
+from column_schema import column_selector, compact_frame, memory_report, parse_keep, release_freed_memory
+from filter_index import FilterIndex
+from highway_ids import highway_categorical
+from data_api import (
+    MAX_AGGREGATE_GROUPS, columnar_json, filters_key, iter_ndjson,
+    page_json, page_positions, parse_aggregate_request, parse_data_request, parse_filters
+)
+from exporter import EXPORT_FORMATS, iter_csv, job_file, job_status, start_export
+from aggregate_cube import AggregateCube, yearly_aggregates_from_rows
+from option_index import OptionIndex
+from rm_intervals import RMIntervalIndex, milepoint
+from result_cache import ResultCache, canonical_selection
+from dataset_registry import DatasetRegistry
+from instrumentation import add_rows, instrument, phase, set_selection
+from figure_updates import apply_update, figure_patch, typed_array
+from grouped_stats import grouped_statistics
+from segment_index import SegmentIndex, check_tile, parse_segment_request
+from deterioration import DeteriorationTable, parse_deterioration_request
+from snapshot import freeze_arrays, frozen_frame
+
+# Every loaded dataset gets a new version so dependent caches can tell them apart
+_dataset_versions = itertools.count(1)
 
 # Data Handling Class
+# A DataHandler is an immutable snapshot of one dataset version: it is frozen
+# at the end of __init__ and then read by request threads without locks (see
+# snapshot.py). Only the lazy _unique_values and _deterioration fields change
+# afterwards.
 class DataHandler:
-    def __init__(self, file_path):
-        self.df = pd.read_csv(file_path)
+    def __init__(self, file_path, use_cache=False, memory_map=False, columns='all'):
+        self.version = next(_dataset_versions)
+        self.file_path = file_path
+        self.use_cache = use_cache
+        # use_cache reads a columnar copy of the CSV; memory_map shares its
+        # numeric columns with other processes mapping it (see columnar_cache.py).
+        # Every column is loaded unless columns narrows it to the ones the
+        # app uses plus those listed, in compact types (see column_schema.py)
+        self.df = load_table(file_path, use_cache=use_cache, memory_map=memory_map,
+                             usecols=column_selector(columns))
         self.validate_columns()
+        self.df = compact_frame(self.df, columns)
+        self.df['TX_SIGNED_HIGHWAY_RDBD_ID'] = highway_categorical(self.df['TX_SIGNED_HIGHWAY_RDBD_ID'])
+        self.df = frozen_frame(self.df)
+        self._unique_values = {}
+        self.rm_intervals = RMIntervalIndex(self.df)
+        self.filter_index = FilterIndex(self.df, intervals=self.rm_intervals)
+        self.cube = AggregateCube(self.df)
+        self.option_index = OptionIndex(self.df)
+        self._deterioration = None
+        self._deterioration_lock = threading.Lock()
+        freeze_arrays((self.rm_intervals, self.filter_index, self.cube, self.option_index))
+        release_freed_memory()
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False) and not name.startswith('_'):
+            raise AttributeError(f"DataHandler snapshots are read-only; load a new dataset instead of setting {name!r}")
+        super().__setattr__(name, value)
 
     def validate_columns(self):
         required_columns = [
@@ -25,44 +79,158 @@ class DataHandler:
         if missing_cols:
             raise ValueError(f"Missing columns: {missing_cols}")
 
+    def __len__(self):
+        return len(self.df)
+
+    def memory_report(self):
+        return memory_report(self.df)
+
     def get_unique_values(self, column):
-        if column == 'TX_SIGNED_HIGHWAY_RDBD_ID':
-            values = self.df[column].unique()
-            def sort_key(x):
-                parts = x.split()
-                prefix = parts[0] if len(parts) > 0 else ""
-                number = float(''.join(c for c in parts[1] if c.isdigit() or c == '.')) if len(parts) > 1 and any(c.isdigit() for c in parts[1]) else 0
-                return (prefix, number)
-            return sorted(values, key=sort_key)
-        return sorted(self.df[column].unique())
+        # Computed once per column; the highway list is the categories of the
+        # natural-order categorical built at load. Two threads may both compute
+        # a missing entry; they store equal tuples.
+        if column not in self._unique_values:
+            values = self.df[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                self._unique_values[column] = tuple(values.cat.categories)
+            else:
+                self._unique_values[column] = tuple(sorted(values.unique()))
+        return self._unique_values[column]
+
+    def filter_positions(self, filters):
+        with phase('filter'):
+            positions = self.filter_index.query(filters)
+        add_rows(len(positions))
+        return positions
 
     def filter_data(self, filters):
-        filtered_df = self.df.copy()
-        for key, value in filters.items():
-            if value and value != 'all':
-                if key == 'year':
-                    filtered_df = filtered_df[filtered_df['EFF_YEAR'].isin(value if isinstance(value, list) else [value])]
-                elif key == 'highway':
-                    filtered_df = filtered_df[filtered_df['TX_SIGNED_HIGHWAY_RDBD_ID'].isin(value if isinstance(value, list) else [value])]
-                elif key == 'begin_rm':
-                    filtered_df = filtered_df[filtered_df['TX_BEG_REF_MARKER_NBR'].isin(value)]
-                elif key == 'end_rm':
-                    filtered_df = filtered_df[filtered_df['TX_END_REF_MARKER_NBR'].isin(value)]
-                elif key == 'displacement1':
-                    min_disp = min(v for v in value if v != 'all')
-                    filtered_df = filtered_df[filtered_df['TX_LENGTH'] >= min_disp]
-                elif key == 'displacement2':
-                    max_disp = max(v for v in value if v != 'all')
-                    filtered_df = filtered_df[filtered_df['TX_LENGTH'] <= max_disp]
-        return filtered_df
+        return self.df.take(self.filter_positions(filters))
+
+    def range_positions(self, highway, start_rm, start_disp, end_rm, end_disp):
+        # Segments of highway overlapping RM start_rm+start_disp to RM end_rm+end_disp
+        start = milepoint(start_rm, start_disp)
+        end = milepoint(end_rm, end_disp)
+        return self.rm_intervals.query([highway] if highway else [], start, end)
+
+    def range_query(self, highway, start_rm, start_disp, end_rm, end_disp):
+        return self.df.take(self.range_positions(highway, start_rm, start_disp, end_rm, end_disp))
+
+    def range_markers(self, highway):
+        return self.rm_intervals.markers(highway)
+
+    def filter_options(self, filters):
+        # Begin/end RM option lists from the option index; filters it cannot
+        # express scan the rows
+        with phase('filter'):
+            result = self.option_index.options(filters)
+        if result is NotImplemented:
+            filtered_df = self.filter_data(filters)
+            result = (sorted(filtered_df['TX_BEG_REF_MARKER_NBR'].unique()),
+                      sorted(filtered_df['TX_END_REF_MARKER_NBR'].unique()))
+        return result
 
     def calculate_condition_score(self, filtered_df):
         if filtered_df.empty or filtered_df['TX_LENGTH'].sum() == 0:
             return 0
         return (filtered_df['TX_CONDITION_SCORE'] * filtered_df['TX_LENGTH']).sum() / filtered_df['TX_LENGTH'].sum()
 
-# Initialize data handler
-data_handler = DataHandler("/Users/amauriribeiro/RPDBA/public/files/Concrete_distressesPmis.csv")
+    def aggregate(self, filters, group_by, metrics):
+        # Grouped means, weighted means, percentiles, sums and per-mile rates
+        # from one grouping of the filtered rows (see grouped_stats.py)
+        columns = list(dict.fromkeys([*group_by, *(column for _, column in metrics), 'TX_LENGTH']))
+        positions = self.filter_positions(filters)
+        with phase('aggregate'):
+            frame = self.df.iloc[positions, self.df.columns.get_indexer(columns)]
+            return grouped_statistics(frame, group_by, metrics)
+
+    def yearly_aggregates(self, filters):
+        # Served from the aggregate cube; filters it cannot express scan the rows
+        with phase('aggregate'):
+            result = self.cube.yearly_aggregates(filters)
+            if result is NotImplemented:
+                return yearly_aggregates_from_rows(self.filter_data(filters))
+        add_rows(result['rows'] if result else 0)
+        return result
+
+    def deterioration(self):
+        # Per-segment rate table, built on first use; with the data cache on
+        # it is read from (or written to) .pmis-cache (see deterioration.py)
+        with self._deterioration_lock:
+            if self._deterioration is None:
+                table = DeteriorationTable.for_source(self.file_path, self.df, use_cache=self.use_cache)
+                freeze_arrays(table)
+                self._deterioration = table
+        return self._deterioration
+
+# Dataset location and reload settings come from the environment
+DEFAULT_DATA_PATH = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', '..',
+    'public', 'files', 'Concrete_distressesPmis.csv'
+))
+DATA_PATH = os.environ.get('PMIS_DATA_PATH', DEFAULT_DATA_PATH)
+USE_DATA_CACHE = os.environ.get('PMIS_DATA_CACHE') == '1'
+SHARED_DATA = os.environ.get('PMIS_SHARED_DATA') == '1'
+RELOAD_INTERVAL = float(os.environ.get('PMIS_RELOAD_INTERVAL', 0))
+GEOJSON_DIR = os.environ.get('PMIS_GEOJSON_DIR', os.path.dirname(DEFAULT_DATA_PATH))
+# columns to load: 'all' (the default), or 'schema' and/or comma-separated
+# names for only the ones the app uses plus those
+LOAD_COLUMNS = parse_keep(os.environ.get('PMIS_COLUMNS'))
+# 'memory' (DataHandler) or 'store', the out-of-core Parquet store in
+# columnar_store.py for tables too large to load
+BACKEND = os.environ.get('PMIS_BACKEND', 'memory')
+if BACKEND not in ('memory', 'store'):
+    raise ValueError(f"PMIS_BACKEND must be 'memory' or 'store', not {BACKEND!r}")
+
+def load_dataset(path):
+    if BACKEND == 'store':
+        return ColumnarStore.for_source(path, version=next(_dataset_versions))
+    return DataHandler(path, use_cache=USE_DATA_CACHE or SHARED_DATA, memory_map=SHARED_DATA, columns=LOAD_COLUMNS)
+
+def request_frame(handler):
+    # Request parameters are checked against these columns and dtypes
+    return handler.empty_frame() if isinstance(handler, ColumnarStore) else handler.df
+
+def table_unavailable(handler, feature):
+    # The store keeps no table in memory to page, export or profile; the
+    # routes that need one answer 501 instead
+    if isinstance(handler, ColumnarStore):
+        return jsonify({'error': f"{feature} needs the in-memory dataset and is not available with PMIS_BACKEND=store"}), 501
+    return None
+
+# Initialize the dataset; callbacks read dataset.current() once per request
+dataset = DatasetRegistry(DATA_PATH, load_dataset)
+if RELOAD_INTERVAL > 0:
+    dataset.start_watching(RELOAD_INTERVAL)
+
+# Memoized chart/summary results, keyed by the canonical filter selection
+result_cache = ResultCache(max_entries=int(os.environ.get('PMIS_RESULT_CACHE_SIZE', 256)))
+# Serialized /api/aggregate responses, keyed by filters, group keys and metrics
+aggregate_cache = ResultCache(max_entries=int(os.environ.get('PMIS_AGGREGATE_CACHE_SIZE', 256)))
+
+# GeoJSON layers behind /api/segments, indexed on first use; the files do not
+# change while the server runs, so the tile cache stays at version 0
+segment_index = SegmentIndex(GEOJSON_DIR)
+tile_cache = ResultCache(max_entries=int(os.environ.get('PMIS_TILE_CACHE_SIZE', 1024)))
+
+# Highway selected when the page loads
+DEFAULT_HIGHWAY = os.environ.get('PMIS_DEFAULT_HIGHWAY', 'IH0040 L')
+
+# Long RM lists are sent a page at a time; "Show more" adds the next page
+RM_OPTION_PAGE_SIZE = int(os.environ.get('PMIS_RM_OPTION_PAGE_SIZE', 500))
+
+def page_rm_values(values, selected=(), more_clicks=None):
+    # Returns the values to list (selected ones always included) and the
+    # style of the list's "Show more" button
+    limit = RM_OPTION_PAGE_SIZE * (1 + (more_clicks or 0))
+    if len(values) <= limit:
+        return list(values), {'display': 'none'}
+    selected = set(selected or [])
+    return [v for i, v in enumerate(values) if i < limit or v in selected], {'display': 'block'}
+
+def default_highway(handler):
+    # The highway selected on page load; the first one when the dataset lacks it
+    highways = handler.get_unique_values('TX_SIGNED_HIGHWAY_RDBD_ID')
+    return DEFAULT_HIGHWAY if DEFAULT_HIGHWAY in highways or not highways else highways[0]
 
 # Initialize Flask server
 server = Flask(__name__)
@@ -76,6 +244,9 @@ app = Dash(__name__,
           external_stylesheets=[dbc.themes.BOOTSTRAP, dbc.icons.FONT_AWESOME, dbc_css],
           suppress_callback_exceptions=True)  # Add this line
 
+# Latency, payload and row histograms per route and callback at /metrics
+instrument(server, app)
+
 def create_dropdown(id, options, placeholder, multi=True, value=None):
     return dcc.Dropdown(
         id=id,
@@ -88,338 +259,500 @@ def create_dropdown(id, options, placeholder, multi=True, value=None):
         style={'minWidth': '200px'}
     )
 
-# filter_controls definition to include the checklist containers
-filter_controls = dbc.Card([
-    dbc.Row([
-        # Highway dropdown 
-        dbc.Col([
-            html.Div("Highway", style={'marginBottom': '10px'}),
-            create_dropdown(
-                id='highway-filter',
-                options=[{'label': str(val), 'value': val} for val in data_handler.get_unique_values('TX_SIGNED_HIGHWAY_RDBD_ID')],
-                placeholder="Select Highway",
-                multi=False,
-                value="IH0040 L"
-            )
-        ], width=2),
-        #  Begin RM section
-        dbc.Col([
-            html.Div([
-                html.Div([  # Added container for label and button
-                    dbc.Label("Begin RM", className="mb-2 d-block"),  # Added d-block to ensure label is on its own line
-                    html.Div([  # Container for buttons
-                        dbc.Button(
-                            "Show/Hide Values",
-                            id="begin-rm-collapse-button",
-                            color="secondary",
-                            size="sm",
-                            className="me-1",  # Add margin to separate buttons
-                        ),
-                        dbc.Button(
-                            html.I(className="fas fa-times", style={'color': '#6c757d'}),  # Grey color
-                            id="begin-rm-clear-button",
-                            color="light",  # Changed from danger to light
-                            size="sm",
-                            className="px-2",  # Add padding for better icon display
-                        ),
-                    ], className="d-flex"),  # Use flex to align buttons
-                ]),
-                dbc.Collapse(
-                    html.Div(
-                        dcc.Checklist(
-                            id='begin-rm-filter',
-                            options=[
-                                {'label': 'Select All', 'value': 'all'},  # Add Select All option
-                                *[{'label': f'RM {str(val)}', 'value': val}
-                                  for val in sorted(data_handler.get_unique_values('TX_BEG_REF_MARKER_NBR'))]
-                            ],
-                            value=[],
-                            className='dbc',
-                            inputStyle={'marginRight': '5px'},
-                            labelStyle={'display': 'block', 'padding': '2px 0'}
+# Filter controls for the first paint: the highway list and the default
+# highway's RM options, the same lists update_filters sends for it
+def filter_controls(handler):
+    highway = default_highway(handler)
+    begin_values, end_values = handler.filter_options({'highway': [highway]})
+    range_options = [{'label': str(val), 'value': val} for val in handler.range_markers(highway)]
+    return dbc.Card([
+        dbc.Row([
+            # Highway dropdown 
+            dbc.Col([
+                html.Div("Highway", style={'marginBottom': '10px'}),
+                create_dropdown(
+                    id='highway-filter',
+                    options=[{'label': str(val), 'value': val} for val in handler.get_unique_values('TX_SIGNED_HIGHWAY_RDBD_ID')],
+                    placeholder="Select Highway",
+                    multi=False,
+                    value=highway
+                )
+            ], width=2),
+            #  Begin RM section
+            dbc.Col([
+                html.Div([
+                    html.Div([  # Added container for label and button
+                        dbc.Label("Begin RM", className="mb-2 d-block"),  # Added d-block to ensure label is on its own line
+                        html.Div([  # Container for buttons
+                            dbc.Button(
+                                "Show/Hide Values",
+                                id="begin-rm-collapse-button",
+                                color="secondary",
+                                size="sm",
+                                className="me-1",  # Add margin to separate buttons
+                            ),
+                            dbc.Button(
+                                html.I(className="fas fa-times", style={'color': '#6c757d'}),  # Grey color
+                                id="begin-rm-clear-button",
+                                color="light",  # Changed from danger to light
+                                size="sm",
+                                className="px-2",  # Add padding for better icon display
+                            ),
+                        ], className="d-flex"),  # Use flex to align buttons
+                    ]),
+                    dbc.Collapse(
+                        html.Div([
+                            dcc.Checklist(
+                                id='begin-rm-filter',
+                                options=[
+                                    {'label': 'Select All', 'value': 'all'},  # Add Select All option
+                                    *[{'label': f'RM {str(val)}', 'value': val}
+                                      for val in page_rm_values(begin_values)[0]]
+                                ],
+                                value=[],
+                                className='dbc',
+                                inputStyle={'marginRight': '5px'},
+                                labelStyle={'display': 'block', 'padding': '2px 0'}
+                            ),
+                            dbc.Button("Show more", id="begin-rm-more", color="link", size="sm", className="p-0",
+                                       style=page_rm_values(begin_values)[1])
+                        ],
+                            id="begin-rm-container",  # Add ID for mouse events
+                            style={
+                                'position': 'absolute',  # Add absolute positioning
+                                'zIndex': '1000',        # Ensure it appears on top
+                                'maxHeight': '300px',    # Increased max height
+                                'overflowY': 'auto',
+                                'overflowX': 'hidden',
+                                'width': '200px',        # Fixed width
+                                'border': '1px solid #e0e0e0',
+                                'borderRadius': '4px',
+                                'padding': '8px',
+                                'backgroundColor': 'white',
+                                'boxShadow': '0 4px 8px rgba(0,0,0,0.1)',
+                                'marginTop': '5px'       # Space below button
+                            }
                         ),
-                        id="begin-rm-container",  # Add ID for mouse events
-                        style={
-                            'position': 'absolute',  # Add absolute positioning
-                            'zIndex': '1000',        # Ensure it appears on top
-                            'maxHeight': '300px',    # Increased max height
-                            'overflowY': 'auto',
-                            'overflowX': 'hidden',
-                            'width': '200px',        # Fixed width
-                            'border': '1px solid #e0e0e0',
-                            'borderRadius': '4px',
-                            'padding': '8px',
-                            'backgroundColor': 'white',
-                            'boxShadow': '0 4px 8px rgba(0,0,0,0.1)',
-                            'marginTop': '5px'       # Space below button
-                        }
+                        id="begin-rm-collapse",
+                        is_open=False,
                     ),
-                    id="begin-rm-collapse",
-                    is_open=False,
-                ),
-            ], className="dbc", style={'position': 'relative'}, id="begin-rm-wrapper")  # Added relative positioning to container
-        ], width=2),
-        # Updated Beg Displacement section
-        dbc.Col([
-            html.Div([
+                ], className="dbc", style={'position': 'relative'}, id="begin-rm-wrapper")  # Added relative positioning to container
+            ], width=2),
+            # Updated Beg Displacement section
+            dbc.Col([
                 html.Div([
-                    dbc.Label("Beg Displacement", className="mb-2 d-block"),
                     html.Div([
-                        dbc.Button(
-                            "Show/Hide Values",
-                            id="displacement1-collapse-button",
-                            color="secondary",
-                            size="sm",
-                            className="me-1",
+                        dbc.Label("Beg Displacement", className="mb-2 d-block"),
+                        html.Div([
+                            dbc.Button(
+                                "Show/Hide Values",
+                                id="displacement1-collapse-button",
+                                color="secondary",
+                                size="sm",
+                                className="me-1",
+                            ),
+                            dbc.Button(
+                                html.I(className="fas fa-times", style={'color': '#6c757d'}),  # Grey color
+                                id="displacement1-clear-button",
+                                color="light",  # Changed to light
+                                size="sm",
+                                className="px-2",
+                            ),
+                        ], className="d-flex"),
+                    ]),
+                    dbc.Collapse(
+                        html.Div(
+                            dcc.Checklist(
+                                id='displacement1-filter',
+                                options=[
+                                    {'label': 'No Displacement (0)', 'value': 0},
+                                    {'label': 'Half Mile (0.5)', 'value': 0.5},
+                                    {'label': 'Point Seven (0.7)', 'value': 0.7}
+                                ],
+                                value=[],
+                                className='dbc',
+                                inputStyle={'marginRight': '5px'},
+                                labelStyle={'display': 'block', 'padding': '2px 0'}
+                            ),
+                            style={
+                                'position': 'absolute',  # Add absolute positioning
+                                'zIndex': '1000',        # Ensure it appears on top
+                                'maxHeight': '300px',    # Increased max height
+                                'overflowY': 'auto',
+                                'overflowX': 'hidden',
+                                'width': '200px',        # Fixed width
+                                'border': '1px solid #e0e0e0',
+                                'borderRadius': '4px',
+                                'padding': '8px',
+                                'backgroundColor': 'white',
+                                'boxShadow': '0 4px 8px rgba(0,0,0,0.1)',
+                                'marginTop': '5px'       # Space below button
+                            }
                         ),
-                        dbc.Button(
-                            html.I(className="fas fa-times", style={'color': '#6c757d'}),  # Grey color
-                            id="displacement1-clear-button",
-                            color="light",  # Changed to light
-                            size="sm",
-                            className="px-2",
-                        ),
-                    ], className="d-flex"),
-                ]),
-                dbc.Collapse(
-                    html.Div(
-                        dcc.Checklist(
-                            id='displacement1-filter',
-                            options=[
-                                {'label': 'No Displacement (0)', 'value': 0},
-                                {'label': 'Half Mile (0.5)', 'value': 0.5},
-                                {'label': 'Point Seven (0.7)', 'value': 0.7}
-                            ],
-                            value=[],
-                            className='dbc',
-                            inputStyle={'marginRight': '5px'},
-                            labelStyle={'display': 'block', 'padding': '2px 0'}
-                        ),
-                        style={
-                            'position': 'absolute',  # Add absolute positioning
-                            'zIndex': '1000',        # Ensure it appears on top
-                            'maxHeight': '300px',    # Increased max height
-                            'overflowY': 'auto',
-                            'overflowX': 'hidden',
-                            'width': '200px',        # Fixed width
-                            'border': '1px solid #e0e0e0',
-                            'borderRadius': '4px',
-                            'padding': '8px',
-                            'backgroundColor': 'white',
-                            'boxShadow': '0 4px 8px rgba(0,0,0,0.1)',
-                            'marginTop': '5px'       # Space below button
-                        }
+                        id="displacement1-collapse",
+                        is_open=False,
                     ),
-                    id="displacement1-collapse",
-                    is_open=False,
-                ),
-            ], className="dbc", style={'position': 'relative'})  # Add relative positioning to container
-        ], width=2),
+                ], className="dbc", style={'position': 'relative'})  # Add relative positioning to container
+            ], width=2),
 
-        # Updated End RM section
-        dbc.Col([
-            html.Div([
+            # Updated End RM section
+            dbc.Col([
                 html.Div([
-                    dbc.Label("End RM", className="mb-2 d-block"),
                     html.Div([
-                        dbc.Button(
-                            "Show/Hide Values",
-                            id="end-rm-collapse-button",
-                            color="secondary",
-                            size="sm",
-                            className="me-1",
+                        dbc.Label("End RM", className="mb-2 d-block"),
+                        html.Div([
+                            dbc.Button(
+                                "Show/Hide Values",
+                                id="end-rm-collapse-button",
+                                color="secondary",
+                                size="sm",
+                                className="me-1",
+                            ),
+                            dbc.Button(
+                                html.I(className="fas fa-times", style={'color': '#6c757d'}),  # Grey color
+                                id="end-rm-clear-button",
+                                color="light",  # Changed to light
+                                size="sm",
+                                className="px-2",
+                            ),
+                        ], className="d-flex"),
+                    ]),
+                    dbc.Collapse(
+                        html.Div([
+                            dcc.Checklist(
+                                id='end-rm-filter',
+                                options=[{'label': f'RM {str(val)}', 'value': val}
+                                        for val in page_rm_values(end_values)[0]],
+                                value=[],
+                                className='dbc',
+                                inputStyle={'marginRight': '5px'},
+                                labelStyle={'display': 'block', 'padding': '2px 0'}
+                            ),
+                            dbc.Button("Show more", id="end-rm-more", color="link", size="sm", className="p-0",
+                                       style=page_rm_values(end_values)[1])
+                        ],
+                            style={
+                                'position': 'absolute',
+                                'zIndex': '1000',
+                                'maxHeight': '300px',
+                                'overflowY': 'auto',
+                                'width': '200px',
+                                'border': '1px solid #e0e0e0',
+                                'borderRadius': '4px',
+                                'padding': '8px',
+                                'backgroundColor': 'white',
+                                'boxShadow': '0 4px 8px rgba(0,0,0,0.1)',
+                                'marginTop': '5px'
+                            }
                         ),
-                        dbc.Button(
-                            html.I(className="fas fa-times", style={'color': '#6c757d'}),  # Grey color
-                            id="end-rm-clear-button",
-                            color="light",  # Changed to light
-                            size="sm",
-                            className="px-2",
-                        ),
-                    ], className="d-flex"),
-                ]),
-                dbc.Collapse(
-                    html.Div(
-                        dcc.Checklist(
-                            id='end-rm-filter',
-                            options=[{'label': f'RM {str(val)}', 'value': val}
-                                    for val in sorted(data_handler.get_unique_values('TX_END_REF_MARKER_NBR'))],
-                            value=[],
-                            className='dbc',
-                            inputStyle={'marginRight': '5px'},
-                            labelStyle={'display': 'block', 'padding': '2px 0'}
-                        ),
-                        style={
-                            'position': 'absolute',
-                            'zIndex': '1000',
-                            'maxHeight': '300px',
-                            'overflowY': 'auto',
-                            'width': '200px',
-                            'border': '1px solid #e0e0e0',
-                            'borderRadius': '4px',
-                            'padding': '8px',
-                            'backgroundColor': 'white',
-                            'boxShadow': '0 4px 8px rgba(0,0,0,0.1)',
-                            'marginTop': '5px'
-                        }
+                        id="end-rm-collapse",
+                        is_open=False,
                     ),
-                    id="end-rm-collapse",
-                    is_open=False,
-                ),
-            ], className="dbc", style={'position': 'relative'})
-        ], width=2),
+                ], className="dbc", style={'position': 'relative'})
+            ], width=2),
 
-        # Updated End Displacement section
-        dbc.Col([
-            html.Div([
+            # Updated End Displacement section
+            dbc.Col([
                 html.Div([
-                    dbc.Label("End Displacement", className="mb-2 d-block"),
                     html.Div([
-                        dbc.Button(
-                            "Show/Hide Values",
-                            id="displacement2-collapse-button",
-                            color="secondary",
-                            size="sm",
-                            className="me-1",
+                        dbc.Label("End Displacement", className="mb-2 d-block"),
+                        html.Div([
+                            dbc.Button(
+                                "Show/Hide Values",
+                                id="displacement2-collapse-button",
+                                color="secondary",
+                                size="sm",
+                                className="me-1",
+                            ),
+                            dbc.Button(
+                                html.I(className="fas fa-times", style={'color': '#6c757d'}),  # Grey color
+                                id="displacement2-clear-button",
+                                color="light",  # Changed to light
+                                size="sm",
+                                className="px-2",
+                            ),
+                        ], className="d-flex"),
+                    ]),
+                    dbc.Collapse(
+                        html.Div(
+                            dcc.Checklist(
+                                id='displacement2-filter',
+                                options=[
+                                    {'label': 'No Displacement (0)', 'value': 0},
+                                    {'label': 'Half Mile (0.5)', 'value': 0.5},
+                                    {'label': 'Point Seven (0.7)', 'value': 0.7}
+                                ],
+                                value=[],
+                                className='dbc',
+                                inputStyle={'marginRight': '5px'},
+                                labelStyle={'display': 'block', 'padding': '2px 0'}
+                            ),
+                            style={
+                                'position': 'absolute',  
+                                'zIndex': '1000',        
+                                'maxHeight': '300px',    
+                                'overflowY': 'auto',
+                                'overflowX': 'hidden',
+                                'width': '200px',        # Fixed width
+                                'border': '1px solid #e0e0e0',
+                                'borderRadius': '4px',
+                                'padding': '8px',
+                                'backgroundColor': 'white',
+                                'boxShadow': '0 4px 8px rgba(0,0,0,0.1)',
+                                'marginTop': '5px'       # Space below button
+                            }
                         ),
-                        dbc.Button(
-                            html.I(className="fas fa-times", style={'color': '#6c757d'}),  # Grey color
-                            id="displacement2-clear-button",
-                            color="light",  # Changed to light
-                            size="sm",
-                            className="px-2",
-                        ),
-                    ], className="d-flex"),
-                ]),
-                dbc.Collapse(
-                    html.Div(
-                        dcc.Checklist(
-                            id='displacement2-filter',
-                            options=[
-                                {'label': 'No Displacement (0)', 'value': 0},
-                                {'label': 'Half Mile (0.5)', 'value': 0.5},
-                                {'label': 'Point Seven (0.7)', 'value': 0.7}
-                            ],
-                            value=[],
-                            className='dbc',
-                            inputStyle={'marginRight': '5px'},
-                            labelStyle={'display': 'block', 'padding': '2px 0'}
-                        ),
-                        style={
-                            'position': 'absolute',  
-                            'zIndex': '1000',        
-                            'maxHeight': '300px',    
-                            'overflowY': 'auto',
-                            'overflowX': 'hidden',
-                            'width': '200px',        # Fixed width
-                            'border': '1px solid #e0e0e0',
-                            'borderRadius': '4px',
-                            'padding': '8px',
-                            'backgroundColor': 'white',
-                            'boxShadow': '0 4px 8px rgba(0,0,0,0.1)',
-                            'marginTop': '5px'       # Space below button
-                        }
+                        id="displacement2-collapse",
+                        is_open=False,
                     ),
-                    id="displacement2-collapse",
-                    is_open=False,
-                ),
-            ], className="dbc", style={'position': 'relative'})  # Added relative positioning to container
-        ], width=2),
-    ]),
+                ], className="dbc", style={'position': 'relative'})  # Added relative positioning to container
+            ], width=2),
+        ]),
+
+        # Milepoint range, answered by the RM interval index
+        dbc.Row([
+            dbc.Col(html.Div("Milepoint Range"), width=2, className="d-flex align-items-center"),
+            dbc.Col(create_dropdown(id='range-from-rm', options=range_options, placeholder="From RM", multi=False), width=2),
+            dbc.Col(dbc.Input(id='range-from-disp', type='number', min=0, step=0.001, value=0, placeholder="+ displacement"), width=2),
+            dbc.Col(create_dropdown(id='range-to-rm', options=range_options, placeholder="To RM", multi=False), width=2),
+            dbc.Col(dbc.Input(id='range-to-disp', type='number', min=0, step=0.001, value=0, placeholder="+ displacement"), width=2),
+        ], className="mt-3"),
  
-    dbc.Row([
-        dbc.Col([
-            dbc.Button("Apply Filters", id="apply-filter", color="primary", className="me-2"),
-            dbc.Button("Export Data", id="export-btn", color="success", className="me-2"),
-            dcc.Download(id="download-data")
-        ], width=12, className="text-center mt-3")
-    ])
-], body=True)
-
-# App layout
-app.layout = dbc.Container([
-    dbc.Row(dbc.Col(html.H1("PMIS Data Analysis Dashboard"), className="text-center mb-4")),
-    dbc.Row(dbc.Col(filter_controls)),
-    dbc.Row(dbc.Col(
-        html.Div(
-            id='title-div',
-            className="text-center mb-3",
-            style={
-                'backgroundColor': 'black',
-                'color': 'white',
-                'padding': '10px',
-                'borderRadius': '5px',
-                'opacity': '0.8',
-                'fontSize': '16px',
-                'fontWeight': 'bold'
-            }
-        )
-    )),
-    # Key Insights and Summary cards
-    dbc.Row([
-        dbc.Col(
-            dbc.Card(
-                dbc.CardBody([
-                    html.H4("Key Insights", className="card-title", 
-                           style={'color': '#2c3e50', 'borderBottom': '2px solid #3498db', 'paddingBottom': '10px'}),
-                    html.P(
-                        id='key-insights', 
-                        className="card-text animated fadeIn",
-                        style={
-                            'whiteSpace': 'pre-wrap',
-                            'fontSize': '13px',
-                            'padding': '12px',
-                            'backgroundColor': '#f8f9fa',
-                            'borderLeft': '4px solid #3498db',
-                            'marginTop': '10px',
-                            'lineHeight': '1.6'
-                        }
-                    )
-                ]),
-                className="mt-4",
-                style={'border': '1px solid #e0e0e0'}
-            ), width=8
-        ),
-        dbc.Col(
-            dbc.Card(
-                dbc.CardBody([
-                    html.H4("Summary", className="card-title",
-                           style={'color': '#2c3e50', 'borderBottom': '2px solid #3498db', 'paddingBottom': '10px'}),
-                    html.P(
-                        id='summary', 
-                        className="card-text animated fadeIn",
-                        style={
-                            'whiteSpace': 'pre-wrap',
-                            'fontSize': '13px',
-                            'padding': '12px',
-                            'backgroundColor': '#f8f9fa',
-                            'borderLeft': '4px solid #3498db',
-                            'marginTop': '10px',
-                            'lineHeight': '1.0'
-                        }
-                    )
-                ]),
-                className="mt-4",
-                style={'border': '1px solid #e0e0e0'}
-            ), width=4
-        )
-    ]),
-    dbc.Row(dbc.Col(dcc.Graph(id='line-chart'))),
-    dbc.Row(dbc.Col(dcc.Graph(id='bar-chart')))
-], fluid=True, className="dbc")
+        dbc.Row([
+            dbc.Col([
+                dbc.Button("Apply Filters", id="apply-filter", color="primary", className="me-2"),
+                dcc.Dropdown(
+                    id='export-format',
+                    options=[
+                        {'label': 'CSV', 'value': 'csv'},
+                        {'label': 'CSV (gzip)', 'value': 'csv.gz'},
+                        {'label': 'Parquet', 'value': 'parquet'},
+                        {'label': 'Excel', 'value': 'xlsx'}
+                    ],
+                    value='csv',
+                    clearable=False,
+                    searchable=False,
+                    className='me-2',
+                    style={'width': '140px', 'display': 'inline-block', 'verticalAlign': 'middle', 'textAlign': 'left'}
+                ),
+                dbc.Button("Export Data", id="export-btn", color="success", className="me-2"),
+                dcc.Store(id='export-job'),
+                dcc.Interval(id='export-poll', interval=500, disabled=True),
+                html.Div(id='export-status', className="mt-2", style={'maxWidth': '400px', 'margin': '0 auto'})
+            ], width=12, className="text-center mt-3")
+        ])
+    ], body=True)
+
+# The charts' traces, axes and legends never change; they go out once with the
+# page and each Apply patches in the yearly arrays, ticks and axis ranges
+# (see figure_updates.py)
+LINE_TRACES = [
+    ('TX_DISTRESS_SCORE', 'Distress Score', 'blue', 'y'),
+    ('TX_CONDITION_SCORE', 'Condition Score', 'green', 'y'),
+    ('TX_RIDE_SCORE', 'Ride Score', 'red', 'y2'),
+]
+BAR_TRACES = [
+    ('per_mile:TX_CRCP_ACP_PATCHES_QTY', 'ACP Patches', 'green'),
+    ('per_mile:TX_JCP_PCC_PATCHES_QTY', 'PCC Patches', 'blue'),
+    ('per_mile:TX_CRCP_SPALLED_CRACKS_QTY', 'Spalled Cracks', 'orange'),
+    ('per_mile:TX_CRCP_PUNCHOUT_QTY', 'Punchouts', 'red'),
+]
+
+def line_chart_figure():
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    for _, name, color, yaxis in LINE_TRACES:
+        fig.add_trace(go.Scatter(x=[], y=[], name=name, mode='lines+markers', line=dict(color=color), yaxis=yaxis))
+    fig.update_layout(
+        xaxis=dict(title='Year', tickmode='array', tickangle=-45, showgrid=True),
+        yaxis=dict(title=dict(text='Distress & Condition Scores', font=dict(color='black')), side='left', showgrid=True, tickformat=',.0f'),
+        yaxis2=dict(title=dict(text='Ride Score', font=dict(color='black')), side='right', overlaying='y', tickformat='.1f', showgrid=False),
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1, bgcolor='rgba(255,255,255,0.5)'),
+        height=600,
+        hovermode='x unified',
+        hoverlabel=dict(bgcolor='white', font_size=12, font_family='Arial')
+    )
+    return fig
+
+def bar_chart_figure():
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    for _, name, color in BAR_TRACES:
+        fig.add_trace(go.Bar(x=[], y=[], name=name, marker_color=color))
+    fig.update_layout(
+        xaxis=dict(title='Year', tickmode='array', tickangle=-45, showgrid=True),
+        yaxis=dict(title='Distress per Mile'),
+        barmode='group',
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1, bgcolor='rgba(255,255,255,0.5)'),
+        height=600,
+        bargap=0.15,
+        hovermode='x unified',
+        hoverlabel=dict(bgcolor='white', font_size=12, font_family='Arial')
+    )
+    return fig
+
+# Built on first use rather than at import: validating the two figures is
+# the slowest part of importing plotly.graph_objects
+@functools.lru_cache(maxsize=None)
+def static_figures():
+    return line_chart_figure().to_dict(), bar_chart_figure().to_dict()
+
+def _year_ticks(years):
+    years = [int(year) for year in sorted(years.unique())]
+    return {'visible': True, 'tickvals': years, 'ticktext': years}
+
+def line_chart_update(yearly_data):
+    years = typed_array(yearly_data['EFF_YEAR'])
+    max_distress_score = yearly_data['TX_DISTRESS_SCORE'].max()
+    max_condition_score = yearly_data['TX_CONDITION_SCORE'].max()
+    max_ride_score = yearly_data['TX_RIDE_SCORE'].max()
+    return {
+        'data': [{'x': years, 'y': typed_array(yearly_data[column])} for column, _, _, _ in LINE_TRACES],
+        'layout': {
+            'xaxis': _year_ticks(yearly_data['EFF_YEAR']),
+            'yaxis': {'visible': True, 'range': [0, float(max(100, max(max_distress_score, max_condition_score) + 10))]},
+            'yaxis2': {'visible': True, 'range': [0, float(max(5, max_ride_score + 1))]},
+            'annotations': [],
+            'showlegend': True,
+        }
+    }
+
+def bar_chart_update(bar_data):
+    years = typed_array(bar_data['EFF_YEAR'])
+    max_y_value = max(bar_data[column].max() for column, _, _ in BAR_TRACES)
+    return {
+        'data': [{'x': years, 'y': typed_array(bar_data[column])} for column, _, _ in BAR_TRACES],
+        'layout': {
+            'xaxis': _year_ticks(bar_data['EFF_YEAR']),
+            'yaxis': {'visible': True, 'range': [0, float(max(10, max_y_value + 1))]},
+            'annotations': [],
+            'showlegend': True,
+        }
+    }
+
+def empty_chart_update(n_traces, axes):
+    return {
+        'data': [{'x': [], 'y': []} for _ in range(n_traces)],
+        'layout': {
+            **{axis: {'visible': False} for axis in axes},
+            'annotations': [{
+                'text': 'No data available for selected filters',
+                'showarrow': False,
+                'font': {'size': 16}
+            }],
+            'showlegend': False,
+        }
+    }
+
+def create_line_chart(yearly_data):
+    import plotly.graph_objects as go
+    return go.Figure(apply_update(static_figures()[0], line_chart_update(yearly_data)))
+
+def create_bar_chart(bar_data):
+    import plotly.graph_objects as go
+    return go.Figure(apply_update(static_figures()[1], bar_chart_update(bar_data)))
+
+# App layout, built per dataset version on the first page load after it is
+# loaded rather than at import, and then served from layout_cache
+def build_layout(handler):
+    line_figure, bar_figure = static_figures()
+    return dbc.Container([
+        dbc.Row(dbc.Col(html.H1("PMIS Data Analysis Dashboard"), className="text-center mb-4")),
+        dbc.Row(dbc.Col(filter_controls(handler))),
+        dbc.Row(dbc.Col(
+            html.Div(
+                id='title-div',
+                className="text-center mb-3",
+                style={
+                    'backgroundColor': 'black',
+                    'color': 'white',
+                    'padding': '10px',
+                    'borderRadius': '5px',
+                    'opacity': '0.8',
+                    'fontSize': '16px',
+                    'fontWeight': 'bold'
+                }
+            )
+        )),
+        # Key Insights and Summary cards
+        dbc.Row([
+            dbc.Col(
+                dbc.Card(
+                    dbc.CardBody([
+                        html.H4("Key Insights", className="card-title", 
+                               style={'color': '#2c3e50', 'borderBottom': '2px solid #3498db', 'paddingBottom': '10px'}),
+                        html.P(
+                            id='key-insights', 
+                            className="card-text animated fadeIn",
+                            style={
+                                'whiteSpace': 'pre-wrap',
+                                'fontSize': '13px',
+                                'padding': '12px',
+                                'backgroundColor': '#f8f9fa',
+                                'borderLeft': '4px solid #3498db',
+                                'marginTop': '10px',
+                                'lineHeight': '1.6'
+                            }
+                        )
+                    ]),
+                    className="mt-4",
+                    style={'border': '1px solid #e0e0e0'}
+                ), width=8
+            ),
+            dbc.Col(
+                dbc.Card(
+                    dbc.CardBody([
+                        html.H4("Summary", className="card-title",
+                               style={'color': '#2c3e50', 'borderBottom': '2px solid #3498db', 'paddingBottom': '10px'}),
+                        html.P(
+                            id='summary', 
+                            className="card-text animated fadeIn",
+                            style={
+                                'whiteSpace': 'pre-wrap',
+                                'fontSize': '13px',
+                                'padding': '12px',
+                                'backgroundColor': '#f8f9fa',
+                                'borderLeft': '4px solid #3498db',
+                                'marginTop': '10px',
+                                'lineHeight': '1.0'
+                            }
+                        )
+                    ]),
+                    className="mt-4",
+                    style={'border': '1px solid #e0e0e0'}
+                ), width=4
+            )
+        ]),
+        dbc.Row(dbc.Col(dcc.Graph(id='line-chart', figure=line_figure))),
+        dbc.Row(dbc.Col(dcc.Graph(id='bar-chart', figure=bar_figure)))
+    ], fluid=True, className="dbc")
+
+layout_cache = ResultCache(max_entries=1)
+
+def serve_layout():
+    handler = dataset.current()
+    return layout_cache.get_or_compute(handler.version, 'layout', lambda: build_layout(handler))
+
+app.layout = serve_layout
 
 @app.callback(
     [Output('begin-rm-filter', 'options'),
      Output('displacement1-filter', 'options'),
      Output('end-rm-filter', 'options'),
-     Output('displacement2-filter', 'options')],
+     Output('displacement2-filter', 'options'),
+     Output('begin-rm-more', 'style'),
+     Output('end-rm-more', 'style')],
     [Input('highway-filter', 'value'),
      Input('begin-rm-filter', 'value'),
      Input('displacement1-filter', 'value'),
      Input('end-rm-filter', 'value'),
-     Input('displacement2-filter', 'value')]
+     Input('displacement2-filter', 'value'),
+     Input('begin-rm-more', 'n_clicks'),
+     Input('end-rm-more', 'n_clicks')]
 )
-def update_filters(highway, begin_rm, displacement1, end_rm, displacement2):
+def update_filters(highway, begin_rm, displacement1, end_rm, displacement2, begin_more_clicks, end_more_clicks):
     filters = {
         'highway': [highway] if highway else [],
         'begin_rm': begin_rm or [],
@@ -428,132 +761,93 @@ def update_filters(highway, begin_rm, displacement1, end_rm, displacement2):
         'displacement2': displacement2 or []
     }
 
-    filtered_df = data_handler.filter_data(filters)
+    set_selection(filters)
+    begin_values, end_values = dataset.current().filter_options(filters)
+    begin_values, begin_more_style = page_rm_values(begin_values, begin_rm, begin_more_clicks)
+    end_values, end_more_style = page_rm_values(end_values, end_rm, end_more_clicks)
 
-    begin_rm_options = [{'label': str(val), 'value': val} for val in sorted(filtered_df['TX_BEG_REF_MARKER_NBR'].unique())]
+    begin_rm_options = [{'label': str(val), 'value': val} for val in begin_values]
     displacement1_options = [{'label': '0', 'value': 0}, {'label': '0.5', 'value': 0.5}, {'label': '0.7', 'value': 0.7}]
-    end_rm_options = [{'label': str(val), 'value': val} for val in sorted(filtered_df['TX_END_REF_MARKER_NBR'].unique())]
+    end_rm_options = [{'label': str(val), 'value': val} for val in end_values]
     displacement2_options = [{'label': '0', 'value': 0}, {'label': '0.5', 'value': 0.5}, {'label': '0.7', 'value': 0.7}]
 
-    return begin_rm_options, displacement1_options, end_rm_options, displacement2_options
+    return begin_rm_options, displacement1_options, end_rm_options, displacement2_options, begin_more_style, end_more_style
 
-def create_empty_figure():
-    fig = go.Figure()
-    fig.update_layout(
-        xaxis={'visible': False},
-        yaxis={'visible': False},
-        annotations=[{
-            'text': 'No data available for selected filters',
-            'showarrow': False,
-            'font': {'size': 16}
-        }]
-    )
-    return fig
-
-def create_line_chart(yearly_data, title):
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=yearly_data['EFF_YEAR'], y=yearly_data['TX_DISTRESS_SCORE'], name='Distress Score', mode='lines+markers', line=dict(color='blue'), yaxis='y'))
-    fig.add_trace(go.Scatter(x=yearly_data['EFF_YEAR'], y=yearly_data['TX_CONDITION_SCORE'], name='Condition Score', mode='lines+markers', line=dict(color='green'), yaxis='y'))
-    fig.add_trace(go.Scatter(x=yearly_data['EFF_YEAR'], y=yearly_data['TX_RIDE_SCORE'], name='Ride Score', mode='lines+markers', line=dict(color='red'), yaxis='y2'))
-
-    max_distress_score = yearly_data['TX_DISTRESS_SCORE'].max()
-    max_condition_score = yearly_data['TX_CONDITION_SCORE'].max()
-    max_ride_score = yearly_data['TX_RIDE_SCORE'].max()
-
-    fig.update_layout(
-        xaxis=dict(title='Year', tickmode='array', tickvals=sorted(yearly_data['EFF_YEAR'].unique()), ticktext=sorted(yearly_data['EFF_YEAR'].unique()), tickangle=-45, showgrid=True),
-        yaxis=dict(title=dict(text='Distress & Condition Scores', font=dict(color='black')), range=[0, max(100, max(max_distress_score, max_condition_score) + 10)], side='left', showgrid=True, tickformat=',.0f'),
-        yaxis2=dict(title=dict(text='Ride Score', font=dict(color='black')), range=[0, max(5, max_ride_score + 1)], side='right', overlaying='y', tickformat='.1f', showgrid=False),
-        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1, bgcolor='rgba(255,255,255,0.5)'),
-        height=600,
-        hovermode='x unified',
-        hoverlabel=dict(bgcolor='white', font_size=12, font_family='Arial')
-    )
-    return fig
-
-def create_bar_chart(bar_data):
-    fig = go.Figure()
-    fig.add_trace(go.Bar(x=bar_data['EFF_YEAR'], y=bar_data['ACP Patches/Mile'], name='ACP Patches', marker_color='green'))
-    fig.add_trace(go.Bar(x=bar_data['EFF_YEAR'], y=bar_data['PCC Patches/Mile'], name='PCC Patches', marker_color='blue'))
-    fig.add_trace(go.Bar(x=bar_data['EFF_YEAR'], y=bar_data['Spalled Cracks/Mile'], name='Spalled Cracks', marker_color='orange'))
-    fig.add_trace(go.Bar(x=bar_data['EFF_YEAR'], y=bar_data['Punchouts/Mile'], name='Punchouts', marker_color='red'))
-
-    max_y_value = max(bar_data['Spalled Cracks/Mile'].max(), bar_data['PCC Patches/Mile'].max(), bar_data['Punchouts/Mile'].max(), bar_data['ACP Patches/Mile'].max())
-
-    fig.update_layout(
-        xaxis=dict(title='Year', tickmode='array', tickvals=sorted(bar_data['EFF_YEAR'].unique()), ticktext=sorted(bar_data['EFF_YEAR'].unique()), tickangle=-45, showgrid=True),
-        yaxis=dict(title='Distress per Mile', range=[0, max(10, max_y_value + 1)]),
-        barmode='group',
-        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1, bgcolor='rgba(255,255,255,0.5)'),
-        height=600,
-        bargap=0.15,
-        hovermode='x unified',
-        hoverlabel=dict(bgcolor='white', font_size=12, font_family='Arial')
-    )
-    return fig
+@app.callback(
+    [Output('range-from-rm', 'options'),
+     Output('range-to-rm', 'options')],
+    [Input('highway-filter', 'value')]
+)
+def update_range_options(highway):
+    options = [{'label': str(val), 'value': val} for val in dataset.current().range_markers(highway)]
+    return options, options
 
 @app.callback(
     [Output('line-chart', 'figure'),
      Output('bar-chart', 'figure'),
-     Output('download-data', 'data'),
      Output('summary', 'children'),
      Output('key-insights', 'children')],  # Removed title-div output
-    [Input('apply-filter', 'n_clicks'),
-     Input('export-btn', 'n_clicks')],
+    [Input('apply-filter', 'n_clicks')],
     [State('highway-filter', 'value'),
      State('begin-rm-filter', 'value'),
      State('displacement1-filter', 'value'),
      State('end-rm-filter', 'value'),
-     State('displacement2-filter', 'value')]
+     State('displacement2-filter', 'value'),
+     State('range-from-rm', 'value'),
+     State('range-from-disp', 'value'),
+     State('range-to-rm', 'value'),
+     State('range-to-disp', 'value')]
 )
-def update_charts_and_summary(apply_clicks, export_clicks, highway, begin_rm, displacement1, end_rm, displacement2):
-    ctx = callback_context
+def update_charts_and_summary(apply_clicks, highway, begin_rm, displacement1, end_rm, displacement2,
+                              from_rm, from_disp, to_rm, to_disp):
+    handler = dataset.current()
+    selection = canonical_selection(highway, begin_rm, displacement1, end_rm, displacement2,
+                                    rm_range(from_rm, from_disp, to_rm, to_disp))
+    set_selection(selection_filters(selection))
+    results = result_cache.get_or_compute(
+        handler.version, selection, lambda: compute_chart_results(handler, selection)
+    )
+    return (figure_patch(results['line_update']), figure_patch(results['bar_update']),
+            results['summary'], results['key_insights'])
 
-    filtered_df = data_handler.filter_data({
-        'highway': highway,
-        'begin_rm': [v for v in (begin_rm or []) if v != 'all'],
-        'end_rm': [v for v in (end_rm or []) if v != 'all'],
-        'displacement1': [v for v in (displacement1 or []) if v != 'all'],
-        'displacement2': [v for v in (displacement2 or []) if v != 'all']
-    })
+def rm_range(from_rm, from_disp, to_rm, to_disp):
+    # [start, end] milepoints once both ends of the range are picked
+    if from_rm is None or to_rm is None:
+        return None
+    return [milepoint(from_rm, from_disp), milepoint(to_rm, to_disp)]
+
+def selection_filters(selection):
+    highway, begin_rm, displacement1, end_rm, displacement2, milepoints = selection
+    return {
+        'highway': list(highway),
+        'begin_rm': list(begin_rm),
+        'end_rm': list(end_rm),
+        'displacement1': list(displacement1),
+        'displacement2': list(displacement2),
+        'rm_range': list(milepoints)
+    }
+
+def compute_chart_results(handler, selection):
+    aggregates = handler.yearly_aggregates(selection_filters(selection))
+
+    if aggregates is None:
+        return {
+            'empty': True,
+            'line_update': empty_chart_update(len(LINE_TRACES), ('xaxis', 'yaxis', 'yaxis2')),
+            'bar_update': empty_chart_update(len(BAR_TRACES), ('xaxis', 'yaxis')),
+            'summary': "No data available for selected filters",
+            'key_insights': ""
+        }
 
-    if filtered_df.empty:
-        empty_fig = create_empty_figure()
-        return empty_fig, empty_fig, None, "No data available for selected filters", ""
-
-    cs = data_handler.calculate_condition_score(filtered_df)
-    yearly_data = filtered_df.groupby('EFF_YEAR').agg({
-        'TX_DISTRESS_SCORE': 'mean',
-        'TX_CONDITION_SCORE': 'mean',
-        'TX_RIDE_SCORE': 'mean'
-    }).reset_index()
-
-    title = f'{highway}, RM: {begin_rm} + {displacement1} to {end_rm} + {displacement2}'
-
-    line_fig = create_line_chart(yearly_data, title)
-    bar_data = filtered_df.groupby('EFF_YEAR').agg({
-        'TX_CRCP_SPALLED_CRACKS_QTY': 'sum',
-        'TX_JCP_PCC_PATCHES_QTY': 'sum',
-        'TX_CRCP_PUNCHOUT_QTY': 'sum',
-        'TX_CRCP_ACP_PATCHES_QTY': 'sum',
-        'TX_LENGTH': 'sum'
-    }).reset_index()
-
-    bar_data['Spalled Cracks/Mile'] = bar_data['TX_CRCP_SPALLED_CRACKS_QTY'] / bar_data['TX_LENGTH']
-    bar_data['PCC Patches/Mile'] = bar_data['TX_JCP_PCC_PATCHES_QTY'] / bar_data['TX_LENGTH']
-    bar_data['Punchouts/Mile'] = bar_data['TX_CRCP_PUNCHOUT_QTY'] / bar_data['TX_LENGTH']
-    bar_data['ACP Patches/Mile'] = bar_data['TX_CRCP_ACP_PATCHES_QTY'] / bar_data['TX_LENGTH']
-
-    bar_fig = create_bar_chart(bar_data)
-
-    if ctx.triggered and ctx.triggered[0]['prop_id'] == 'export-btn.n_clicks':
-        buffer = io.StringIO()
-        filtered_df.to_csv(buffer, index=False)
-        buffer.seek(0)
-        return line_fig, bar_fig, dcc.send_string(buffer.getvalue(), "filtered_data.csv"), "", ""
-
-    total_records = len(filtered_df)
-    avg_condition_score = data_handler.calculate_condition_score(filtered_df)
+    yearly_data = aggregates['yearly_data']
+
+    with phase('figure'):
+        line_update = line_chart_update(yearly_data)
+        # per-mile rates come with the yearly sums (aggregate_cube.add_per_mile)
+        bar_data = aggregates['bar_data']
+        bar_update = bar_chart_update(bar_data)
+
+    avg_condition_score = aggregates['condition_score']
     max_distress_score = yearly_data['TX_DISTRESS_SCORE'].max()
     max_condition_score = yearly_data['TX_CONDITION_SCORE'].max()
     max_ride_score = yearly_data['TX_RIDE_SCORE'].max()
@@ -572,10 +866,77 @@ def update_charts_and_summary(apply_clicks, export_clicks, highway, begin_rm, di
         f"3. The maximum ride score is {max_ride_score:.2f}, showing the best ride quality observed."
     )
 
-    return line_fig, bar_fig, None, summary, key_insights
+    return {
+        'empty': False,
+        'yearly_data': yearly_data,
+        'bar_data': bar_data,
+        'line_update': line_update,
+        'bar_update': bar_update,
+        'summary': summary,
+        'key_insights': key_insights
+    }
+
+def export_progress(status):
+    if status['state'] == 'failed':
+        return dbc.Alert(f"Export failed: {status['error']}", color="danger", className="py-2")
+    if status['state'] == 'done':
+        filename, _ = EXPORT_FORMATS[status['format']]
+        return html.A(
+            [html.I(className="fas fa-download me-2"), f"Download {filename} ({status['rows_total']:,} rows)"],
+            href=f"/api/export/jobs/{status['id']}/file"
+        )
+    percent = 100 * status['rows_done'] / status['rows_total'] if status['rows_total'] else 0
+    return dbc.Progress(value=percent, label=f"{status['rows_done']:,} / {status['rows_total']:,} rows", striped=True, animated=True)
 
-# Add new callback for real-time title updates
+# Export runs as a background job; this callback starts it and polls its progress
 @app.callback(
+    [Output('export-job', 'data'),
+     Output('export-poll', 'disabled'),
+     Output('export-status', 'children')],
+    [Input('export-btn', 'n_clicks'),
+     Input('export-poll', 'n_intervals')],
+    [State('export-job', 'data'),
+     State('export-format', 'value'),
+     State('highway-filter', 'value'),
+     State('begin-rm-filter', 'value'),
+     State('displacement1-filter', 'value'),
+     State('end-rm-filter', 'value'),
+     State('displacement2-filter', 'value'),
+     State('range-from-rm', 'value'),
+     State('range-from-disp', 'value'),
+     State('range-to-rm', 'value'),
+     State('range-to-disp', 'value')],
+    prevent_initial_call=True
+)
+def handle_export(export_clicks, n_intervals, job_id, export_format, highway, begin_rm, displacement1, end_rm, displacement2,
+                  from_rm, from_disp, to_rm, to_disp):
+    ctx = callback_context
+    if not ctx.triggered:
+        return dash.no_update, dash.no_update, dash.no_update
+
+    trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
+
+    if trigger_id == 'export-btn':
+        handler = dataset.current()
+        if isinstance(handler, ColumnarStore):
+            return None, True, dbc.Alert("Export needs the in-memory dataset and is not available with PMIS_BACKEND=store",
+                                         color="warning", className="py-2")
+        selection = canonical_selection(highway, begin_rm, displacement1, end_rm, displacement2,
+                                        rm_range(from_rm, from_disp, to_rm, to_disp))
+        set_selection(selection_filters(selection))
+        positions = handler.filter_positions(selection_filters(selection))
+        job_id = start_export(handler.df, positions, export_format or 'csv')
+        return job_id, False, export_progress(job_status(job_id))
+
+    try:
+        status = job_status(job_id or '')
+    except KeyError:
+        return None, True, ""
+    return dash.no_update, status['state'] in ('done', 'failed'), export_progress(status)
+
+# Title updates run in the browser (assets/clientside.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='pmis', function_name='title'),
     Output('title-div', 'children'),
     [Input('highway-filter', 'value'),
      Input('begin-rm-filter', 'value'),
@@ -583,25 +944,193 @@ def update_charts_and_summary(apply_clicks, export_clicks, highway, begin_rm, di
      Input('end-rm-filter', 'value'),
      Input('displacement2-filter', 'value')]
 )
-def update_title(highway, begin_rm, displacement1, end_rm, displacement2):
-    if not highway:
-        return "Please select a highway"
-    
-    begin_str = f"RM {begin_rm}" if begin_rm else ""
-    disp1_str = f" + {displacement1}" if displacement1 else ""
-    end_str = f" to RM {end_rm}" if end_rm else ""
-    disp2_str = f" + {displacement2}" if displacement2 else ""
-    
-    return f"{highway}{begin_str}{disp1_str}{end_str}{disp2_str}"
-
-# Main chart callback
+
+# Filtered, projected and paginated data access (see data_api.py)
 @server.route('/api/data', methods=['GET'])
 def get_data():
-    filtered_data = data_handler.filter_data(filters={})
-    return jsonify(filtered_data.to_dict(orient='records'))
+    handler = dataset.current()
+    unavailable = table_unavailable(handler, '/api/data')
+    if unavailable:
+        return unavailable
+    try:
+        params = parse_data_request(request.args, handler.df)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-# Replace all toggle and clear callbacks with these combined callbacks
-@app.callback(
+    set_selection(params['filters'])
+    positions = handler.filter_positions(params['filters'])
+    page, next_cursor = page_positions(positions, params['cursor'], params['limit'])
+
+    if params['format'] == 'ndjson':
+        response = Response(
+            stream_with_context(iter_ndjson(handler.df, page, params['columns'])),
+            mimetype='application/x-ndjson'
+        )
+        if next_cursor is not None:
+            response.headers['X-Next-Cursor'] = str(next_cursor)
+        return response
+
+    with phase('serialize'):
+        body = page_json(handler.df, page, params['columns'], len(positions), next_cursor)
+    return Response(body, mimetype='application/json')
+
+# Server-side group-by aggregation with compact columnar output
+@server.route('/api/aggregate', methods=['GET'])
+def get_aggregate():
+    handler = dataset.current()
+    try:
+        params = parse_aggregate_request(request.args, request_frame(handler))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def compute():
+        result = handler.aggregate(params['filters'], params['group_by'], params['metrics'])
+        if len(result) > MAX_AGGREGATE_GROUPS:
+            return None
+        with phase('serialize'):
+            return columnar_json(result, groups=len(result), version=handler.version)
+
+    set_selection(params['filters'])
+    key = (filters_key(params['filters']), params['group_by'], params['metrics'])
+    try:
+        body = aggregate_cache.get_or_compute(handler.version, key, compute)
+    except ValueError as e:
+        # metrics the store cannot fold batch by batch (percentiles)
+        return jsonify({'error': str(e)}), 400
+    if body is None:
+        return jsonify({'error': f"More than {MAX_AGGREGATE_GROUPS} groups; add filters or fewer group_by columns"}), 400
+    return Response(body, mimetype='application/json')
+
+# Segments ranked by deterioration rate (see deterioration.py)
+@server.route('/api/deterioration', methods=['GET'])
+def get_deterioration():
+    handler = dataset.current()
+    unavailable = table_unavailable(handler, '/api/deterioration')
+    if unavailable:
+        return unavailable
+    try:
+        params = parse_deterioration_request(request.args, handler.df)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    with phase('aggregate'):
+        result, total = handler.deterioration().top(**params)
+    add_rows(total)
+    with phase('serialize'):
+        body = columnar_json(result, count=len(result), total=total, version=handler.version)
+    return Response(body, mimetype='application/json')
+
+# Streamed CSV export for API clients; /api/export/jobs runs any format in the background
+@server.route('/api/export', methods=['GET'])
+def get_export():
+    handler = dataset.current()
+    unavailable = table_unavailable(handler, '/api/export')
+    if unavailable:
+        return unavailable
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'csv.gz'):
+        return jsonify({'error': "Streaming export supports csv and csv.gz; use /api/export/jobs for other formats"}), 400
+    try:
+        filters = parse_filters(request.args, handler.df)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    set_selection(filters)
+    filename, mimetype = EXPORT_FORMATS[export_format]
+    positions = handler.filter_positions(filters)
+    return Response(
+        stream_with_context(iter_csv(handler.df, positions, compress=export_format == 'csv.gz')),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@server.route('/api/export/jobs', methods=['POST'])
+def create_export_job():
+    handler = dataset.current()
+    unavailable = table_unavailable(handler, '/api/export/jobs')
+    if unavailable:
+        return unavailable
+    try:
+        filters = parse_filters(request.args, handler.df)
+        set_selection(filters)
+        job_id = start_export(handler.df, handler.filter_positions(filters), request.args.get('format', 'csv'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(job_status(job_id)), 202
+
+@server.route('/api/export/jobs/<job_id>', methods=['GET'])
+def get_export_job(job_id):
+    try:
+        return jsonify(job_status(job_id))
+    except KeyError:
+        return jsonify({'error': 'Unknown export job'}), 404
+
+@server.route('/api/export/jobs/<job_id>/file', methods=['GET'])
+def get_export_file(job_id):
+    try:
+        path, filename, mimetype = job_file(job_id)
+    except KeyError:
+        return jsonify({'error': 'Export is not ready'}), 404
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=filename)
+
+# Features of a GeoJSON layer by bbox, highway and year (see segment_index.py)
+@server.route('/api/segments', methods=['GET'])
+def get_segments():
+    try:
+        params = parse_segment_request(request.args, segment_index)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    layer = params['layer']
+    ids = layer.query(params['bbox'], params['highways'], params['years'])
+    add_rows(len(ids))
+    with phase('serialize'):
+        body = layer.geojson(ids, params['zoom'], params['fields'])
+    return Response(body, mimetype='application/geo+json')
+
+@server.route('/api/segments/tiles/<int:z>/<int:x>/<int:y>.mvt', methods=['GET'])
+def get_segment_tile(z, x, y):
+    try:
+        check_tile(z, x, y)
+        params = parse_segment_request(request.args, segment_index)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    layer = params['layer']
+    key = (layer.name, z, x, y, params['highways'], params['years'], params['fields'])
+    body = tile_cache.get_or_compute(0, key, lambda: layer.tile(
+        z, x, y, params['highways'], params['years'], params['fields']
+    ))
+    return Response(body, mimetype='application/vnd.mapbox-vector-tile')
+
+@server.route('/api/dataset', methods=['GET'])
+def get_dataset_status():
+    return jsonify(dataset.status())
+
+# Per-column memory of the loaded table (see column_schema.py)
+@server.route('/api/memory', methods=['GET'])
+def get_memory_report():
+    handler = dataset.current()
+    unavailable = table_unavailable(handler, '/api/memory')
+    if unavailable:
+        return unavailable
+    report = handler.memory_report()
+    body = columnar_json(report, rows=len(handler.df), total_bytes=int(report['bytes'].sum()),
+                         version=handler.version)
+    return Response(body, mimetype='application/json')
+
+@server.route('/api/cache-stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({
+        'results': result_cache.stats(),
+        'aggregates': aggregate_cache.stats(),
+        'tiles': tile_cache.stats(),
+    })
+
+# Collapse, clear and "Select All" only touch values already on the page, so
+# they run in the browser (assets/clientside.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='pmis', function_name='beginRm'),
     [Output('begin-rm-filter', 'value'),
      Output('begin-rm-collapse', 'is_open')],
     [Input('begin-rm-collapse-button', 'n_clicks'),
@@ -610,28 +1139,9 @@ def get_data():
     [State('begin-rm-collapse', 'is_open'),
      State('begin-rm-filter', 'options')]
 )
-def handle_begin_rm(collapse_clicks, clear_clicks, selected_values, is_open, options):
-    ctx = callback_context
-    if not ctx.triggered:
-        return dash.no_update, dash.no_update
-    
-    trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    
-    if trigger_id == "begin-rm-clear-button":
-        return [], False
-    elif trigger_id == "begin-rm-filter":
-        if 'all' in selected_values:
-            if len(selected_values) == 1:  # Only 'all' is selected
-                all_values = [opt['value'] for opt in options if opt['value'] != 'all']
-                return all_values, True
-            else:
-                return [], True
-        return selected_values, True
-    elif trigger_id == "begin-rm-collapse-button":
-        return dash.no_update, not is_open
-    return dash.no_update, is_open
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='pmis', function_name='displacement1'),
     [Output('displacement1-filter', 'value'),
      Output('displacement1-collapse', 'is_open')],
     [Input('displacement1-collapse-button', 'n_clicks'),
@@ -639,22 +1149,9 @@ def handle_begin_rm(collapse_clicks, clear_clicks, selected_values, is_open, opt
      Input('displacement1-filter', 'value')],
     [State('displacement1-collapse', 'is_open')]
 )
-def handle_displacement1(collapse_clicks, clear_clicks, selected_values, is_open):
-    ctx = callback_context
-    if not ctx.triggered:
-        return dash.no_update, dash.no_update
-    
-    trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    
-    if trigger_id == "displacement1-clear-button":
-        return [], False
-    elif trigger_id == "displacement1-filter" and selected_values:
-        return selected_values, False
-    elif trigger_id == "displacement1-collapse-button":
-        return dash.no_update, not is_open
-    return dash.no_update, is_open
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='pmis', function_name='endRm'),
     [Output('end-rm-filter', 'value'),
      Output('end-rm-collapse', 'is_open')],
     [Input('end-rm-collapse-button', 'n_clicks'),
@@ -662,22 +1159,9 @@ def handle_displacement1(collapse_clicks, clear_clicks, selected_values, is_open
      Input('end-rm-filter', 'value')],
     [State('end-rm-collapse', 'is_open')]
 )
-def handle_end_rm(collapse_clicks, clear_clicks, selected_values, is_open):
-    ctx = callback_context
-    if not ctx.triggered:
-        return dash.no_update, dash.no_update
-    
-    trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    
-    if trigger_id == "end-rm-clear-button":
-        return [], False
-    elif trigger_id == "end-rm-filter" and selected_values:
-        return selected_values, True  # Keep dropdown open for multiple selections
-    elif trigger_id == "end-rm-collapse-button":
-        return dash.no_update, not is_open
-    return dash.no_update, is_open
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='pmis', function_name='displacement2'),
     [Output('displacement2-filter', 'value'),
      Output('displacement2-collapse', 'is_open')],
     [Input('displacement2-collapse-button', 'n_clicks'),
@@ -685,20 +1169,6 @@ def handle_end_rm(collapse_clicks, clear_clicks, selected_values, is_open):
      Input('displacement2-filter', 'value')],
     [State('displacement2-collapse', 'is_open')]
 )
-def handle_displacement2(collapse_clicks, clear_clicks, selected_values, is_open):
-    ctx = callback_context
-    if not ctx.triggered:
-        return dash.no_update, dash.no_update
-    
-    trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    
-    if trigger_id == "displacement2-clear-button":
-        return [], False
-    elif trigger_id == "displacement2-filter" and selected_values:
-        return selected_values, False  # Match displacement1 behavior - close after selection
-    elif trigger_id == "displacement2-collapse-button":
-        return dash.no_update, not is_open
-    return dash.no_update, is_open
 
 if __name__ == '__main__':
     app.run_server(debug=True)
@@ -0,0 +1,111 @@
+// Clientside callbacks for the filter widgets and the title (see app.py).
+// They only rearrange values already on the page, so they run in the
+// browser and never reach the server. Returning no_update for a value the
+// user just picked keeps it from triggering update_filters a second time.
+(function () {
+    function triggeredId() {
+        var triggered = window.dash_clientside.callback_context.triggered;
+        if (!triggered || !triggered.length || triggered[0].prop_id === '.') {
+            return null;
+        }
+        return triggered[0].prop_id.split('.')[0];
+    }
+
+    function toggleFilter(name, stayOpen) {
+        return function (collapseClicks, clearClicks, selectedValues, isOpen) {
+            var noUpdate = window.dash_clientside.no_update;
+            var trigger = triggeredId();
+            if (trigger === null) {
+                return [noUpdate, noUpdate];
+            }
+            if (trigger === name + '-clear-button') {
+                return [[], false];
+            }
+            if (trigger === name + '-filter' && selectedValues && selectedValues.length) {
+                return [noUpdate, stayOpen];
+            }
+            if (trigger === name + '-collapse-button') {
+                return [noUpdate, !isOpen];
+            }
+            return [noUpdate, isOpen];
+        };
+    }
+
+    // The title reproduces the Python f-string it replaces, lists included
+    function pyTruthy(value) {
+        if (value === null || value === undefined) {
+            return false;
+        }
+        if (Array.isArray(value) || typeof value === 'string') {
+            return value.length > 0;
+        }
+        return Boolean(value);
+    }
+
+    function pyStr(value) {
+        if (value === null || value === undefined) {
+            return 'None';
+        }
+        if (typeof value === 'boolean') {
+            return value ? 'True' : 'False';
+        }
+        if (Array.isArray(value)) {
+            return '[' + value.map(pyRepr).join(', ') + ']';
+        }
+        return String(value);
+    }
+
+    function pyRepr(value) {
+        if (typeof value !== 'string') {
+            return pyStr(value);
+        }
+        if (value.indexOf("'") !== -1 && value.indexOf('"') === -1) {
+            return '"' + value + '"';
+        }
+        return "'" + value.replace(/\\/g, '\\\\').replace(/'/g, "\\'") + "'";
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        pmis: {
+            beginRm: function (collapseClicks, clearClicks, selectedValues, isOpen, options) {
+                var noUpdate = window.dash_clientside.no_update;
+                var trigger = triggeredId();
+                if (trigger === null) {
+                    return [noUpdate, noUpdate];
+                }
+                if (trigger === 'begin-rm-clear-button') {
+                    return [[], false];
+                }
+                if (trigger === 'begin-rm-filter') {
+                    if (selectedValues && selectedValues.indexOf('all') !== -1) {
+                        if (selectedValues.length === 1) {  // Only 'all' is selected
+                            var allValues = options
+                                .filter(function (opt) { return opt.value !== 'all'; })
+                                .map(function (opt) { return opt.value; });
+                            return [allValues, true];
+                        }
+                        return [[], true];
+                    }
+                    return [noUpdate, true];
+                }
+                if (trigger === 'begin-rm-collapse-button') {
+                    return [noUpdate, !isOpen];
+                }
+                return [noUpdate, isOpen];
+            },
+            displacement1: toggleFilter('displacement1', false),
+            endRm: toggleFilter('end-rm', true),  // Keep dropdown open for multiple selections
+            displacement2: toggleFilter('displacement2', false),
+            title: function (highway, beginRm, displacement1, endRm, displacement2) {
+                if (!pyTruthy(highway)) {
+                    return 'Please select a highway';
+                }
+                var beginStr = pyTruthy(beginRm) ? 'RM ' + pyStr(beginRm) : '';
+                var disp1Str = pyTruthy(displacement1) ? ' + ' + pyStr(displacement1) : '';
+                var endStr = pyTruthy(endRm) ? ' to RM ' + pyStr(endRm) : '';
+                var disp2Str = pyTruthy(displacement2) ? ' + ' + pyStr(displacement2) : '';
+                return pyStr(highway) + beginStr + disp1Str + endStr + disp2Str;
+            }
+        }
+    });
+})();
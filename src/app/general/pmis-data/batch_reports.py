@@ -0,0 +1,206 @@
+"""Yearly condition and distress reports for many highways in one run.
+
+Builds, for every highway (or the ones picked with ``--highway`` or
+``--district``), the same line chart, bar chart and summary the dashboard
+shows for that ``highway-filter`` value, and writes them as:
+
+    <highway>.html       both charts and the summary, using plotly.min.js
+                         written once next to the reports
+    <highway>.json       summary, yearly means and per-mile rates
+    <highway>.csv        the highway's rows
+    <highway>_line.png   the charts as images (needs kaleido)
+    <highway>_bar.png
+
+The dataset is loaded once by importing app with PMIS_DATA_PATH pointing at
+the source, so the reports come from the same DataHandler,
+compute_chart_results and create_*_chart code as the dashboard. Highways are
+spread over a process pool. On Linux the workers are forked from the loaded
+process and share its memory; elsewhere each worker imports app again
+(PMIS_SHARED_DATA=1 then maps one copy of the columnar cache). The largest
+highways are submitted first. Every highway's time and row count are
+printed as it finishes and written to ``timings.csv``.
+
+    python batch_reports.py /path/to/pmis.csv --district 4 --out reports/
+    python batch_reports.py /path/to/pmis.csv --highway "IH0040 L" --formats html,png
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+FORMATS = ('html', 'json', 'csv', 'png')
+DEFAULT_FORMATS = ('html', 'json', 'csv')
+PLOTLY_JS = 'plotly.min.js'
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>{title}</title><script src="{plotly_js}"></script></head>
+<body>
+<h1>{title}</h1>
+<pre>{summary}</pre>
+{line}
+{bar}
+</body>
+</html>
+"""
+
+app = None
+
+
+def load_app(source):
+    global app
+    if app is None:
+        os.environ['PMIS_DATA_PATH'] = os.path.abspath(source)
+        os.environ['PMIS_RESULT_CACHE_SIZE'] = '0'
+        import app as dashboard
+        app = dashboard
+    return app
+
+
+def file_stem(highway):
+    return re.sub(r'[^A-Za-z0-9.-]+', '_', str(highway)).strip('_')
+
+
+def report_highway(highway, out_dir, formats):
+    """Write the reports of one highway; returns (status, rows, seconds)."""
+    start = time.perf_counter()
+    handler = app.dataset.current()
+    selection = app.canonical_selection(highway, None, None, None, None)
+    results = app.compute_chart_results(handler, selection)
+    if results['empty']:
+        return 'empty', 0, time.perf_counter() - start
+
+    stem = os.path.join(out_dir, file_stem(highway))
+    yearly_data, bar_data = results['yearly_data'], results['bar_data']
+    line = app.create_line_chart(yearly_data)
+    bar = app.create_bar_chart(bar_data)
+    rows = None
+    if 'html' in formats:
+        with open(stem + '.html', 'w', encoding='utf-8') as f:
+            f.write(PAGE.format(
+                title=highway, plotly_js=PLOTLY_JS, summary=results['summary'],
+                line=line.to_html(full_html=False, include_plotlyjs=False),
+                bar=bar.to_html(full_html=False, include_plotlyjs=False),
+            ))
+    if 'json' in formats:
+        with open(stem + '.json', 'w', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'highway': highway,
+                'summary': results['summary'],
+                'yearly': json.loads(yearly_data.to_json(orient='records')),
+                'per_mile': json.loads(bar_data.to_json(orient='records')),
+            }, indent=2))
+    if 'csv' in formats:
+        frame = handler.filter_data({'highway': [highway]})
+        frame.to_csv(stem + '.csv', index=False)
+        rows = len(frame)
+    if 'png' in formats:
+        line.write_image(stem + '_line.png')
+        bar.write_image(stem + '_bar.png')
+    if rows is None:
+        rows = len(handler.filter_positions({'highway': [highway]}))
+    return 'done', rows, time.perf_counter() - start
+
+
+def _init_worker(source):
+    load_app(source)
+
+
+def _report(highway, out_dir, formats):
+    try:
+        return report_highway(highway, out_dir, formats)
+    except Exception as e:
+        return f'failed: {type(e).__name__}: {e}', 0, 0.0
+
+
+def select_highways(handler, highways=(), districts=()):
+    """Requested highways, largest first; all of them when none are given."""
+    df = handler.df
+    if districts:
+        df = df[df['RESPONSIBLE_DISTRICT'].isin(districts)]
+    counts = df['TX_SIGNED_HIGHWAY_RDBD_ID'].value_counts()
+    counts = counts[counts > 0]
+    if highways:
+        unknown = [h for h in highways if h not in counts.index]
+        if unknown:
+            raise ValueError(f"No rows for highways: {unknown}")
+        counts = counts[list(highways)].sort_values(ascending=False)
+    return [str(h) for h in counts.index]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help="PMIS CSV to report on")
+    parser.add_argument('--out', default='reports', help="output directory")
+    parser.add_argument('--highway', action='append', default=[], help="highway to report on (repeatable)")
+    parser.add_argument('--district', action='append', type=int, default=[],
+                        help="report on every highway with rows in this district (repeatable)")
+    parser.add_argument('--formats', default=','.join(DEFAULT_FORMATS),
+                        help=f"comma-separated subset of {','.join(FORMATS)}")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    formats = [f.strip() for f in args.formats.split(',') if f.strip()]
+    unknown = [f for f in formats if f not in FORMATS]
+    if unknown:
+        parser.error(f"unknown formats: {unknown}")
+    if 'png' in formats:
+        try:
+            import kaleido  # noqa: F401
+        except ImportError:
+            parser.error("png reports need kaleido (pip install kaleido)")
+
+    start = time.perf_counter()
+    load_app(args.source)
+    try:
+        highways = select_highways(app.dataset.current(), args.highway, args.district)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"loaded {args.source} in {time.perf_counter() - start:.2f}s; {len(highways)} highways")
+
+    os.makedirs(args.out, exist_ok=True)
+    if 'html' in formats:
+        from plotly.offline import get_plotlyjs
+        with open(os.path.join(args.out, PLOTLY_JS), 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+
+    timings = []
+
+    def record(highway, status, rows, seconds):
+        timings.append((highway, status, rows, round(seconds, 4)))
+        print(f"{seconds:>8.2f}s  {rows:>8,} rows  {highway}  {status}")
+
+    run_start = time.perf_counter()
+    if args.workers <= 1:
+        for highway in highways:
+            record(highway, *_report(highway, args.out, formats))
+    else:
+        methods = multiprocessing.get_all_start_methods()
+        # forked workers inherit the loaded dataset; spawned ones load it again
+        context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+        initargs = () if context.get_start_method() == 'fork' else (args.source,)
+        with ProcessPoolExecutor(args.workers, mp_context=context,
+                                 initializer=_init_worker if initargs else None, initargs=initargs) as pool:
+            futures = {pool.submit(_report, highway, args.out, formats): highway for highway in highways}
+            for future in as_completed(futures):
+                record(futures[future], *future.result())
+    elapsed = time.perf_counter() - run_start
+
+    with open(os.path.join(args.out, 'timings.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['highway', 'status', 'rows', 'seconds'])
+        writer.writerows(timings)
+    failed = [t for t in timings if t[1].startswith('failed')]
+    busy = sum(t[3] for t in timings)
+    print(f"{len(timings)} highways in {elapsed:.2f}s ({busy:.2f}s of report time, {args.workers} workers); "
+          f"{len(failed)} failed")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Ingest time and peak memory of PMIS Excel workbooks.
+
+Times four ways of getting a workbook into a DataFrame, each in a fresh
+process:
+- ``pd.read_excel`` with the openpyxl engine;
+- openpyxl alone: ``load_workbook(read_only=True)`` and
+  ``iter_rows(values_only=True)`` over the first sheet into a DataFrame,
+  without read_excel's type conversions (a lower bound for any openpyxl
+  reader);
+- ``read_xlsx``, the streaming reader in excel_source.py;
+- ``load_table`` once the columnar cache holds the converted workbook.
+Peak memory is the process's peak RSS during the read minus its RSS just
+before it, with the peak reset after the libraries are imported. Linux only,
+since it reads /proc/self/status.
+
+Give a workbook, or --rows to write a synthetic one (see synthetic.py) under
+--data-dir the first time.
+
+    python benchmarks/excel_ingest.py /path/to/pmis.xlsx
+    python benchmarks/excel_ingest.py --rows 100000 --repeat 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'pmis-benchmarks')
+
+READERS = {
+    'pd.read_excel': "pd.read_excel(path, engine='openpyxl')",
+    'openpyxl rows': "openpyxl_rows(path)",
+    'read_xlsx': "read_xlsx(path)",
+    'columnar cache': "load_table(path)",
+}
+
+SCRIPT = '''
+import json, sys, time
+import pandas as pd
+import openpyxl
+from columnar_cache import load_table
+from excel_source import read_xlsx
+
+def status(key):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(key + ':'):
+                return int(line.split()[1]) * 1024
+
+def openpyxl_rows(path):
+    book = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    rows = book.worksheets[0].iter_rows(values_only=True)
+    header = next(rows)
+    df = pd.DataFrame(list(rows), columns=header)
+    book.close()
+    return df
+
+path = sys.argv[1]
+# writing 5 to clear_refs resets the peak (VmHWM) to the current RSS
+with open('/proc/self/clear_refs', 'w') as f:
+    f.write('5')
+baseline = status('VmRSS')
+start = time.perf_counter()
+df = {reader}
+seconds = time.perf_counter() - start
+print(json.dumps({{
+    'seconds': seconds, 'peak_bytes': status('VmHWM') - baseline, 'rows': len(df), 'columns': df.shape[1]
+}}))
+'''
+
+
+def write_workbook(path, rows, seed=0):
+    from openpyxl import Workbook
+
+    sys.path.insert(0, HERE)
+    from synthetic import COLUMNS, generate
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('PMIS')
+    sheet.append(COLUMNS)
+    for chunk in generate(rows, seed):
+        for row in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False):
+            sheet.append(list(row))
+    tmp_path = f'{path}.tmp'
+    workbook.save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def measure(reader, path, repeat):
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', SCRIPT.format(reader=READERS[reader]), path],
+                                cwd=APP_DIR, env=dict(os.environ, PYTHONPATH=APP_DIR),
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'seconds': statistics.median(r['seconds'] for r in runs),
+        'peak_bytes': max(r['peak_bytes'] for r in runs),
+        'rows': runs[0]['rows'],
+        'columns': runs[0]['columns'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', nargs='?', help="workbook to read")
+    parser.add_argument('--rows', type=int, help="write and read a synthetic workbook of this many rows")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="where synthetic workbooks are kept")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help="runs per reader")
+    parser.add_argument('--readers', nargs='+', choices=list(READERS), default=list(READERS))
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args(argv)
+    if not args.source and not args.rows:
+        parser.error("give a workbook or --rows")
+
+    path = args.source
+    if path is None:
+        os.makedirs(args.data_dir, exist_ok=True)
+        path = os.path.join(args.data_dir, f'pmis-{args.rows}-seed{args.seed}.xlsx')
+        if not os.path.exists(path):
+            print(f"writing {args.rows:,} rows -> {path}", file=sys.stderr)
+            write_workbook(path, args.rows, args.seed)
+    path = os.path.abspath(path)
+
+    if 'columnar cache' in args.readers:
+        sys.path.insert(0, APP_DIR)
+        from columnar_cache import build_cache, is_cache_fresh
+        if not is_cache_fresh(path):
+            build_cache(path)
+
+    results = {reader: measure(reader, path, args.repeat) for reader in args.readers}
+    if args.json:
+        print(json.dumps({'source': path, 'results': results}, indent=2))
+        return 0
+    first = next(iter(results.values()))
+    print(f"{path}: {first['rows']:,} rows x {first['columns']} columns, "
+          f"{os.path.getsize(path) / 2 ** 20:.1f} MiB")
+    print(f"{'reader':<16} {'seconds':>9} {'peak MiB':>9}")
+    for reader, row in results.items():
+        print(f"{reader:<16} {row['seconds']:>9.2f} {row['peak_bytes'] / 2 ** 20:>9.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""Bytes per chart update, and a browser harness for chart render time.
+
+Loads the page layout once and then applies one highway after another,
+posting each Apply to /_dash-update-component through the Flask test client.
+For each update it reports:
+- the response size;
+- the size of the two chart payloads in it;
+- the server time, with the result cache off.
+The static figures that ship with the layout are counted once, as the layout
+bytes.
+
+--html writes a page that replays the same updates in a browser. It patches
+the figures the way the Dash renderer does and times each Plotly.react
+until the next frame. Open it in a browser; it prints the median, min and max
+update time.
+
+    python benchmarks/figure_updates.py /path/to/pmis.csv --html after.html --label after
+    python benchmarks/figure_updates.py /path/to/pmis.csv --app-dir /path/to/older/checkout --html before.html --label before
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+CHARTS = ('line-chart', 'bar-chart')
+
+HTML_TEMPLATE = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Chart render time: {label}</title>
+<script src="{plotly_js}"></script></head>
+<body>
+<pre id="report">running...</pre>
+<div id="line-chart"></div><div id="bar-chart"></div>
+<script>
+const initial = {initial};
+const updates = {updates};
+
+function applyPatch(figure, patch) {{
+    figure = structuredClone(figure);
+    for (const op of patch.operations) {{
+        let node = figure;
+        const path = op.location;
+        for (const key of path.slice(0, -1)) {{
+            if (node[key] === undefined) node[key] = {{}};
+            node = node[key];
+        }}
+        node[path[path.length - 1]] = op.params.value;
+    }}
+    return figure;
+}}
+
+function nextFrame() {{
+    return new Promise(resolve => requestAnimationFrame(() => resolve()));
+}}
+
+async function run() {{
+    const figures = {{}};
+    for (const id of Object.keys(initial)) {{
+        figures[id] = initial[id];
+        await Plotly.newPlot(id, figures[id].data || [], figures[id].layout || {{}});
+    }}
+    const times = [];
+    for (const update of updates) {{
+        const start = performance.now();
+        for (const [id, figure] of Object.entries(update)) {{
+            figures[id] = figure.__dash_patch_update ? applyPatch(figures[id], figure) : figure;
+            await Plotly.react(id, figures[id].data, figures[id].layout);
+        }}
+        await nextFrame();
+        times.push(performance.now() - start);
+    }}
+    times.sort((a, b) => a - b);
+    const median = times[Math.floor(times.length / 2)];
+    document.getElementById('report').textContent =
+        `{label}: ${{times.length}} updates, median ${{median.toFixed(1)}} ms, ` +
+        `min ${{times[0].toFixed(1)}} ms, max ${{times[times.length - 1].toFixed(1)}} ms`;
+    console.log(document.getElementById('report').textContent);
+}}
+run();
+</script></body></html>
+'''
+
+
+def apply_payload(layout_callback, highway):
+    state = {
+        'highway-filter': highway, 'begin-rm-filter': None, 'displacement1-filter': None,
+        'end-rm-filter': None, 'displacement2-filter': None,
+    }
+    return {
+        'output': layout_callback['output'],
+        'outputs': [{'id': i, 'property': p} for i, p in layout_callback['outputs']],
+        'inputs': [{'id': 'apply-filter', 'property': 'n_clicks', 'value': 1}],
+        'state': [{'id': i, 'property': p, 'value': state.get(i)} for i, p in layout_callback['state']],
+        'changedPropIds': ['apply-filter.n_clicks'],
+    }
+
+
+def chart_callback(client):
+    for cb in client.get('/_dash-dependencies').get_json():
+        if any(i['id'] == 'apply-filter' for i in cb['inputs']) and 'line-chart.figure' in cb['output']:
+            outputs = [tuple(o.rsplit('.', 1)) for o in cb['output'].strip('.').split('...')]
+            return {
+                'output': cb['output'],
+                'outputs': outputs,
+                'state': [(s['id'], s['property']) for s in cb['state']],
+            }
+    raise RuntimeError("no chart callback triggered by apply-filter")
+
+
+def find_figures(node, found):
+    if isinstance(node, dict):
+        props = node.get('props', {})
+        if node.get('type') == 'Graph' and props.get('id') in CHARTS:
+            found[props['id']] = props.get('figure') or {}
+        for value in node.values():
+            find_figures(value, found)
+    elif isinstance(node, list):
+        for value in node:
+            find_figures(value, found)
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help="PMIS CSV to load")
+    parser.add_argument('--app-dir', default=APP_DIR, help="directory holding the app.py to measure")
+    parser.add_argument('--updates', type=int, default=20, help="number of Apply clicks")
+    parser.add_argument('--html', help="write the browser render-time harness here")
+    parser.add_argument('--label', default='app', help="name shown in the harness report")
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args(argv)
+
+    os.environ['PMIS_DATA_PATH'] = os.path.abspath(args.source)
+    # every update builds its figures instead of coming from the result cache
+    os.environ['PMIS_RESULT_CACHE_SIZE'] = '0'
+    sys.path.insert(0, os.path.abspath(args.app_dir))
+    import app
+    import plotly
+
+    client = app.server.test_client()
+    layout_body = client.get('/_dash-layout').data
+    initial = find_figures(json.loads(layout_body), {})
+    callback = chart_callback(client)
+    highways = app.dataset.current().get_unique_values('TX_SIGNED_HIGHWAY_RDBD_ID')
+
+    updates, response_bytes, chart_bytes, seconds = [], [], [], []
+    for i in range(args.updates):
+        highway = highways[i % len(highways)]
+        start = time.perf_counter()
+        response = client.post('/_dash-update-component', json=apply_payload(callback, highway))
+        seconds.append(time.perf_counter() - start)
+        body = response.get_json()['response']
+        figures = {chart: body[chart]['figure'] for chart in CHARTS}
+        updates.append(figures)
+        response_bytes.append(len(response.data))
+        chart_bytes.append(sum(len(json.dumps(f, separators=(',', ':'))) for f in figures.values()))
+
+    report = {
+        'app_dir': os.path.abspath(args.app_dir),
+        'updates': args.updates,
+        'layout_bytes': len(layout_body),
+        'initial_figure_bytes': sum(len(json.dumps(f, separators=(',', ':'))) for f in initial.values()),
+        'response_bytes_median': statistics.median(response_bytes),
+        'chart_bytes_median': statistics.median(chart_bytes),
+        'server_ms_median': statistics.median(seconds) * 1000,
+    }
+
+    if args.html:
+        plotly_js = os.path.join(os.path.dirname(plotly.__file__), 'package_data', 'plotly.min.js')
+        with open(args.html, 'w') as f:
+            f.write(HTML_TEMPLATE.format(
+                label=args.label,
+                plotly_js='file://' + plotly_js,
+                initial=json.dumps(initial),
+                updates=json.dumps(updates),
+            ))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    print(f"layout (once):              {report['layout_bytes']:>9,} bytes, "
+          f"{report['initial_figure_bytes']:,} of them static figures")
+    print(f"per update, whole response: {report['response_bytes_median']:>9,.0f} bytes (median)")
+    print(f"per update, both charts:    {report['chart_bytes_median']:>9,.0f} bytes (median)")
+    print(f"server time per update:     {report['server_ms_median']:>9.1f} ms (median)")
+    if args.html:
+        print(f"render harness: {args.html}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""Throughput and latency of the dashboard under concurrent user sessions.
+
+Each simulated user repeats the callback sequence of a typical session over
+HTTP:
+- highway change: every server callback taking ``highway-filter.value``;
+- RM select: one begin RM from the returned options;
+- Apply: the charts and summary;
+- Export: the export button, then the ``export-poll`` interval every
+  --poll seconds until the job is done (skipped with --no-export).
+Payloads are built from /_dash-dependencies and /_dash-layout the way the
+renderer builds them (see session_requests.py). Clientside callbacks cost
+no request and are not run.
+
+Without --url the app is loaded in this process and served by werkzeug's
+threaded server, one thread per request. With --url the users drive a server
+that is already running, e.g. gunicorn with some --workers and --threads, so
+those counts can be sized from the results. It reports requests and sessions
+per second, and p50/p95/p99 latency per step.
+
+    python benchmarks/load_test.py /path/to/pmis.csv --users 8 --duration 30
+    python benchmarks/load_test.py --url http://127.0.0.1:8050 --users 16 --sessions 20
+"""
+import argparse
+import copy
+import http.client
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from session_requests import parse_outputs, walk_layout
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+STEPS = ('highway', 'rm select', 'apply', 'export', 'export poll', 'export job')
+
+
+class Client:
+    def __init__(self, url, timeout=120):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self.connection = None
+
+    def request(self, method, path, body=None):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            raise
+
+    def get_json(self, path):
+        status, data = self.request('GET', path)
+        if status != 200:
+            raise RuntimeError(f"GET {path} answered {status}")
+        return json.loads(data)
+
+
+class Dashboard:
+    """Callback graph and initial component props of the served app."""
+
+    def __init__(self, client):
+        self.store = {}
+        walk_layout(client.get_json('/_dash-layout'), self.store)
+        self.callbacks = [cb for cb in client.get_json('/_dash-dependencies') if not cb.get('clientside_function')]
+        for cb in self.callbacks:
+            cb['output_props'] = parse_outputs(cb['output'])
+            cb['input_props'] = [(i['id'], i['property']) for i in cb['inputs']]
+        self.highways = [opt['value'] for opt in self.store['highway-filter']['options']]
+
+    def observers(self, component_id, prop):
+        return [cb for cb in self.callbacks if (component_id, prop) in cb['input_props']]
+
+
+class User:
+    def __init__(self, url, dashboard, seed, poll, export_format):
+        self.client = Client(url)
+        self.dashboard = dashboard
+        self.rng = random.Random(seed)
+        self.poll = poll
+        self.export_format = export_format
+        self.latencies = {step: [] for step in STEPS}
+        self.errors = 0
+        self.sessions = 0
+
+    def get(self, component_id, prop):
+        return self.store.get(component_id, {}).get(prop)
+
+    def _post(self, step, cb, changed):
+        outputs = [{'id': i, 'property': p} for i, p in cb['output_props']]
+        payload = {
+            'output': cb['output'],
+            'outputs': outputs if len(outputs) > 1 else outputs[0],
+            'inputs': [dict(i, value=self.get(i['id'], i['property'])) for i in cb['inputs']],
+            'state': [dict(s, value=self.get(s['id'], s['property'])) for s in cb['state']],
+            'changedPropIds': [changed],
+        }
+        start = time.perf_counter()
+        try:
+            status, data = self.client.request('POST', '/_dash-update-component', json.dumps(payload))
+        except (OSError, http.client.HTTPException):
+            self.errors += 1
+            return
+        self.latencies[step].append(time.perf_counter() - start)
+        if status == 204:
+            return
+        if status != 200:
+            self.errors += 1
+            return
+        for component_id, props in json.loads(data)['response'].items():
+            self.store.setdefault(component_id, {}).update(props)
+
+    def set(self, step, component_id, prop, value):
+        self.store.setdefault(component_id, {})[prop] = value
+        for cb in self.dashboard.observers(component_id, prop):
+            self._post(step, cb, f'{component_id}.{prop}')
+
+    def click(self, step, component_id):
+        self.set(step, component_id, 'n_clicks', (self.get(component_id, 'n_clicks') or 0) + 1)
+
+    def session(self, export=True):
+        self.store = copy.deepcopy(self.dashboard.store)
+        self.store['export-format']['value'] = self.export_format
+        self.set('highway', 'highway-filter', 'value', self.rng.choice(self.dashboard.highways))
+        begin_rms = [opt['value'] for opt in self.get('begin-rm-filter', 'options') or [] if opt['value'] != 'all']
+        if begin_rms:
+            self.set('rm select', 'begin-rm-filter', 'value', [self.rng.choice(begin_rms)])
+        self.click('apply', 'apply-filter')
+        if export:
+            start = time.perf_counter()
+            self.click('export', 'export-btn')
+            while self.get('export-job', 'data') and self.get('export-poll', 'disabled') is False:
+                time.sleep(self.poll)
+                self.set('export poll', 'export-poll', 'n_intervals', (self.get('export-poll', 'n_intervals') or 0) + 1)
+            self.latencies['export job'].append(time.perf_counter() - start)
+        self.sessions += 1
+
+
+def serve_in_process(source):
+    os.environ['PMIS_DATA_PATH'] = os.path.abspath(source)
+    os.environ.setdefault('PMIS_EXPORT_DIR', tempfile.mkdtemp(prefix='pmis-load-test-'))
+    sys.path.insert(0, APP_DIR)
+    import app
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app.server, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}'
+
+
+def percentiles(values):
+    if not values:
+        return {'count': 0, 'p50': None, 'p95': None, 'p99': None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'count': len(values), 'p50': p50, 'p95': p95, 'p99': p99}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', nargs='?', help="PMIS CSV to serve in this process (omit with --url)")
+    parser.add_argument('--url', help="base URL of a running server")
+    parser.add_argument('--users', type=int, default=4, help="concurrent sessions")
+    parser.add_argument('--duration', type=float, default=20, help="seconds to run, unless --sessions is given")
+    parser.add_argument('--sessions', type=int, help="sessions per user instead of a duration")
+    parser.add_argument('--poll', type=float, default=0.5, help="export poll interval, as dcc.Interval")
+    parser.add_argument('--export-format', default='csv')
+    parser.add_argument('--no-export', action='store_true', help="leave out the export step")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args(argv)
+    if not args.url and not args.source:
+        parser.error("give a PMIS CSV to serve, or --url of a running server")
+
+    url = args.url or serve_in_process(args.source)
+    dashboard = Dashboard(Client(url))
+    users = [User(url, dashboard, args.seed + i, args.poll, args.export_format) for i in range(args.users)]
+    deadline = time.perf_counter() + args.duration
+
+    def run(user):
+        done = 0
+        while (done < args.sessions) if args.sessions else (time.perf_counter() < deadline):
+            user.session(export=not args.no_export)
+            done += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=run, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    steps = {step: percentiles([s for user in users for s in user.latencies[step]]) for step in STEPS}
+    requests = sum(row['count'] for step, row in steps.items() if step != 'export job')
+    sessions = sum(user.sessions for user in users)
+    report = {
+        'url': url,
+        'users': args.users,
+        'seconds': elapsed,
+        'sessions': sessions,
+        'requests': requests,
+        'errors': sum(user.errors for user in users),
+        'requests_per_second': requests / elapsed,
+        'sessions_per_second': sessions / elapsed,
+        'steps': steps,
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    print(f"{args.users} users, {sessions} sessions, {requests} requests in {elapsed:.1f} s: "
+          f"{report['requests_per_second']:.1f} req/s, {report['sessions_per_second']:.2f} sessions/s, "
+          f"{report['errors']} errors")
+    print(f"{'step':<12} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for step, row in steps.items():
+        if row['count']:
+            print(f"{step:<12} {row['count']:>6} {row['p50'] * 1000:>9.1f} {row['p95'] * 1000:>9.1f} {row['p99'] * 1000:>9.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""Peak memory and query time: in-memory DataHandler vs. the Parquet store.
+
+Each mode runs in a fresh process and reports its peak RSS above a baseline
+taken after the libraries are imported:
+- ``ingest`` converts the CSV into the store, chunk by chunk.
+- ``store`` opens the store and runs the queries.
+- ``in-memory`` builds a DataHandler and runs the same queries.
+The queries are the statewide and busiest-highway yearly aggregates, a
+per-highway, per-year group-by, and filter_data for one highway. Linux only,
+since peak RSS comes from getrusage in kilobytes.
+
+    python benchmarks/out_of_core.py /path/to/statewide.csv
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+
+GROUP_BY = ('TX_SIGNED_HIGHWAY_RDBD_ID', 'EFF_YEAR')
+METRICS = (('wmean', 'TX_CONDITION_SCORE'), ('sum', 'TX_LENGTH'))
+
+
+def peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def queries(backend, busiest):
+    timings = {}
+    for name, run in (
+        ('yearly aggregates, statewide', lambda: backend.yearly_aggregates({})),
+        ('yearly aggregates, one highway', lambda: backend.yearly_aggregates({'highway': [busiest]})),
+        ('group by highway and year', lambda: backend.aggregate({}, GROUP_BY, METRICS)),
+        ('filter_data, one highway', lambda: backend.filter_data({'highway': [busiest]})),
+    ):
+        start = time.perf_counter()
+        run()
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+def _worker(mode, source, busiest, results):
+    sys.path.insert(0, APP_DIR)
+    import app  # noqa: F401  (libraries only; PMIS_DATA_PATH points at a tiny file)
+    from columnar_store import ColumnarStore, ingest_csv
+
+    baseline = peak_rss()
+    start = time.perf_counter()
+    if mode == 'ingest':
+        ingest_csv(source)
+        timings = {}
+    elif mode == 'store':
+        timings = queries(ColumnarStore.for_source(source), busiest)
+    else:
+        timings = queries(app.DataHandler(source), busiest)
+    results.put({
+        'mode': mode,
+        'seconds': time.perf_counter() - start,
+        'peak_bytes': peak_rss() - baseline,
+        'queries': timings,
+    })
+
+
+def run_mode(mode, source, busiest):
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    process = ctx.Process(target=_worker, args=(mode, source, busiest, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def busiest_highway(source):
+    import pandas as pd
+
+    counts = None
+    for chunk in pd.read_csv(source, usecols=['TX_SIGNED_HIGHWAY_RDBD_ID'], chunksize=1000000):
+        chunk_counts = chunk['TX_SIGNED_HIGHWAY_RDBD_ID'].value_counts()
+        counts = chunk_counts if counts is None else counts.add(chunk_counts, fill_value=0)
+    return counts.idxmax()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help="PMIS CSV to measure")
+    parser.add_argument('--small', help="small PMIS CSV the app module loads on import",
+                        default=os.environ.get('PMIS_DATA_PATH'))
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args(argv)
+    if not args.small:
+        parser.error("--small (or PMIS_DATA_PATH) must name a small CSV for the app import")
+
+    os.environ['PMIS_DATA_PATH'] = os.path.abspath(args.small)
+    source = os.path.abspath(args.source)
+    busiest = busiest_highway(source)
+    report = [run_mode(mode, source, busiest) for mode in ('ingest', 'store', 'in-memory')]
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    print(f"{'mode':<10} {'seconds':>8} {'peak MiB':>9}")
+    for result in report:
+        print(f"{result['mode']:<10} {result['seconds']:>8.2f} {result['peak_bytes'] / 2**20:>9.1f}")
+    print()
+    names = list(report[-1]['queries'])
+    print(f"{'query (ms)':<32} {'store':>9} {'in-memory':>10}")
+    for name in names:
+        print(f"{name:<32} {report[1]['queries'][name] * 1000:>9.1f} {report[2]['queries'][name] * 1000:>10.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""Timings of the data pipeline on synthetic statewide tables.
+
+For each table size, writes a synthetic PMIS CSV (see synthetic.py) once
+under --data-dir. Then times:
+- App startup: ``import app`` and the first /_dash-layout request, each in a
+  fresh interpreter.
+- CSV load and the DataHandler build.
+- filter_data and calculate_condition_score.
+- The row and cube yearly aggregations.
+- Chart results and the chart figure updates.
+- /api/data JSON and NDJSON serialization.
+- CSV and parquet export.
+Each step runs over a fixed set of selections. Results are written as JSON.
+With --baseline, any step whose median is more than --threshold slower than
+the baseline's fails the run with exit status 1.
+
+    python benchmarks/pipeline.py --rows 100000 1000000 --output results.json
+    python benchmarks/pipeline.py --rows 100000 --baseline results.json --threshold 0.25
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'pmis-benchmarks')
+
+STARTUP_SCRIPT = '''
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter() - start
+start = time.perf_counter()
+app.server.test_client().get('/_dash-layout')
+print(json.dumps({'app startup': imported, 'first layout': time.perf_counter() - start}))
+'''
+
+# differences below this many seconds are noise, whatever the ratio
+MIN_REGRESSION_SECONDS = 0.002
+
+
+def timed(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return {'median': statistics.median(runs), 'min': min(runs), 'runs': runs}
+
+
+def startup(path, repeat):
+    """``import app`` and first-layout timings, each run in a new process."""
+    env = dict(os.environ, PMIS_DATA_PATH=path, PYTHONPATH=APP_DIR)
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], env=env, cwd=APP_DIR,
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        name: {'median': statistics.median(r[name] for r in runs), 'min': min(r[name] for r in runs),
+               'runs': [r[name] for r in runs]}
+        for name in runs[0]
+    }
+
+
+def selections(handler, seed=0):
+    """Named filter selections in the shape of canonical_selection tuples."""
+    rng = np.random.default_rng(seed)
+    highways = handler.get_unique_values('TX_SIGNED_HIGHWAY_RDBD_ID')
+    busiest = handler.df['TX_SIGNED_HIGHWAY_RDBD_ID'].value_counts().index[0]
+    picked = tuple(sorted(rng.choice(highways, min(5, len(highways)), replace=False)))
+    begin_values, _ = handler.filter_options({'highway': [busiest]})
+    begin_rm = tuple(sorted(rng.choice(begin_values, min(10, len(begin_values)), replace=False)))
+    return {
+        'statewide': ((), (), (), (), (), ()),
+        'busiest highway': ((busiest,), (), (), (), (), ()),
+        'five highways, 0.5 mi segments': (picked, (), (0.5,), (), (0.5,), ()),
+        'ten begin RMs': ((busiest,), begin_rm, (), (), (), ()),
+    }
+
+
+def run_size(app, path, repeat, load_repeat, export_dir):
+    from aggregate_cube import yearly_aggregates_from_rows
+    from columnar_cache import load_table
+    from data_api import DEFAULT_PAGE_SIZE, iter_ndjson, page_json, page_positions
+    from exporter import write_export
+    from figure_updates import figure_patch
+
+    results = startup(path, load_repeat)
+    results['csv load'] = timed(lambda: load_table(path), load_repeat)
+    handlers = []
+    results['DataHandler build'] = timed(lambda: handlers.append(app.DataHandler(path)), load_repeat)
+    handler = handlers[-1]
+    del handlers[:-1]
+
+    cases = selections(handler)
+    filters = {name: app.selection_filters(selection) for name, selection in cases.items()}
+    frames = {name: handler.filter_data(f) for name, f in filters.items()}
+    charts = {name: app.compute_chart_results(handler, selection) for name, selection in cases.items()}
+    columns = list(handler.df.columns)
+
+    def each(fn):
+        return lambda: [fn(name) for name in cases]
+
+    steps = {
+        'filter_data': each(lambda name: handler.filter_data(filters[name])),
+        'calculate_condition_score': each(lambda name: handler.calculate_condition_score(frames[name])),
+        'yearly aggregates (rows)': each(lambda name: yearly_aggregates_from_rows(frames[name])),
+        'yearly aggregates (cube)': each(lambda name: handler.yearly_aggregates(filters[name])),
+        'chart results': each(lambda name: app.compute_chart_results(handler, cases[name])),
+        'figures': each(lambda name: (
+            figure_patch(app.line_chart_update(charts[name]['yearly_data'])).to_plotly_json(),
+            figure_patch(app.bar_chart_update(charts[name]['bar_data'])).to_plotly_json(),
+        )),
+        '/api/data json page': each(lambda name: page_json(
+            handler.df, *page_positions(handler.filter_positions(filters[name]), limit=DEFAULT_PAGE_SIZE)[:1],
+            columns, len(frames[name]), None
+        )),
+        '/api/data ndjson stream': each(lambda name: sum(
+            len(chunk) for chunk in iter_ndjson(handler.df, handler.filter_positions(filters[name]), columns)
+        )),
+    }
+    for fmt in ('csv', 'parquet'):
+        target = os.path.join(export_dir, f'export.{fmt}')
+        steps[f'export {fmt}'] = each(lambda name, fmt=fmt, target=target: write_export(
+            handler.df, handler.filter_positions(filters[name]), target, fmt
+        ))
+
+    for name, fn in steps.items():
+        results[name] = timed(fn, repeat)
+    return results, {name: len(frame) for name, frame in frames.items()}
+
+
+def compare(results, baseline, threshold):
+    """Steps slower than ``baseline`` by more than ``threshold`` (a fraction)."""
+    regressions = []
+    for rows, steps in results.items():
+        for name, timing in steps.items():
+            previous = baseline.get(rows, {}).get(name)
+            if previous is None:
+                continue
+            limit = previous['median'] * (1 + threshold)
+            if timing['median'] > limit and timing['median'] - previous['median'] > MIN_REGRESSION_SECONDS:
+                regressions.append({
+                    'rows': int(rows), 'step': name,
+                    'baseline': previous['median'], 'current': timing['median'],
+                    'ratio': timing['median'] / previous['median'],
+                })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000], help="table sizes to benchmark")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="where the synthetic CSVs are kept")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5, help="runs per step")
+    parser.add_argument('--load-repeat', type=int, default=1,
+                        help="runs of app startup, the CSV load and the handler build")
+    parser.add_argument('--output', help="write the results JSON here")
+    parser.add_argument('--baseline', help="results JSON to check against")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="allowed slowdown against the baseline median (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, HERE)
+    from synthetic import write_csv
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    sizes = sorted(set(args.rows))
+    paths = {}
+    for rows in sizes:
+        paths[rows] = os.path.join(args.data_dir, f'pmis-{rows}-seed{args.seed}.csv')
+        if not os.path.exists(paths[rows]):
+            print(f"generating {rows:,} rows -> {paths[rows]}", file=sys.stderr)
+            write_csv(paths[rows], rows, args.seed)
+
+    # app loads PMIS_DATA_PATH on import; the smallest table keeps that cheap
+    os.environ['PMIS_DATA_PATH'] = paths[sizes[0]]
+    sys.path.insert(0, APP_DIR)
+    import app
+
+    results, selected_rows = {}, {}
+    with tempfile.TemporaryDirectory() as export_dir:
+        for rows in sizes:
+            print(f"benchmarking {rows:,} rows", file=sys.stderr)
+            results[str(rows)], selected_rows[str(rows)] = run_size(
+                app, paths[rows], args.repeat, args.load_repeat, export_dir
+            )
+
+    import pandas as pd
+    report = {
+        'meta': {
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'selected_rows': selected_rows,
+        },
+        'results': results,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], args.threshold)
+        report['regressions'] = regressions
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    for rows, steps in results.items():
+        print(f"\n{int(rows):,} rows")
+        print(f"{'step':<32} {'median ms':>10} {'min ms':>10}")
+        for name, timing in steps.items():
+            print(f"{name:<32} {timing['median'] * 1000:>10.1f} {timing['min'] * 1000:>10.1f}")
+    if args.baseline:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}")
+        for r in regressions:
+            print(f"  {r['rows']:>10,} rows  {r['step']:<32} "
+                  f"{r['baseline'] * 1000:.1f} -> {r['current'] * 1000:.1f} ms ({r['ratio']:.2f}x)")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
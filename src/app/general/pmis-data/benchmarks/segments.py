@@ -0,0 +1,86 @@
+"""Bytes and server time of /api/segments against downloading a whole layer.
+
+For each GeoJSON layer it requests, through the Flask test client:
+- the whole layer at zoom 6, the statewide view;
+- a zoom-12 viewport (about 0.2 x 0.1 degrees) around the layer's first feature;
+- the same viewport with ``fields`` cut to two properties;
+- the zoom-12 vector tile under that feature, cold and then from the tile cache.
+It then prints the response size and median time of each next to the size of
+the static file.
+
+    python benchmarks/segments.py /path/to/pmis.csv
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+
+
+def tile_of(lon, lat, z):
+    n = 2 ** z
+    lat = math.radians(lat)
+    return int((lon + 180) / 360 * n), int((1 - math.log(math.tan(lat) + 1 / math.cos(lat)) / math.pi) / 2 * n)
+
+
+def timed_get(client, url, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url)
+        runs.append(time.perf_counter() - start)
+    assert response.status_code == 200, (url, response.data[:200])
+    return len(response.data), statistics.median(runs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help="PMIS CSV the app loads on import")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args(argv)
+
+    os.environ['PMIS_DATA_PATH'] = os.path.abspath(args.source)
+    sys.path.insert(0, APP_DIR)
+    import app
+
+    client = app.server.test_client()
+    report = {}
+    for name in app.segment_index.names():
+        layer = app.segment_index.layer(name)
+        lon, lat = layer.bounds[0, :2].tolist()
+        bbox = f'{lon - 0.1},{lat - 0.05},{lon + 0.1},{lat + 0.05}'
+        fields = ','.join(layer.fields[:2])
+        x, y = tile_of(lon, lat, 12)
+        tile = f'/api/segments/tiles/12/{x}/{y}.mvt?layer={name}'
+        requests = {
+            'statewide, zoom 6': f'/api/segments?layer={name}&zoom=6',
+            'viewport, zoom 12': f'/api/segments?layer={name}&zoom=12&bbox={bbox}',
+            'viewport, 2 fields': f'/api/segments?layer={name}&zoom=12&bbox={bbox}&fields={fields}',
+        }
+        rows = {'static file': (os.path.getsize(layer.path), None)}
+        for label, url in requests.items():
+            rows[label] = timed_get(client, url, args.repeat)
+        app.tile_cache.clear()
+        rows['tile, cold'] = timed_get(client, tile, 1)
+        rows['tile, cached'] = timed_get(client, tile, args.repeat)
+        report[name] = {label: {'bytes': size, 'seconds': seconds} for label, (size, seconds) in rows.items()}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    for name, rows in report.items():
+        print(f"\n{name}")
+        for label, row in rows.items():
+            ms = '' if row['seconds'] is None else f"{row['seconds'] * 1000:>8.1f} ms"
+            print(f"  {label:<20} {row['bytes']:>11,} B {ms}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""Server round-trips per user session, counted from the callback graph.
+
+Replays a scripted session (load the page, pick a highway, open and use each
+filter, apply) the way the Dash renderer would. A prop change triggers every
+callback that takes it as an input. Callbacks whose inputs are still being
+produced by another pending callback wait for it. The props a callback
+returns trigger the next round, but never the callback itself. Server
+callbacks are posted to /_dash-update-component through the Flask test
+client and counted. Clientside callbacks run in node from the app's assets/
+folder and cost no request. Only callback requests are counted, not the
+page, layout and static files every session loads once.
+
+    python benchmarks/session_requests.py /path/to/pmis.csv
+    python benchmarks/session_requests.py /path/to/pmis.csv --app-dir /path/to/older/checkout
+"""
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+from collections import Counter, OrderedDict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+
+NODE_RUNNER = r'''
+const fs = require('fs');
+const readline = require('readline');
+const NO_UPDATE = {__no_update__: true};
+global.window = {dash_clientside: {no_update: NO_UPDATE, callback_context: {}}};
+for (const path of process.argv.slice(1)) {
+    eval(fs.readFileSync(path, 'utf8'));
+}
+readline.createInterface({input: process.stdin}).on('line', line => {
+    const call = JSON.parse(line);
+    window.dash_clientside.callback_context = {
+        triggered: call.changed.map(prop_id => ({prop_id: prop_id, value: null}))
+    };
+    const result = window.dash_clientside[call.namespace][call.function_name](...call.args);
+    process.stdout.write(JSON.stringify(result === undefined ? null : result) + '\n');
+});
+'''
+
+
+def parse_outputs(output):
+    if output.startswith('..'):
+        specs = output[2:-2].split('...')
+    else:
+        specs = [output]
+    return [tuple(spec.rsplit('.', 1)) for spec in specs]
+
+
+def walk_layout(node, store):
+    if isinstance(node, list):
+        for child in node:
+            walk_layout(child, store)
+    elif isinstance(node, dict) and 'props' in node:
+        props = node['props']
+        if 'id' in props:
+            store[props['id']] = props
+        for value in props.values():
+            walk_layout(value, store)
+
+
+class Session:
+    def __init__(self, app_module):
+        self.client = app_module.server.test_client()
+        self.store = {}
+        walk_layout(self.client.get('/_dash-layout').get_json(), self.store)
+        self.callbacks = self.client.get('/_dash-dependencies').get_json()
+        for cb in self.callbacks:
+            cb['output_props'] = parse_outputs(cb['output'])
+            cb['input_props'] = [(i['id'], i['property']) for i in cb['inputs']]
+        self.requests = Counter()
+        self.clientside_calls = 0
+        self._node = None
+        self._assets = sorted(glob.glob(os.path.join(os.path.dirname(app_module.__file__), 'assets', '*.js')))
+
+    def close(self):
+        if self._node is not None:
+            self._node.stdin.close()
+            self._node.wait()
+
+    def get(self, component_id, prop):
+        return self.store.get(component_id, {}).get(prop)
+
+    def _run_clientside(self, cb, args, changed):
+        if self._node is None:
+            self._node = subprocess.Popen(['node', '-e', NODE_RUNNER] + self._assets,
+                                          stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        call = dict(cb['clientside_function'], args=args, changed=sorted(changed))
+        self._node.stdin.write(json.dumps(call) + '\n')
+        self._node.stdin.flush()
+        result = json.loads(self._node.stdout.readline())
+        values = result if len(cb['output_props']) > 1 else [result]
+        return {prop: value for prop, value in zip(cb['output_props'], values)
+                if not (isinstance(value, dict) and value.get('__no_update__'))}
+
+    def _run_server(self, cb, changed):
+        outputs = [{'id': i, 'property': p} for i, p in cb['output_props']]
+        payload = {
+            'output': cb['output'],
+            'outputs': outputs if len(outputs) > 1 else outputs[0],
+            'inputs': [dict(i, value=self.get(i['id'], i['property'])) for i in cb['inputs']],
+            'state': [dict(s, value=self.get(s['id'], s['property'])) for s in cb['state']],
+            'changedPropIds': sorted(changed),
+        }
+        response = self.client.post('/_dash-update-component', json=payload)
+        self.requests[cb['output']] += 1
+        if response.status_code == 204:
+            return {}
+        body = response.get_json()['response']
+        return {(i, p): value for i, props in body.items() for p, value in props.items()}
+
+    def _observers(self, props, pending, exclude=None):
+        for index, cb in enumerate(self.callbacks):
+            if index == exclude:
+                continue
+            matched = {f'{i}.{p}' for i, p in cb['input_props'] if (i, p) in props}
+            if matched:
+                pending.setdefault(index, set()).update(matched)
+
+    def dispatch(self, pending):
+        while pending:
+            produced = {}
+            for index in pending:
+                for prop in self.callbacks[index]['output_props']:
+                    produced.setdefault(prop, set()).add(index)
+            ready = [index for index in pending
+                     if not any(produced.get(prop, set()) - {index} for prop in self.callbacks[index]['input_props'])]
+            for index in ready or list(pending):
+                changed = pending.pop(index)
+                cb = self.callbacks[index]
+                if cb.get('clientside_function'):
+                    args = [self.get(i, p) for i, p in cb['input_props']]
+                    args += [self.get(s['id'], s['property']) for s in cb['state']]
+                    updates = self._run_clientside(cb, args, changed)
+                    self.clientside_calls += 1
+                else:
+                    updates = self._run_server(cb, changed)
+                for (component_id, prop), value in updates.items():
+                    self.store.setdefault(component_id, {})[prop] = value
+                self._observers(updates, pending, exclude=index)
+
+    def load(self):
+        # like the renderer, skip callbacks whose inputs are not in the layout
+        # (e.g. pattern-matching callbacks registered by imported libraries)
+        pending = OrderedDict((index, set()) for index, cb in enumerate(self.callbacks)
+                              if not cb.get('prevent_initial_call')
+                              and all(i in self.store for i, _ in cb['input_props']))
+        self.dispatch(pending)
+
+    def set(self, component_id, prop, value):
+        self.store.setdefault(component_id, {})[prop] = value
+        pending = OrderedDict()
+        self._observers({(component_id, prop): value}, pending)
+        self.dispatch(pending)
+
+    def click(self, component_id):
+        self.set(component_id, 'n_clicks', (self.get(component_id, 'n_clicks') or 0) + 1)
+
+
+def option_values(session, component_id):
+    return [opt['value'] for opt in session.get(component_id, 'options') or [] if opt['value'] != 'all']
+
+
+def scripted_session(session):
+    """Yield (step, requests so far) while walking through a typical session."""
+    session.load()
+    yield 'load page', sum(session.requests.values())
+    session.set('highway-filter', 'value', option_values(session, 'highway-filter')[0])
+    yield 'pick highway', sum(session.requests.values())
+    session.click('begin-rm-collapse-button')
+    session.set('begin-rm-filter', 'value', ['all'])
+    session.click('begin-rm-clear-button')
+    yield 'open begin RM, select all, clear', sum(session.requests.values())
+    begin_rms = option_values(session, 'begin-rm-filter')
+    session.set('begin-rm-filter', 'value', begin_rms[:1])
+    session.set('begin-rm-filter', 'value', begin_rms[:2])
+    yield 'pick two begin RMs', sum(session.requests.values())
+    session.click('displacement1-collapse-button')
+    session.set('displacement1-filter', 'value', [0.5])
+    session.click('end-rm-collapse-button')
+    session.set('end-rm-filter', 'value', option_values(session, 'end-rm-filter')[-1:])
+    session.click('end-rm-collapse-button')
+    session.click('displacement2-collapse-button')
+    session.set('displacement2-filter', 'value', [0.5])
+    yield 'set displacements and end RM', sum(session.requests.values())
+    session.click('apply-filter')
+    yield 'apply', sum(session.requests.values())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help="PMIS CSV to load")
+    parser.add_argument('--app-dir', default=APP_DIR, help="directory holding the app.py to measure")
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args(argv)
+
+    os.environ['PMIS_DATA_PATH'] = os.path.abspath(args.source)
+    sys.path.insert(0, os.path.abspath(args.app_dir))
+    import app
+
+    session = Session(app)
+    try:
+        steps = list(scripted_session(session))
+    finally:
+        session.close()
+
+    if args.json:
+        print(json.dumps({
+            'steps': steps,
+            'requests': sum(session.requests.values()),
+            'by_callback': dict(session.requests),
+            'clientside_calls': session.clientside_calls,
+        }, indent=2))
+        return 0
+
+    previous = 0
+    print(f"{'step':<34} {'requests':>8}")
+    for step, total in steps:
+        print(f"{step:<34} {total - previous:>8}")
+        previous = total
+    print(f"{'total':<34} {previous:>8}")
+    print(f"clientside calls (no request): {session.clientside_calls}")
+    for output, count in session.requests.most_common():
+        print(f"  {count:>4}  {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Per-worker memory with private vs. shared (memory-mapped) dataset loading.
+
+Starts N worker processes that each import the dashboard the way a server
+worker would, waits until all of them have loaded the data, and reports each
+worker's RSS, PSS (shared pages split between the processes mapping them)
+and USS (pages private to the worker), minus a baseline taken after the
+libraries are imported but before the data loads. Linux only, since it reads
+/proc/self/smaps_rollup.
+
+    python benchmarks/shared_memory.py /path/to/pmis.csv --workers 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+
+MODES = {
+    'private': {},
+    'shared': {'PMIS_SHARED_DATA': '1'},
+}
+
+
+def memory_usage():
+    usage = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[2] == 'kB':
+                usage[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    return {
+        'rss': usage['Rss'],
+        'pss': usage['Pss'],
+        'uss': usage.get('Private_Clean', 0) + usage.get('Private_Dirty', 0),
+    }
+
+
+def _worker(barrier, results):
+    sys.path.insert(0, APP_DIR)
+    import dash  # noqa: F401
+    import pandas  # noqa: F401
+    import pyarrow  # noqa: F401
+    baseline = memory_usage()
+
+    import app
+    app.dataset.current()
+    barrier.wait()
+    loaded = memory_usage()
+    # measure again once every worker has mapped the file, so PSS is split
+    barrier.wait()
+    results.put({key: loaded[key] - baseline[key] for key in loaded})
+
+
+def run_mode(source, mode, workers):
+    os.environ.update({'PMIS_DATA_PATH': os.path.abspath(source), **MODES[mode]})
+    for key in set().union(*MODES.values()) - set(MODES[mode]):
+        os.environ.pop(key, None)
+
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=_worker, args=(barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {key: sum(s[key] for s in samples) / len(samples) for key in samples[0]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help="PMIS CSV to load")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, APP_DIR)
+    from columnar_cache import build_cache, is_cache_fresh
+    if not is_cache_fresh(args.source):
+        build_cache(args.source)
+
+    report = {mode: run_mode(args.source, mode, args.workers) for mode in MODES}
+    if args.json:
+        print(json.dumps({'workers': args.workers, 'per_worker_bytes': report}, indent=2))
+        return 0
+
+    print(f"Dataset memory per worker ({args.workers} workers, MiB above library baseline)")
+    print(f"{'mode':<8} {'RSS':>8} {'PSS':>8} {'USS':>8}")
+    for mode, usage in report.items():
+        print(f"{mode:<8} " + ' '.join(f"{usage[k] / 2**20:>8.1f}" for k in ('rss', 'pss', 'uss')))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""Synthetic statewide PMIS tables for benchmarking.
+
+Builds a plausible Texas network:
+- Interstates on divided L/R roadbeds.
+- US and state highways.
+- Thousands of short farm-to-market roads.
+Each route is cut into mostly half-mile segments between numbered reference
+markers, a few of them with letter suffixes. Every segment is rated once a
+year. Scores follow a wear-and-rehabilitation cycle, so yearly trends look
+like the sample file. The columns and dtypes match the PMIS extract the
+dashboard reads, so the files load through the same code path.
+
+    python benchmarks/synthetic.py 1000000 /tmp/pmis-1m.csv
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = [
+    'EFF_YEAR', 'RESPONSIBLE_DISTRICT', 'COUNTY', 'MAINT_SECTION', 'TX_SIGNED_HIGHWAY_RDBD_ID',
+    'TX_BEG_REF_MARKER_NBR', 'TX_BEG_REF_MRKR_DISP', 'TX_END_REF_MARKER_NBR', 'TX_END_REF_MARKER_DISP',
+    'TX_LENGTH', 'TX_CONDITION_SCORE', 'TX_DISTRESS_SCORE', 'TX_RIDE_SCORE', 'TX_IRI_LEFT_SCORE',
+    'TX_IRI_RIGHT_SCORE', 'TX_IRI_AVERAGE_SCORE', 'BROAD_PAV_TYPE', 'DETAILED_PAV_TYPE', 'TX_RTG_CYCLE_ID',
+    'TX_VISUAL_LANE_CODE', 'TX_AADT_CURRENT', 'TX_TRUCK_AADT_PCT', 'TX_NUMBER_THRU_LANES',
+    'TX_CURRENT_18KIP_MEAS', 'TX_SPEED_LIMIT_MAX', 'TX_MAINTENANCE_COST_AMT',
+    'TX_TOTL_SURF_RDWAY_WIDTH_MEAS', 'TX_ATHWLD_100_LBS', 'TX_CRCP_SPALLED_CRACKS_QTY',
+    'TX_JCP_PCC_PATCHES_QTY', 'TX_CRCP_PUNCHOUT_QTY', 'TX_CRCP_ACP_PATCHES_QTY',
+]
+
+YEARS = np.arange(1993, 2025)
+
+# route system -> (share of routes drawn, route numbers, roadbeds, length range in miles, AADT scale)
+ROUTE_SYSTEMS = {
+    'IH': (0.02, np.array([10, 20, 27, 30, 35, 37, 40, 44, 45, 69, 410, 610, 635, 820]), ('L', 'R'), (40, 880), 40000),
+    'US': (0.10, np.arange(54, 400), ('K', 'L', 'R'), (20, 400), 12000),
+    'SH': (0.18, np.arange(1, 360), ('K',), (8, 200), 6000),
+    'FM': (0.70, np.arange(1, 3500), ('K',), (2, 40), 1500),
+}
+
+CHUNK_ROWS = 250000
+
+
+def _routes(rng):
+    """Yield (highway ID, length in miles, AADT scale) without repeating IDs."""
+    systems = list(ROUTE_SYSTEMS)
+    shares = np.array([ROUTE_SYSTEMS[s][0] for s in systems])
+    seen = set()
+    while True:
+        system = systems[rng.choice(len(systems), p=shares / shares.sum())]
+        _, numbers, roadbeds, (low, high), aadt = ROUTE_SYSTEMS[system]
+        number = int(rng.choice(numbers))
+        length = float(rng.uniform(low, high))
+        for roadbed in roadbeds if system == 'IH' else (rng.choice(roadbeds),):
+            highway = f'{system}{number:04d} {roadbed}'
+            if highway in seen:
+                continue
+            seen.add(highway)
+            yield highway, length, aadt
+
+
+def _segments(rng, length):
+    """Segment start positions and lengths along a route of ``length`` miles."""
+    start = float(rng.integers(0, 300))
+    lengths = np.full(max(1, int(length / 0.5)), 0.5)
+    # about a third of the segments are cut short at a county line, bridge or
+    # change of pavement
+    irregular = rng.random(len(lengths)) < 0.3
+    lengths[irregular] = rng.choice([0.1, 0.2, 0.3, 0.4, 0.499, 0.501, 0.6], irregular.sum())
+    starts = start + np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    return np.round(starts, 3), lengths
+
+
+def _markers(rng, positions):
+    numbers = np.floor(positions + 1e-9).astype(np.int64)
+    labels = numbers.astype(str).astype(object)
+    # auxiliary markers such as 100A
+    suffixed = rng.random(len(labels)) < 0.002
+    labels[suffixed] = labels[suffixed] + 'A'
+    return labels, np.round(positions - numbers, 3)
+
+
+def highway_frame(rng, highway, length, aadt_scale):
+    starts, lengths = _segments(rng, length)
+    n_segments = len(starts)
+    first_year = int(rng.choice(YEARS[:8]))
+    years = YEARS[YEARS >= first_year]
+    n = n_segments * len(years)
+
+    seg = np.tile(np.arange(n_segments), len(years))
+    year = np.repeat(years, n_segments)
+
+    begin_labels, begin_disp = _markers(rng, starts)
+    end_labels, end_disp = _markers(rng, starts + lengths)
+
+    # wear since the last rehabilitation drives all scores
+    cycle = rng.integers(6, 20, n_segments)[seg]
+    age = (year + rng.integers(0, 20, n_segments)[seg]) % cycle
+    wear = age * rng.uniform(1.0, 5.0, n_segments)[seg] + rng.normal(0, 4, n)
+    distress = np.clip(np.round(100 - wear), 0, 100)
+    ride = np.clip(np.round(4.8 - age * 0.09 + rng.normal(0, 0.3, n), 1), 0.1, 5.0)
+    ride[rng.random(n) < 0.02] = np.nan
+    condition = np.clip(np.round(distress * (0.7 + 0.06 * np.nan_to_num(ride, nan=4.0))), 0, 100)
+    condition[rng.random(n) < 0.001] = np.nan
+    iri_left = np.clip(np.round(60 + age * 9 + rng.normal(0, 10, n)), 30, 400)
+    iri_right = np.clip(np.round(iri_left + rng.normal(0, 6, n)), 30, 400)
+    quantities = {
+        column: np.minimum(rng.poisson(age * rate), 4)
+        for column, rate in (('TX_CRCP_SPALLED_CRACKS_QTY', 0.05), ('TX_JCP_PCC_PATCHES_QTY', 0.02),
+                             ('TX_CRCP_PUNCHOUT_QTY', 0.02), ('TX_CRCP_ACP_PATCHES_QTY', 0.03))
+    }
+
+    district = int(rng.integers(1, 26))
+    county = rng.integers(1, 255, max(1, n_segments // 40 + 1))[np.arange(n_segments) // 40][seg]
+    aadt = np.round(rng.lognormal(np.log(aadt_scale), 0.5, n_segments)[seg] * (1.02 ** (year - YEARS[0])), -1)
+    lanes = (2 if highway.endswith('K') else 4) + 2 * rng.integers(0, 2, n_segments)[seg]
+    pavement = rng.choice([1, 2, 3], n_segments, p=[0.2, 0.3, 0.5])[seg]
+    cost = np.round(rng.gamma(1.5, 120, n))
+    cost[rng.random(n) < 0.03] = np.nan
+    lane_code = rng.choice([1.0, 2.0, 3.0, 6.0, 7.0], n)
+    lane_code[rng.random(n) < 0.017] = np.nan
+
+    return pd.DataFrame({
+        'EFF_YEAR': year,
+        'RESPONSIBLE_DISTRICT': np.full(n, district),
+        'COUNTY': county,
+        'MAINT_SECTION': district * 100 + county % 20,
+        'TX_SIGNED_HIGHWAY_RDBD_ID': highway,
+        'TX_BEG_REF_MARKER_NBR': begin_labels[seg],
+        'TX_BEG_REF_MRKR_DISP': begin_disp[seg],
+        'TX_END_REF_MARKER_NBR': end_labels[seg],
+        'TX_END_REF_MARKER_DISP': end_disp[seg],
+        'TX_LENGTH': lengths[seg],
+        'TX_CONDITION_SCORE': condition,
+        'TX_DISTRESS_SCORE': distress,
+        'TX_RIDE_SCORE': ride,
+        'TX_IRI_LEFT_SCORE': iri_left,
+        'TX_IRI_RIGHT_SCORE': iri_right,
+        'TX_IRI_AVERAGE_SCORE': np.round((iri_left + iri_right) / 2),
+        'BROAD_PAV_TYPE': np.where(pavement == 3, 1, pavement + 1),
+        'DETAILED_PAV_TYPE': pavement,
+        'TX_RTG_CYCLE_ID': np.ones(n, dtype=np.int64),
+        'TX_VISUAL_LANE_CODE': lane_code,
+        'TX_AADT_CURRENT': aadt.astype(np.int64),
+        'TX_TRUCK_AADT_PCT': np.round(rng.uniform(5, 40, n_segments)[seg], 1),
+        'TX_NUMBER_THRU_LANES': lanes,
+        'TX_CURRENT_18KIP_MEAS': np.round(aadt * rng.uniform(0.5, 2.0, n_segments)[seg]),
+        'TX_SPEED_LIMIT_MAX': rng.choice([30.0, 45.0, 55.0, 65.0, 70.0, 75.0], n_segments)[seg],
+        'TX_MAINTENANCE_COST_AMT': cost,
+        'TX_TOTL_SURF_RDWAY_WIDTH_MEAS': lanes * 12 + rng.choice([0, 4, 8, 10], n_segments)[seg],
+        'TX_ATHWLD_100_LBS': np.round(rng.normal(115, 8, n)),
+        **quantities,
+    }, columns=COLUMNS)
+
+
+def generate(n_rows, seed=0):
+    """Yield DataFrame chunks adding up to exactly ``n_rows`` rows."""
+    rng = np.random.default_rng(seed)
+    remaining = n_rows
+    pending = []
+    pending_rows = 0
+    for highway, length, aadt_scale in _routes(rng):
+        frame = highway_frame(rng, highway, length, aadt_scale)
+        frame = frame.iloc[:remaining]
+        pending.append(frame)
+        pending_rows += len(frame)
+        remaining -= len(frame)
+        if pending_rows >= CHUNK_ROWS or remaining == 0:
+            yield pd.concat(pending, ignore_index=True)
+            pending, pending_rows = [], 0
+        if remaining == 0:
+            return
+
+
+def write_csv(path, n_rows, seed=0):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        for i, chunk in enumerate(generate(n_rows, seed)):
+            chunk.to_csv(f, index=False, header=(i == 0))
+    os.replace(tmp_path, path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('rows', type=int, help="number of rows to generate")
+    parser.add_argument('output', help="CSV file to write")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    write_csv(args.output, args.rows, args.seed)
+    print(f"wrote {args.rows:,} rows to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
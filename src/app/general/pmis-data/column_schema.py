@@ -0,0 +1,213 @@
+"""Declared column types for holding PMIS tables compactly in memory.
+
+``pd.read_csv`` gives every integer column int64, every decimal column
+float64 and every text column an object array with a Python string per row.
+That covers the year, the district/county codes, the pavement types and the
+highway ID and RM strings, which repeat on every row. ``compact_frame``
+converts each column by its rule in SCHEMA instead:
+
+    int      the smallest integer type holding the column (EFF_YEAR -> int16)
+    code     text becomes a categorical; numeric codes are treated as ``int``
+    float32  float32 when every value converts back unchanged, float64 otherwise
+    float64  left as float64
+
+No conversion changes a value. A float column that float32 cannot hold
+exactly stays float64, and integer rules never turn a float column (with
+blanks, say) into integers. Filters, exports and the JSON APIs therefore see
+the same values, and the row-level aggregations widen float32 back to
+float64 before they sum (see grouped_stats.py). TX_LENGTH and the
+displacements stay float64: they are the weights and positions that scores
+are multiplied by and added to, and a float32 product would round
+differently.
+
+Every column is kept by default, since exports and ``/api/data`` return
+the whole source row. Columns outside SCHEMA get the rule their dtype
+suggests (text -> code, integers -> int, floats -> float32). ``keep=[]``
+keeps only the SCHEMA columns the dashboard and the aggregate APIs use, and
+a list of names keeps those as well. DataHandler passes
+``column_selector(keep)`` to the CSV reader, so with a narrow ``keep`` the
+other columns are never parsed: most of the memory a load leaves behind is
+what ``pd.read_csv`` allocated along the way, not the table it returns.
+
+``memory_report`` lists each column's dtype and deep memory use. Run
+``python column_schema.py <csv>`` to compare a source as read and compacted.
+"""
+import argparse
+import ctypes
+import ctypes.util
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+SCHEMA = {
+    'EFF_YEAR': 'int',
+    'RESPONSIBLE_DISTRICT': 'code',
+    'COUNTY': 'code',
+    'TX_SIGNED_HIGHWAY_RDBD_ID': 'code',
+    'TX_BEG_REF_MARKER_NBR': 'code',
+    'TX_BEG_REF_MRKR_DISP': 'float64',
+    'TX_END_REF_MARKER_NBR': 'code',
+    'TX_END_REF_MARKER_DISP': 'float64',
+    'TX_LENGTH': 'float64',
+    'TX_CONDITION_SCORE': 'float32',
+    'TX_DISTRESS_SCORE': 'float32',
+    'TX_RIDE_SCORE': 'float32',
+    'BROAD_PAV_TYPE': 'code',
+    'DETAILED_PAV_TYPE': 'code',
+    'TX_CRCP_SPALLED_CRACKS_QTY': 'int',
+    'TX_JCP_PCC_PATCHES_QTY': 'int',
+    'TX_CRCP_PUNCHOUT_QTY': 'int',
+    'TX_CRCP_ACP_PATCHES_QTY': 'int',
+}
+INT_TYPES = (np.int8, np.int16, np.int32, np.int64)
+
+
+def _inferred_rule(series):
+    if series.dtype.kind in 'iu':
+        return 'int'
+    if series.dtype.kind == 'f':
+        return 'float32'
+    return 'code'
+
+
+def _smallest_int(values):
+    if len(values) == 0:
+        return values
+    low, high = values.min(), values.max()
+    for dtype in INT_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return values.astype(dtype, copy=False)
+    return values
+
+
+def _fits_float32(values):
+    # checked on the distinct values: each must convert back exactly and print
+    # the same, since CSV exports print float32 with float32's shortest repr
+    # (0.10000000149011612 would become 0.1)
+    distinct = np.unique(values[~np.isnan(values)])
+    narrow = distinct.astype(np.float32)
+    if not np.array_equal(narrow.astype(np.float64), distinct):
+        return False
+    return all(str(a) == repr(b) for a, b in zip(narrow, distinct.tolist()))
+
+
+def compact_column(series, rule):
+    """``series``'s values in the type ``rule`` allows, or as they are."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return series.array
+    if rule in ('int', 'code') and dtype.kind in 'iu':
+        return _smallest_int(series.to_numpy())
+    if rule == 'code' and dtype == object:
+        return pd.Categorical(series)
+    if rule == 'float32' and dtype == np.float64 and _fits_float32(series.to_numpy()):
+        return series.to_numpy().astype(np.float32)
+    return series.array if not isinstance(dtype, np.dtype) else series.to_numpy()
+
+
+def column_selector(keep='all'):
+    """A predicate for the column names ``keep`` selects, as read_csv's usecols takes."""
+    if keep == 'all':
+        return lambda column: True
+    extra = frozenset(keep or ())
+    return lambda column: column in SCHEMA or column in extra
+
+
+def kept_columns(df, keep='all'):
+    """The columns of ``df`` that ``keep`` selects, in ``df``'s order."""
+    missing = sorted(set(keep or ()) - set(df.columns)) if keep != 'all' else []
+    if missing:
+        warnings.warn(f"PMIS data has no columns {missing}; they are not loaded")
+    selected = column_selector(keep)
+    return [column for column in df.columns if selected(column)]
+
+
+def compact_frame(df, keep='all'):
+    """``df`` with the ``keep`` columns (see kept_columns) in their SCHEMA types."""
+    columns = {
+        column: compact_column(df[column], SCHEMA.get(column) or _inferred_rule(df[column]))
+        for column in kept_columns(df, keep)
+    }
+    # copy=False keeps one block per column, as frozen_frame and the cache do
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+
+def release_freed_memory():
+    """Hand heap memory freed during a load back to the OS, where libc allows it.
+
+    glibc keeps freed heap pages (the CSV parser's buffers, the strings of
+    the frame as read) mapped in the process until ``malloc_trim``, so
+    without it a worker's RSS stays near its load-time peak. Elsewhere this
+    does nothing and returns False.
+    """
+    try:
+        trim = ctypes.CDLL(ctypes.util.find_library('c')).malloc_trim
+    except (OSError, AttributeError, TypeError):
+        return False
+    return bool(trim(0))
+
+
+def parse_keep(value):
+    """``keep`` from a PMIS_COLUMNS setting.
+
+    Unset, '' and 'all' keep every column; 'schema' keeps only the SCHEMA
+    columns, and comma-separated names keep those besides them.
+    """
+    value = (value or '').strip()
+    if value.lower() in ('', 'all'):
+        return 'all'
+    return [name.strip() for name in value.split(',') if name.strip() and name.strip().lower() != 'schema']
+
+
+def column_bytes(series):
+    """Deep memory of ``series``'s values, strings included."""
+    if series.dtype == object:
+        # pandas cannot measure a read-only object array (see snapshot.py)
+        series = pd.Series(series.to_numpy().copy(), copy=False)
+    return int(series.memory_usage(index=False, deep=True))
+
+
+def memory_report(df):
+    """One row per column of ``df``: dtype, deep bytes, bytes per row and share."""
+    usage = np.array([column_bytes(df.iloc[:, i]) for i in range(df.shape[1])], dtype='int64')
+    return pd.DataFrame({
+        'column': [str(column) for column in df.columns],
+        'dtype': [str(dtype) for dtype in df.dtypes],
+        'bytes': usage,
+        'bytes_per_row': usage / max(len(df), 1),
+        'share': usage / max(int(usage.sum()), 1),
+    })
+
+
+def _print_report(title, report):
+    print(f"{title}: {report['bytes'].sum() / 2 ** 20:.1f} MiB")
+    for row in report.itertuples(index=False):
+        print(f"  {row.column:<32} {row.dtype:<10} {row.bytes / 2 ** 20:>8.2f} MiB "
+              f"{row.bytes_per_row:>6.1f} B/row {row.share:>6.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-column memory of a PMIS source as read and compacted.")
+    parser.add_argument('source', help="CSV or .xlsx file")
+    parser.add_argument('--columns', default='', help="'schema', extra columns to keep, or 'all' (as PMIS_COLUMNS)")
+    args = parser.parse_args(argv)
+
+    from columnar_cache import read_source
+
+    df = read_source(args.source)
+    start = time.perf_counter()
+    compact = compact_frame(df, parse_keep(args.columns))
+    elapsed = time.perf_counter() - start
+    before, after = memory_report(df), memory_report(compact)
+    _print_report(f"as read, {len(df):,} rows", before)
+    _print_report(f"compacted in {elapsed:.2f}s", after)
+    print(f"{before['bytes'].sum() / max(after['bytes'].sum(), 1):.1f}x smaller")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
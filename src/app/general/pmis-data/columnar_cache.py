@@ -0,0 +1,231 @@
+"""On-disk columnar cache for PMIS source files.
+
+The first load of a CSV or Excel workbook writes an uncompressed Arrow IPC
+file into a ``.pmis-cache`` directory next to the source, together with a
+small JSON sidecar recording the source path, size, mtime and SHA-256. Later
+loads read the Arrow file directly and only fall back to parsing the CSV
+when the source has actually changed. Workbooks (read by excel_source.py) always go through
+the cache when pyarrow is installed, since parsing one is far slower than
+parsing a CSV.
+
+Every column is stored in its compact type (see column_schema.py), text as
+Arrow dictionaries that load back as categoricals. Numeric columns are stored
+with NaN in place rather than as Arrow nulls, so with ``memory_map=True`` they
+become zero-copy, read-only views of the mapped file. Every worker process
+that maps the same cache file then shares one copy of those columns through
+the OS page cache; only the categorical codes and their categories are
+materialized per process.
+
+Run ``python columnar_cache.py <csv> [<csv> ...]`` to pre-build caches during
+a deploy.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import warnings
+
+import pandas as pd
+
+from column_schema import compact_frame
+from excel_source import is_excel, read_xlsx
+
+CACHE_DIR_NAME = '.pmis-cache'
+CACHE_FORMAT_VERSION = 4
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def cache_paths(source_path):
+    source_path = os.path.abspath(source_path)
+    cache_dir = os.path.join(os.path.dirname(source_path), CACHE_DIR_NAME)
+    base = os.path.basename(source_path)
+    return os.path.join(cache_dir, base + '.arrow'), os.path.join(cache_dir, base + '.json')
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_signature(source_path, with_hash=False):
+    stat = os.stat(source_path)
+    signature = {
+        'format_version': CACHE_FORMAT_VERSION,
+        'path': os.path.abspath(source_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+    }
+    if with_hash:
+        signature['sha256'] = file_hash(source_path)
+    return signature
+
+
+def read_source(source_path, usecols=None):
+    """The table in ``source_path``; ``usecols`` picks columns by name, as in read_csv."""
+    if is_excel(source_path):
+        df = read_xlsx(source_path)
+        return df if usecols is None else df[[column for column in df.columns if usecols(column)]]
+    # low_memory=False infers each column from the whole file, so RM columns
+    # holding values like '100A' come back as one dtype instead of mixed
+    # int/str chunks (which Arrow cannot store and sorted() cannot compare)
+    return pd.read_csv(source_path, low_memory=False, usecols=usecols)
+
+
+def write_arrow(df, path):
+    import pyarrow as pa
+
+    arrays = []
+    for column in df.columns:
+        series = df[column]
+        if series.dtype.kind in 'iufb':
+            # keep NaN as a value: a validity bitmap would force a copy on load
+            arrays.append(pa.array(series.to_numpy()))
+        else:
+            arrays.append(pa.array(series, from_pandas=True))
+    table = pa.Table.from_arrays(arrays, names=[str(c) for c in df.columns])
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def read_arrow(path, memory_map=False, usecols=None):
+    import pyarrow as pa
+
+    source = pa.memory_map(path, 'r') if memory_map else pa.OSFile(path, 'rb')
+    table = pa.ipc.open_file(source).read_all()
+    if usecols is not None:
+        table = table.select([name for name in table.column_names if usecols(name)])
+    # split_blocks keeps one block per column so pandas does not consolidate
+    # (and copy) the mapped buffers
+    return table.to_pandas(split_blocks=True)
+
+
+def pyarrow_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_atomic(path, write):
+    """Call ``write`` with a temporary path, then move it over ``path``."""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_meta(meta_path, meta):
+    """Write ``meta`` as JSON to ``meta_path`` atomically."""
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+    write_atomic(meta_path, write)
+
+
+def is_cache_fresh(source_path):
+    """Return True when the cached copy matches the current source file.
+
+    Path and size must match exactly. A changed mtime alone (e.g. a fresh
+    checkout) triggers a hash comparison instead of a rebuild, and the sidecar
+    is refreshed when the contents turn out to be identical.
+    """
+    data_path, meta_path = cache_paths(source_path)
+    if not os.path.exists(data_path):
+        return False
+    return meta_matches_source(meta_path, source_path)
+
+
+def meta_matches_source(meta_path, source_path):
+    """Return True when the sidecar at ``meta_path`` describes ``source_path``."""
+    meta = _read_meta(meta_path)
+    if meta is None:
+        return False
+
+    current = source_signature(source_path)
+    for key in ('format_version', 'path', 'size'):
+        if meta.get(key) != current[key]:
+            return False
+    if meta.get('mtime_ns') == current['mtime_ns']:
+        return True
+
+    if meta.get('sha256') != file_hash(source_path):
+        return False
+    meta['mtime_ns'] = current['mtime_ns']
+    write_meta(meta_path, meta)
+    return True
+
+
+def build_cache(source_path):
+    data_path, meta_path = cache_paths(source_path)
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+
+    signature = source_signature(source_path, with_hash=True)
+    start = time.perf_counter()
+    df = read_source(source_path)
+    read_seconds = time.perf_counter() - start
+    df = compact_frame(df, 'all')
+    write_atomic(data_path, lambda tmp_path: write_arrow(df, tmp_path))
+    write_meta(meta_path, {
+        **signature, 'rows': len(df), 'columns': list(df.columns), 'read_seconds': round(read_seconds, 3)
+    })
+    return df
+
+
+def load_table(source_path, use_cache=False, memory_map=False, usecols=None):
+    # the cache keeps every column; usecols only limits what is loaded from it
+    if not use_cache and not is_excel(source_path):
+        return read_source(source_path, usecols)
+    if not pyarrow_available():
+        warnings.warn("pyarrow is not installed; reading PMIS data from the source file "
+                      "without the columnar cache")
+        return read_source(source_path, usecols)
+
+    if not is_cache_fresh(source_path):
+        df = build_cache(source_path)
+        if not memory_map:
+            return df if usecols is None else df[[column for column in df.columns if usecols(column)]]
+    data_path, _ = cache_paths(source_path)
+    return read_arrow(data_path, memory_map=memory_map, usecols=usecols)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-build the columnar cache for PMIS CSV and Excel files.")
+    parser.add_argument('sources', nargs='+', help="CSV or .xlsx files to convert")
+    parser.add_argument('--force', action='store_true', help="rebuild even when the cache is fresh")
+    args = parser.parse_args(argv)
+
+    if not pyarrow_available():
+        parser.error("pyarrow is required to build the columnar cache")
+
+    for source in args.sources:
+        start = time.perf_counter()
+        if not args.force and is_cache_fresh(source):
+            status = 'fresh'
+        else:
+            build_cache(source)
+            status = 'built'
+        elapsed = time.perf_counter() - start
+        print(f"{status:>5}  {cache_paths(source)[0]}  ({elapsed:.2f}s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,469 @@
+"""Out-of-core PMIS backend on a file-backed Parquet store.
+
+For statewide extracts too large for one DataFrame. The CSV is read in
+chunks of INGEST_CHUNK_ROWS and each chunk becomes one Parquet file in a
+``.store`` directory. The directory sits in the ``.pmis-cache`` folder next
+to the source, with a ``manifest.json`` that records the source signature
+the same way the columnar cache does. Each chunk is sorted by highway and
+year before it is written, so the row groups' min/max statistics let the
+scanner skip most of a file for a highway or year filter.
+
+``ColumnarStore`` answers the data methods of ``DataHandler``:
+- ``filter_data``, ``filter_options``, ``get_unique_values``,
+  ``range_markers`` and ``calculate_condition_score``.
+- ``yearly_aggregates`` and ``aggregate``.
+With PMIS_BACKEND=store the dashboard serves from it (see app.py); routes
+that need the whole table in memory (exports, /api/data) are not available.
+It pushes filters down into the Parquet scan and reads only the columns a
+query uses. Group-bys run batch by batch on partial sums, counts, minima and
+maxima, which are then combined. Memory therefore grows with the number of
+groups and the scan batch size, not with the dataset. Only ``filter_data``
+materializes rows, and only the matching ones, in store order (by highway
+and year within each ingest chunk) rather than file order. Milepoint ranges push down
+their highways and are then applied to each scanned batch.
+
+Everything runs in-process on pyarrow; there is no database server.
+
+    python columnar_store.py statewide.csv
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from aggregate_cube import SCORE_COLUMNS, SUM_COLUMNS, add_per_mile
+from columnar_cache import cache_paths, meta_matches_source, source_signature
+from highway_ids import natural_argsort
+from rm_intervals import BEGIN_COLUMNS, END_COLUMNS, marker_positions
+
+INGEST_CHUNK_ROWS = 100000
+ROW_GROUP_ROWS = 64 * 1024
+SCAN_BATCH_ROWS = 256 * 1024
+
+HIGHWAY_COLUMN = 'TX_SIGNED_HIGHWAY_RDBD_ID'
+BEGIN_COLUMN = 'TX_BEG_REF_MARKER_NBR'
+END_COLUMN = 'TX_END_REF_MARKER_NBR'
+# read as text in every chunk, so a chunk without '100A'-style markers does
+# not come out numeric; the manifest records the dtype pd.read_csv gives the
+# whole column, and scans return the values in that dtype
+STRING_COLUMNS = (HIGHWAY_COLUMN, BEGIN_COLUMN, END_COLUMN)
+MANIFEST_NAME = 'manifest.json'
+
+
+def store_path(source_path):
+    data_path, _ = cache_paths(source_path)
+    return os.path.splitext(data_path)[0] + '.store'
+
+
+def is_store_fresh(source_path):
+    return meta_matches_source(os.path.join(store_path(source_path), MANIFEST_NAME), source_path)
+
+
+def _text_dtype(values):
+    """The dtype pd.read_csv would give ``values`` (strings or NaN): int64, float64 or object."""
+    present = values.dropna()
+    numbers = pd.to_numeric(present, errors='coerce')
+    if numbers.isna().any():
+        return 'object'
+    if numbers.dtype.kind in 'iu' and len(present) == len(values):
+        return 'int64'
+    return 'float64'
+
+
+def _combined_dtype(dtypes):
+    if 'object' in dtypes:
+        return 'object'
+    return 'float64' if 'float64' in dtypes else 'int64'
+
+
+def _chunk_table(chunk):
+    import pyarrow as pa
+
+    for column in chunk.columns:
+        if chunk[column].dtype == object:
+            chunk[column] = chunk[column].astype('string')
+    chunk = chunk.sort_values([HIGHWAY_COLUMN, 'EFF_YEAR'], kind='stable')
+    return pa.Table.from_pandas(chunk, preserve_index=False)
+
+
+def _write_parts(source_path, tmp_path, chunk_rows, text_columns):
+    """Write one Parquet part per chunk; ``text_columns`` are read as text.
+
+    Returns the row count, the part names, each part's schema and null-only
+    columns, and the dtypes pd.read_csv would give the text columns.
+    """
+    import pyarrow.parquet as pq
+
+    rows, parts, schemas, empty = 0, [], [], []
+    text_dtypes = {column: set() for column in text_columns}
+    reader = pd.read_csv(source_path, chunksize=chunk_rows, dtype={c: str for c in text_columns})
+    for i, chunk in enumerate(reader):
+        for column in text_columns:
+            text_dtypes[column].add(_text_dtype(chunk[column]))
+        empty.append({column for column in chunk.columns if chunk[column].isna().all()})
+        table = _chunk_table(chunk)
+        part = f'part-{i:05d}.parquet'
+        pq.write_table(table, os.path.join(tmp_path, part), row_group_size=ROW_GROUP_ROWS)
+        rows += len(chunk)
+        parts.append(part)
+        schemas.append(table.schema.remove_metadata())
+    return rows, parts, schemas, empty, {column: _combined_dtype(d) for column, d in text_dtypes.items()}
+
+
+def _unified_schema(schemas, empty):
+    """One schema for every part; a column blank in a whole chunk takes any type.
+
+    Returns the schema and the columns that are text in one chunk and numbers
+    in another, which pd.read_csv would read as text throughout.
+    """
+    import pyarrow as pa
+
+    if not schemas:
+        return pa.schema([]), set()
+    fields, mixed = [], set()
+    for field in schemas[0]:
+        types = [schema.field(field.name) for schema, blank in zip(schemas, empty) if field.name not in blank]
+        if not types:
+            fields.append(field)
+            continue
+        if len({pa.types.is_string(t.type) for t in types}) > 1:
+            mixed.add(field.name)
+            fields.append(pa.field(field.name, pa.string()))
+            continue
+        # a column that is integer in one chunk and float in another is read as float
+        fields.append(pa.unify_schemas([pa.schema([t]) for t in types], promote_options='permissive')[0])
+    return pa.schema(fields), mixed
+
+
+def _cast_part(part_path, schema, blank):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(part_path)
+    columns = [
+        pa.nulls(table.num_rows, field.type) if field.name in blank else table.column(field.name).cast(field.type)
+        for field in schema
+    ]
+    pq.write_table(pa.Table.from_arrays(columns, schema=schema), part_path, row_group_size=ROW_GROUP_ROWS)
+
+
+def ingest_csv(source_path, chunk_rows=INGEST_CHUNK_ROWS):
+    """Convert ``source_path`` into a Parquet store, one chunk at a time.
+
+    Each chunk's types are inferred on their own, as pd.read_csv's chunks
+    are. Afterwards every part is cast to one schema for the whole source:
+    integers widen to float, and a column that is blank in a chunk takes the
+    other chunks' type. A column with text in some chunks and numbers in
+    others is read again as text, costing a second pass over the CSV.
+    """
+    path = store_path(source_path)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    signature = source_signature(source_path, with_hash=True)
+    try:
+        text_columns = set(STRING_COLUMNS)
+        rows, parts, schemas, empty, text_dtypes = _write_parts(source_path, tmp_path, chunk_rows, text_columns)
+        schema, mixed = _unified_schema(schemas, empty)
+        if mixed:
+            text_columns |= mixed
+            rows, parts, schemas, empty, text_dtypes = _write_parts(source_path, tmp_path, chunk_rows, text_columns)
+            schema, _ = _unified_schema(schemas, empty)
+        for part, part_schema, blank in zip(parts, schemas, empty):
+            if not part_schema.equals(schema):
+                _cast_part(os.path.join(tmp_path, part), schema, blank)
+        with open(os.path.join(tmp_path, MANIFEST_NAME), 'w') as f:
+            json.dump({
+                **signature,
+                'rows': rows,
+                'parts': parts,
+                'columns': schema.names,
+                'schema': schema.serialize().to_pybytes().hex(),
+                'text_dtypes': {column: dtype for column, dtype in text_dtypes.items() if column in STRING_COLUMNS},
+            }, f, indent=2)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return path
+
+
+def _selected(value):
+    if value is None or value == 'all':
+        return []
+    values = value if isinstance(value, (list, tuple)) else [value]
+    return [v for v in values if v != 'all']
+
+
+class ColumnarStore:
+    def __init__(self, path, version=None):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        self.path = path
+        # dataset version for the app's caches, as DataHandler.version
+        self.version = version
+        with open(os.path.join(path, MANIFEST_NAME)) as f:
+            self.manifest = json.load(f)
+        self.schema = pa.ipc.read_schema(pa.py_buffer(bytes.fromhex(self.manifest['schema'])))
+        self.dataset = ds.dataset(
+            [os.path.join(path, part) for part in self.manifest['parts']],
+            schema=self.schema, format='parquet'
+        )
+        self.columns = list(self.schema.names)
+        # text columns whose values are all numbers in the source (see STRING_COLUMNS)
+        self.numeric_text = {
+            column: dtype for column, dtype in self.manifest.get('text_dtypes', {}).items() if dtype != 'object'
+        }
+        self._unique_values = {}
+        self._markers = {}
+
+    @classmethod
+    def for_source(cls, source_path, rebuild=False, chunk_rows=INGEST_CHUNK_ROWS, version=None):
+        """Open the store for ``source_path``, ingesting it first when stale."""
+        if rebuild or not is_store_fresh(source_path):
+            ingest_csv(source_path, chunk_rows=chunk_rows)
+        return cls(store_path(source_path), version=version)
+
+    def __len__(self):
+        return self.manifest['rows']
+
+    def empty_frame(self):
+        """No rows, with the columns and dtypes ``filter_data`` returns."""
+        frame = self.dataset.schema.empty_table().to_pandas()
+        for column, dtype in self.numeric_text.items():
+            frame[column] = frame[column].astype(dtype)
+        return frame
+
+    def _expression(self, filters):
+        import pyarrow.dataset as ds
+
+        conditions = []
+        for key, column in (('highway', HIGHWAY_COLUMN), ('begin_rm', BEGIN_COLUMN), ('end_rm', END_COLUMN)):
+            values = _selected(filters.get(key))
+            if not values:
+                continue
+            if column in self.numeric_text:
+                # compare as numbers: '76' and 76.0 are the same marker
+                dtype = self.numeric_text[column]
+                numbers = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').dropna()
+                conditions.append(ds.field(column).cast(dtype).isin(numbers.astype(dtype).tolist()))
+            else:
+                conditions.append(ds.field(column).isin([str(v) for v in values]))
+        years = _selected(filters.get('year'))
+        if years:
+            conditions.append(ds.field('EFF_YEAR').isin([int(y) for y in years]))
+        displacement1 = _selected(filters.get('displacement1'))
+        if displacement1:
+            conditions.append(ds.field('TX_LENGTH') >= min(displacement1))
+        displacement2 = _selected(filters.get('displacement2'))
+        if displacement2:
+            conditions.append(ds.field('TX_LENGTH') <= max(displacement2))
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    def _range_mask(self, frame, rm_range):
+        # strict overlap with [start, end], or containment for a single point,
+        # as in RMIntervalIndex.query
+        start, end = min(rm_range), max(rm_range)
+        starts = marker_positions(frame[BEGIN_COLUMNS[0]]) + frame[BEGIN_COLUMNS[1]].to_numpy(dtype=float)
+        ends = marker_positions(frame[END_COLUMNS[0]]) + frame[END_COLUMNS[1]].to_numpy(dtype=float)
+        # NaN bounds (unparseable markers) never match
+        low, high = np.minimum(starts, ends), np.maximum(starts, ends)
+        if start == end:
+            return (low <= start) & (high >= start)
+        return (low < end) & (high > start)
+
+    def scan(self, filters, columns=None):
+        """Yield DataFrames of the rows matching ``filters``, a batch at a time."""
+        rm_range = filters.get('rm_range')
+        wanted = list(columns) if columns is not None else self.columns
+        read = list(dict.fromkeys(wanted + (list(BEGIN_COLUMNS + END_COLUMNS) if rm_range else [])))
+        scanner = self.dataset.scanner(columns=read, filter=self._expression(filters), batch_size=SCAN_BATCH_ROWS)
+        for batch in scanner.to_batches():
+            if batch.num_rows == 0:
+                continue
+            frame = batch.to_pandas()
+            for column in frame.columns.intersection(list(self.numeric_text)):
+                frame[column] = frame[column].astype(self.numeric_text[column])
+            if rm_range:
+                frame = frame.loc[self._range_mask(frame, rm_range), wanted]
+                if frame.empty:
+                    continue
+            yield frame
+
+    def filter_data(self, filters, columns=None):
+        frames = list(self.scan(filters, columns))
+        if not frames:
+            return self.empty_frame()[columns or self.columns]
+        return pd.concat(frames, ignore_index=True)
+
+    def calculate_condition_score(self, filtered_df):
+        if filtered_df.empty or filtered_df['TX_LENGTH'].sum() == 0:
+            return 0
+        return (filtered_df['TX_CONDITION_SCORE'] * filtered_df['TX_LENGTH']).sum() / filtered_df['TX_LENGTH'].sum()
+
+    def get_unique_values(self, column):
+        if column not in self._unique_values:
+            import pyarrow.compute as pc
+
+            uniques = set()
+            for batch in self.dataset.scanner(columns=[column], batch_size=SCAN_BATCH_ROWS).to_batches():
+                uniques.update(pc.unique(batch.column(0)).drop_null().to_pylist())
+            values = list(uniques)
+            if column in self.numeric_text:
+                values = pd.Series(values, dtype=object).astype(self.numeric_text[column]).tolist()
+            if column == HIGHWAY_COLUMN:
+                values = [values[i] for i in natural_argsort(values)]
+            else:
+                values = sorted(values)
+            self._unique_values[column] = values
+        return self._unique_values[column]
+
+    def range_markers(self, highway):
+        """Reference markers used on ``highway``, ordered by position (as RMIntervalIndex.markers)."""
+        if not highway:
+            return []
+        if highway not in self._markers:
+            values = set()
+            for frame in self.scan({'highway': [highway]}, [BEGIN_COLUMN, END_COLUMN]):
+                values.update(frame[BEGIN_COLUMN].dropna().unique())
+                values.update(frame[END_COLUMN].dropna().unique())
+            markers = pd.DataFrame({'marker': list(values)})
+            markers['position'] = marker_positions(markers['marker'])
+            markers['label'] = markers['marker'].astype(str)
+            self._markers[highway] = markers.sort_values(['position', 'label'])['marker'].tolist()
+        return self._markers[highway]
+
+    def filter_options(self, filters):
+        # values come from scan in the source dtype, so they sort as DataHandler's do
+        begin_values, end_values = set(), set()
+        for frame in self.scan(filters, [BEGIN_COLUMN, END_COLUMN]):
+            begin_values.update(frame[BEGIN_COLUMN].dropna().unique())
+            end_values.update(frame[END_COLUMN].dropna().unique())
+        return sorted(begin_values), sorted(end_values)
+
+    def aggregate(self, filters, group_by, metrics):
+        """Same result as ``grouped_statistics`` over the filtered rows.
+
+        Percentiles need every value of a group at once, so they raise
+        ValueError here.
+        """
+        group_by = list(group_by)
+        partial_specs = {}
+        for func, column in metrics:
+            name = f'{func}:{column}'
+            if func in ('sum', 'count', 'min', 'max'):
+                partial_specs[name] = (column, func)
+            elif func == 'mean':
+                partial_specs[f'{name}:sum'] = (column, 'sum')
+                partial_specs[f'{name}:count'] = (column, 'count')
+            elif func == 'wmean':
+                partial_specs[f'{name}:num'] = (f'{name}:num', 'sum')
+                partial_specs[f'{name}:den'] = (f'{name}:den', 'sum')
+            elif func == 'per_mile':
+                partial_specs[f'{name}:sum'] = (column, 'sum')
+                partial_specs[f'{name}:length'] = ('TX_LENGTH', 'sum')
+            else:
+                raise ValueError(f"Metric function {func!r} is not supported by the out-of-core store")
+        columns = list(dict.fromkeys(group_by + [column for _, column in metrics] + ['TX_LENGTH']))
+
+        partials = []
+        for frame in self.scan(filters, columns):
+            for func, column in metrics:
+                if func == 'wmean':
+                    name = f'{func}:{column}'
+                    frame[f'{name}:num'] = frame[column] * frame['TX_LENGTH']
+                    frame[f'{name}:den'] = frame['TX_LENGTH'].where(frame[column].notna())
+            keys = group_by or (lambda _: 0)
+            partials.append(frame.groupby(keys, sort=False, observed=True).agg(**partial_specs))
+
+        combine = {
+            name: {'count': 'sum', 'min': 'min', 'max': 'max'}.get(func, 'sum')
+            for name, (_, func) in partial_specs.items()
+        }
+        if partials:
+            totals = pd.concat(partials).groupby(level=list(range(max(1, len(group_by)))), sort=True).agg(combine)
+        else:
+            totals = pd.DataFrame({name: pd.Series(dtype=float) for name in partial_specs})
+            if not group_by:
+                totals.loc[0] = [0 if combine[name] == 'sum' else np.nan for name in partial_specs]
+
+        result = totals.reset_index(drop=not group_by)
+        for func, column in metrics:
+            name = f'{func}:{column}'
+            if func == 'mean':
+                count = result.pop(f'{name}:count')
+                result[name] = (result.pop(f'{name}:sum') / count).where(count != 0)
+            elif func == 'wmean':
+                den = result.pop(f'{name}:den')
+                result[name] = (result.pop(f'{name}:num') / den).where(den != 0)
+            elif func == 'per_mile':
+                length = result.pop(f'{name}:length')
+                result[name] = (result.pop(f'{name}:sum') / length).where(length != 0)
+        return result[group_by + [f'{func}:{column}' for func, column in metrics]].reset_index(drop=True)
+
+    def yearly_aggregates(self, filters):
+        """Same dict as ``yearly_aggregates_from_rows``; None when no rows match."""
+        columns = list(dict.fromkeys(['EFF_YEAR', *SCORE_COLUMNS, *SUM_COLUMNS]))
+        partials, rows, weighted, length = [], 0, 0.0, 0.0
+        for frame in self.scan(filters, columns):
+            rows += len(frame)
+            weighted += (frame['TX_CONDITION_SCORE'] * frame['TX_LENGTH']).sum()
+            length += frame['TX_LENGTH'].sum()
+            grouped = frame.groupby('EFF_YEAR', sort=False)
+            partials.append(pd.concat([
+                grouped[SCORE_COLUMNS].sum().add_suffix(':sum'),
+                grouped[SCORE_COLUMNS].count().add_suffix(':count'),
+                grouped[SUM_COLUMNS].sum(),
+            ], axis=1))
+        if rows == 0:
+            return None
+
+        totals = pd.concat(partials).groupby(level=0, sort=True).sum()
+        yearly_data = pd.DataFrame({'EFF_YEAR': totals.index.to_numpy()})
+        for column in SCORE_COLUMNS:
+            count = totals[f'{column}:count'].to_numpy()
+            with np.errstate(invalid='ignore', divide='ignore'):
+                yearly_data[column] = np.where(count > 0, totals[f'{column}:sum'].to_numpy() / count, np.nan)
+        bar_data = pd.DataFrame({'EFF_YEAR': totals.index.to_numpy()})
+        for column in SUM_COLUMNS:
+            bar_data[column] = totals[column].to_numpy()
+        add_per_mile(bar_data)
+        return {
+            'rows': rows,
+            'yearly_data': yearly_data,
+            'bar_data': bar_data,
+            'condition_score': 0 if length == 0 else weighted / length,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest PMIS CSV files into out-of-core Parquet stores.")
+    parser.add_argument('sources', nargs='+', help="CSV files to ingest")
+    parser.add_argument('--chunk-rows', type=int, default=INGEST_CHUNK_ROWS)
+    parser.add_argument('--force', action='store_true', help="rebuild even when the store is fresh")
+    args = parser.parse_args(argv)
+
+    for source in args.sources:
+        start = time.perf_counter()
+        if not args.force and is_store_fresh(source):
+            status = 'fresh'
+        else:
+            ingest_csv(source, chunk_rows=args.chunk_rows)
+            status = 'built'
+        elapsed = time.perf_counter() - start
+        print(f"{status:>5}  {store_path(source)}  ({elapsed:.2f}s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""Request parsing and serialization for the /api/data and /api/aggregate endpoints.
+
+/api/data query parameters (list values may be repeated or comma-separated):
+
+    highway, year, begin_rm, end_rm   exact-match filters
+    min_length, max_length            TX_LENGTH bounds
+    from_rm, to_rm                    milepoint range as RM+displacement
+                                      (e.g. 290+0.5), segments overlapping it
+    columns                           column projection
+    cursor, limit                     keyset pagination on row position
+    format=ndjson                     stream newline-delimited records
+
+JSON pages look like ``{"data": [...], "count": n, "total": n, "next_cursor": "…"}``
+with ``next_cursor`` null on the last page. Records are serialized in chunks
+with pandas' C JSON writer, so the full list of dicts is never built.
+
+/api/aggregate takes the same filters plus ``group_by`` (columns) and
+``metric`` (``func:column`` with func one of grouped_stats.METRIC_FUNCTIONS,
+e.g. ``wmean:TX_CONDITION_SCORE`` or ``p90:TX_RIDE_SCORE``) and answers
+with columnar JSON: ``{"columns": [...], "data": {column: [values]}, ...}``.
+"""
+import json
+
+import numpy as np
+
+from grouped_stats import METRIC_FUNCTIONS, is_metric_function
+from rm_intervals import parse_milepoint
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+STREAM_CHUNK_ROWS = 5000
+
+# query parameter -> (filter key, column used to coerce the raw strings)
+LIST_FILTERS = {
+    'highway': ('highway', 'TX_SIGNED_HIGHWAY_RDBD_ID'),
+    'year': ('year', 'EFF_YEAR'),
+    'begin_rm': ('begin_rm', 'TX_BEG_REF_MARKER_NBR'),
+    'end_rm': ('end_rm', 'TX_END_REF_MARKER_NBR'),
+}
+RANGE_FILTERS = {
+    'min_length': 'displacement1',
+    'max_length': 'displacement2',
+}
+
+MAX_AGGREGATE_GROUPS = 50000
+
+
+def split_param(args, name):
+    """The values of query parameter ``name``, repeated or comma-separated."""
+    values = []
+    for raw in args.getlist(name):
+        values.extend(v.strip() for v in raw.split(',') if v.strip())
+    return values
+
+
+def coerce_values(series, raw_values):
+    """Convert query-string values to the type stored in ``series``."""
+    kind = series.dtype.kind
+    try:
+        if kind in 'iu':
+            return [int(v) for v in raw_values]
+        if kind == 'f':
+            return [float(v) for v in raw_values]
+    except ValueError:
+        raise ValueError(f"Invalid value for {series.name}: {raw_values}")
+    return [str(v) for v in raw_values]
+
+
+def _parse_float(args, name):
+    raw = args.get(name)
+    if raw is None or raw == '':
+        return None
+    try:
+        return float(raw)
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {raw!r}")
+
+
+def parse_int(args, name, default=None, minimum=0):
+    """Integer query parameter ``name``; ValueError if malformed or below ``minimum``."""
+    raw = args.get(name)
+    if raw is None or raw == '':
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {raw!r}")
+    if value < minimum:
+        raise ValueError(f"{name} must be >= {minimum}")
+    return value
+
+
+def parse_filters(args, df):
+    filters = {}
+    for name, (key, column) in LIST_FILTERS.items():
+        values = split_param(args, name)
+        if values:
+            filters[key] = coerce_values(df[column], values)
+    for name, key in RANGE_FILTERS.items():
+        bound = _parse_float(args, name)
+        if bound is not None:
+            filters[key] = [bound]
+    milepoints = [args.get('from_rm'), args.get('to_rm')]
+    if any(milepoints):
+        if not all(milepoints):
+            raise ValueError("from_rm and to_rm must be given together")
+        filters['rm_range'] = [parse_milepoint(m) for m in milepoints]
+    return filters
+
+
+def filters_key(filters):
+    return tuple(sorted((key, tuple(values)) for key, values in filters.items()))
+
+
+def parse_data_request(args, df):
+    """Turn /api/data query parameters into filters, projection and paging.
+
+    Raises ValueError with a user-facing message for malformed parameters.
+    """
+    filters = parse_filters(args, df)
+
+    columns = split_param(args, 'columns') or list(df.columns)
+    unknown = [c for c in columns if c not in df.columns]
+    if unknown:
+        raise ValueError(f"Unknown columns: {unknown}")
+
+    output_format = args.get('format', 'json')
+    if output_format not in ('json', 'ndjson'):
+        raise ValueError(f"Unsupported format: {output_format!r}")
+
+    default_limit = None if output_format == 'ndjson' else DEFAULT_PAGE_SIZE
+    limit = parse_int(args, 'limit', default=default_limit, minimum=1)
+    if output_format == 'json':
+        limit = min(limit, MAX_PAGE_SIZE)
+
+    return {
+        'filters': filters,
+        'columns': columns,
+        'cursor': parse_int(args, 'cursor'),
+        'limit': limit,
+        'format': output_format,
+    }
+
+
+def page_positions(positions, cursor=None, limit=None):
+    """Slice ascending row ``positions`` to the page after ``cursor``.
+
+    The cursor is the last row position of the previous page, so pages stay
+    consistent however the filtered set is sliced. Returns the page and the
+    cursor for the next page (None on the last page).
+    """
+    start = 0 if cursor is None else int(np.searchsorted(positions, cursor, side='right'))
+    end = len(positions) if limit is None else min(start + limit, len(positions))
+    page = positions[start:end]
+    next_cursor = int(page[-1]) if end < len(positions) and len(page) else None
+    return page, next_cursor
+
+
+def _records(df, positions, column_indexer, lines=False):
+    return df.iloc[positions, column_indexer].to_json(orient='records', lines=lines)
+
+
+def page_json(df, positions, columns, total, next_cursor):
+    column_indexer = df.columns.get_indexer(columns)
+    records = _records(df, positions, column_indexer) if len(positions) else '[]'
+    cursor = json.dumps(None if next_cursor is None else str(next_cursor))
+    return f'{{"data": {records}, "count": {len(positions)}, "total": {total}, "next_cursor": {cursor}}}'
+
+
+def iter_ndjson(df, positions, columns, chunk_rows=STREAM_CHUNK_ROWS):
+    column_indexer = df.columns.get_indexer(columns)
+    for start in range(0, len(positions), chunk_rows):
+        chunk = _records(df, positions[start:start + chunk_rows], column_indexer, lines=True)
+        yield chunk if chunk.endswith('\n') else chunk + '\n'
+
+
+def parse_aggregate_request(args, df):
+    """Turn /api/aggregate query parameters into filters, keys and metrics.
+
+    Raises ValueError with a user-facing message for malformed parameters.
+    """
+    # repeats would name one result column twice; keep the first of each
+    group_by = list(dict.fromkeys(split_param(args, 'group_by')))
+    unknown = [c for c in group_by if c not in df.columns]
+    if unknown:
+        raise ValueError(f"Unknown group_by columns: {unknown}")
+
+    metrics = []
+    for raw in dict.fromkeys(split_param(args, 'metric') or ['count:TX_LENGTH']):
+        func, _, column = raw.partition(':')
+        if not is_metric_function(func):
+            raise ValueError(f"Unknown metric function {func!r}; expected one of {list(METRIC_FUNCTIONS)}")
+        if column not in df.columns:
+            raise ValueError(f"Unknown metric column: {column!r}")
+        if func != 'count' and df[column].dtype.kind not in 'iuf':
+            raise ValueError(f"Metric {raw!r} needs a numeric column")
+        metrics.append((func, column))
+
+    return {
+        'filters': parse_filters(args, df),
+        'group_by': tuple(group_by),
+        'metrics': tuple(metrics),
+    }
+
+
+def columnar_json(result, **extra):
+    columns = list(result.columns)
+    data = ', '.join(f'{json.dumps(c)}: {result[c].to_json(orient="values")}' for c in columns)
+    fields = ''.join(f', {json.dumps(k)}: {json.dumps(v)}' for k, v in extra.items())
+    return f'{{"columns": {json.dumps(columns)}, "data": {{{data}}}{fields}}}'
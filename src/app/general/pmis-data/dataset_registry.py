@@ -0,0 +1,102 @@
+"""Hot-reloadable registry holding the current PMIS dataset snapshot.
+
+The registry owns one loaded dataset (a DataHandler, or a ColumnarStore with
+PMIS_BACKEND=store) at a time. A background
+thread polls the source file and, once a change has settled, builds a new
+dataset off the request path and swaps the reference in a single assignment.
+Callers take ``registry.current()`` once per request and keep using that
+snapshot, so in-flight callbacks finish on the dataset they started with. A
+failed load (missing columns, unreadable file) keeps the old snapshot and is
+reported through ``status()``.
+"""
+import os
+import threading
+import time
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+class DatasetRegistry:
+    def __init__(self, path, loader):
+        self.path = path
+        self._loader = loader
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self._pending_signature = None
+        self.reloads = 0
+        self.last_error = None
+
+        self._signature = _file_signature(path)
+        self._current = loader(path)
+        self.loaded_at = time.time()
+
+    def current(self):
+        return self._current
+
+    def reload(self):
+        """Load the source again and swap it in; returns True on success."""
+        with self._reload_lock:
+            signature = _file_signature(self.path)
+            try:
+                dataset = self._loader(self.path)
+            except Exception as e:
+                # remember the bad file so it is not re-read until it changes again
+                self._signature = signature
+                self.last_error = f"{type(e).__name__}: {e}"
+                return False
+            self._current = dataset
+            self._signature = signature
+            self.loaded_at = time.time()
+            self.reloads += 1
+            self.last_error = None
+            return True
+
+    def reload_if_changed(self):
+        # A change is only loaded once the file has looked the same for two
+        # polls in a row, so a copy still in progress is not read half-written
+        signature = _file_signature(self.path)
+        if signature is None or signature == self._signature:
+            self._pending_signature = None
+            return False
+        if signature != self._pending_signature:
+            self._pending_signature = signature
+            return False
+        self._pending_signature = None
+        return self.reload()
+
+    def start_watching(self, interval):
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+
+        def watch():
+            while not self._stop.wait(interval):
+                self.reload_if_changed()
+
+        self._watcher = threading.Thread(target=watch, name='pmis-dataset-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def status(self):
+        dataset = self._current
+        return {
+            'path': self.path,
+            'version': dataset.version,
+            'rows': len(dataset),
+            'loaded_at': self.loaded_at,
+            'reloads': self.reloads,
+            'last_error': self.last_error,
+            'watching': self._watcher is not None,
+        }
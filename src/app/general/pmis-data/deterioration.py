@@ -0,0 +1,238 @@
+"""Per-segment deterioration rates across rating years.
+
+A segment is a highway, begin reference marker and begin displacement. Rows
+sharing a segment and EFF_YEAR (several lanes, repeated ratings) are first
+combined into one rating per year: the length-weighted mean of each score,
+from one pass of grouped_statistics. The ratings are then sorted by segment
+and year, and each score gets three columns per segment:
+
+    latest:<score>   the score in the last year it was rated
+    slope:<score>    least-squares change per year over all rated years
+    delta:<score>    change per year between the last two ratings
+
+Slopes and deltas are NaN for a segment with fewer than two ratings of the
+score. The table also keeps the district and length of the latest rating
+and the first year, last year and number of years rated.
+
+``DeteriorationTable`` keeps one sort order per rate column, so a ranked
+top-N query ("fastest deteriorating segments in district 4") only masks the
+district, highway and min_years filters over that order and takes the first
+n. With the columnar cache on, the table is written next to it as
+``<source>.deterioration.arrow`` and read back while the source is unchanged.
+Run ``python deterioration.py <csv> [<csv> ...]`` to build it during a deploy.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from columnar_cache import (
+    cache_paths, meta_matches_source, pyarrow_available, read_arrow, read_source, source_signature, write_arrow,
+    write_atomic, write_meta
+)
+from data_api import coerce_values, parse_int, split_param
+from grouped_stats import grouped_statistics
+from highway_ids import highway_categorical
+
+TABLE_FORMAT_VERSION = 1
+
+SEGMENT_COLUMNS = ['TX_SIGNED_HIGHWAY_RDBD_ID', 'TX_BEG_REF_MARKER_NBR', 'TX_BEG_REF_MRKR_DISP']
+RATED_SCORES = ['TX_CONDITION_SCORE', 'TX_DISTRESS_SCORE', 'TX_RIDE_SCORE']
+DISTRICT_COLUMN = 'RESPONSIBLE_DISTRICT'
+RANKED_COLUMNS = [f'{rate}:{score}' for score in RATED_SCORES for rate in ('slope', 'delta', 'latest')]
+
+DEFAULT_METRIC = 'slope:TX_CONDITION_SCORE'
+DEFAULT_TOP_N = 20
+MAX_TOP_N = 1000
+DEFAULT_MIN_YEARS = 2
+
+
+def table_paths(source_path):
+    data_path, _ = cache_paths(source_path)
+    base = os.path.splitext(data_path)[0] + '.deterioration'
+    return base + '.arrow', base + '.json'
+
+
+def yearly_ratings(df):
+    """One row per (segment, year), sorted, with the weighted mean of each score."""
+    columns = SEGMENT_COLUMNS + ['EFF_YEAR', DISTRICT_COLUMN, 'TX_LENGTH'] + RATED_SCORES
+    metrics = [('wmean', score) for score in RATED_SCORES] + [('max', DISTRICT_COLUMN), ('max', 'TX_LENGTH')]
+    ratings = grouped_statistics(df[columns], SEGMENT_COLUMNS + ['EFF_YEAR'], metrics)
+    return ratings.rename(columns=lambda c: c.partition(':')[2] or c)
+
+
+def _rate_columns(segment, last, years, scores):
+    """Latest value, least-squares slope and last consecutive delta per segment."""
+    n_segments = len(last)
+    valid = ~np.isnan(scores)
+    seg, x, y = segment[valid], years[valid], scores[valid]
+
+    latest = np.full(n_segments, np.nan)
+    delta = np.full(n_segments, np.nan)
+    if len(seg):
+        ends = np.flatnonzero(np.r_[seg[1:] != seg[:-1], True])
+        latest[seg[ends]] = y[ends]
+        # the rating before each segment's last one, when it is the same segment
+        has_previous = (ends > 0) & (seg[np.maximum(ends - 1, 0)] == seg[ends])
+        ends = ends[has_previous]
+        delta[seg[ends]] = (y[ends] - y[ends - 1]) / (x[ends] - x[ends - 1])
+
+    # years are centred on each segment's last year so the sums stay small
+    x = x - years[last][seg]
+    n = np.bincount(seg, minlength=n_segments)
+    sx = np.bincount(seg, x, minlength=n_segments)
+    sy = np.bincount(seg, y, minlength=n_segments)
+    sxx = np.bincount(seg, x * x, minlength=n_segments)
+    sxy = np.bincount(seg, x * y, minlength=n_segments)
+    den = n * sxx - sx * sx
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = np.where(den > 0, (n * sxy - sx * sy) / den, np.nan)
+    return latest, slope, delta
+
+
+def build_table(df):
+    """Deterioration rates of every segment in ``df``, one row per segment."""
+    ratings = yearly_ratings(df)
+    keys = ratings[SEGMENT_COLUMNS]
+    # ratings come sorted by segment, so a segment starts where a key changes
+    starts = np.ones(len(ratings), dtype=bool)
+    starts[1:] = False
+    for column in SEGMENT_COLUMNS:
+        values = keys[column].to_numpy()
+        starts[1:] |= values[1:] != values[:-1]
+    segment = np.cumsum(starts) - 1
+    first = np.flatnonzero(starts)
+    last = np.r_[first[1:], len(ratings)] - 1
+
+    years = ratings['EFF_YEAR'].to_numpy(dtype=float)
+    table = keys.iloc[first].reset_index(drop=True)
+    table[DISTRICT_COLUMN] = ratings[DISTRICT_COLUMN].to_numpy()[last]
+    table['TX_LENGTH'] = ratings['TX_LENGTH'].to_numpy()[last]
+    table['first_year'] = ratings['EFF_YEAR'].to_numpy()[first]
+    table['last_year'] = ratings['EFF_YEAR'].to_numpy()[last]
+    table['years'] = np.diff(np.r_[first, len(ratings)]).astype('int64')
+    for score in RATED_SCORES:
+        latest, slope, delta = _rate_columns(segment, last, years, ratings[score].to_numpy(dtype=float))
+        table[f'slope:{score}'] = slope
+        table[f'delta:{score}'] = delta
+        table[f'latest:{score}'] = latest
+    return table
+
+
+def build_cache(source_path, df=None):
+    """Build the table for ``source_path`` and write it next to the data cache."""
+    data_path, meta_path = table_paths(source_path)
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+
+    signature = source_signature(source_path, with_hash=True)
+    if df is None:
+        df = read_source(source_path)
+        df['TX_SIGNED_HIGHWAY_RDBD_ID'] = highway_categorical(df['TX_SIGNED_HIGHWAY_RDBD_ID'])
+    table = build_table(df)
+    write_atomic(data_path, lambda tmp_path: write_arrow(table, tmp_path))
+    write_meta(meta_path, {**signature, 'table_version': TABLE_FORMAT_VERSION, 'segments': len(table)})
+    return table
+
+
+def is_table_fresh(source_path):
+    data_path, meta_path = table_paths(source_path)
+    if not os.path.exists(data_path) or not os.path.exists(meta_path):
+        return False
+    with open(meta_path) as f:
+        if json.load(f).get('table_version') != TABLE_FORMAT_VERSION:
+            return False
+    return meta_matches_source(meta_path, source_path)
+
+
+class DeteriorationTable:
+    def __init__(self, table):
+        self.table = table
+        highways = table['TX_SIGNED_HIGHWAY_RDBD_ID']
+        if not isinstance(highways.dtype, pd.CategoricalDtype):
+            highways = highway_categorical(highways)
+        self._highways = highways
+        self._districts = table[DISTRICT_COLUMN].to_numpy()
+        self._years = table['years'].to_numpy()
+        # ascending order of each rate column with NaN left out: the worst
+        # (most negative, or lowest) segments first
+        self._orders = {}
+        for column in RANKED_COLUMNS:
+            values = table[column].to_numpy()
+            present = np.flatnonzero(~np.isnan(values))
+            self._orders[column] = present[np.argsort(values[present], kind='stable')]
+
+    @classmethod
+    def for_source(cls, source_path, df=None, use_cache=False):
+        """The table for ``source_path``, from the on-disk copy when it is fresh.
+
+        Without ``use_cache`` (or pyarrow) it is built from ``df`` in memory.
+        """
+        if not use_cache or not pyarrow_available():
+            return cls(build_table(df if df is not None else read_source(source_path)))
+        if is_table_fresh(source_path):
+            return cls(read_arrow(table_paths(source_path)[0]))
+        return cls(build_cache(source_path, df))
+
+    def top(self, metric=DEFAULT_METRIC, n=DEFAULT_TOP_N, best=False, districts=(), highways=(),
+            min_years=DEFAULT_MIN_YEARS):
+        """The first ``n`` segments ranked on ``metric`` and how many matched.
+
+        Worst (lowest) first unless ``best``.
+        """
+        order = self._orders[metric]
+        if best:
+            order = order[::-1]
+        mask = self._years >= min_years
+        if districts:
+            mask &= np.isin(self._districts, list(districts))
+        if highways:
+            mask &= self._highways.isin(list(highways)).to_numpy()
+        positions = order[mask[order]]
+        return self.table.iloc[positions[:n]], len(positions)
+
+
+def parse_deterioration_request(args, df):
+    """Turn /api/deterioration query parameters into a ranking and filters.
+
+    Raises ValueError with a user-facing message for malformed parameters.
+    """
+    metric = args.get('metric') or DEFAULT_METRIC
+    if metric not in RANKED_COLUMNS:
+        raise ValueError(f"Unknown metric {metric!r}; expected one of {RANKED_COLUMNS}")
+    order = args.get('order') or 'worst'
+    if order not in ('worst', 'best'):
+        raise ValueError(f"order must be 'worst' or 'best', not {order!r}")
+    return {
+        'metric': metric,
+        'n': min(parse_int(args, 'n', default=DEFAULT_TOP_N, minimum=1), MAX_TOP_N),
+        'best': order == 'best',
+        'districts': tuple(coerce_values(df[DISTRICT_COLUMN], split_param(args, 'district'))),
+        'highways': tuple(split_param(args, 'highway')),
+        'min_years': parse_int(args, 'min_years', default=DEFAULT_MIN_YEARS, minimum=1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-build the deterioration-rate table for PMIS CSV files.")
+    parser.add_argument('sources', nargs='+', help="CSV files to process")
+    parser.add_argument('--force', action='store_true', help="rebuild even when the table is fresh")
+    args = parser.parse_args(argv)
+
+    for source in args.sources:
+        start = time.perf_counter()
+        if not args.force and is_table_fresh(source):
+            status = 'fresh'
+        else:
+            build_cache(source)
+            status = 'built'
+        elapsed = time.perf_counter() - start
+        print(f"{status:>5}  {table_paths(source)[0]}  ({elapsed:.2f}s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""Streaming reader for PMIS sources saved as Excel workbooks.
+
+``pd.read_excel`` goes through openpyxl, which spends most of its time
+building a Python object per cell: around 13 us a cell, 10 s for a 23k-row
+extract. This reader runs expat over the sheet XML inside the .xlsx itself
+and keeps only the cell text, so it needs neither openpyxl nor the workbook
+in memory. Sheets are read in workbook order and streamed from the zip in
+BLOCK_BYTES blocks. Every CHUNK_ROWS rows, the values move into one array
+per column:
+- float64 when every value in the chunk is a number, a blank or numeric text
+  (text pd.read_csv takes as missing, such as 'NA' or 'nan', is a blank);
+- otherwise an object array of strings. Equal strings share one str object,
+  so repeated highway IDs or pavement types cost a pointer each.
+Only one chunk of rows is held as Python objects at a time.
+
+At the end each column's chunks are joined with the same inference as
+``read_source`` on a CSV. A number-only column becomes int64 when it has no
+blanks and only whole values, and float64 otherwise. A column with text in
+any chunk becomes strings throughout, with whole numbers written without
+'.0', so RM markers read ``598`` alongside ``100A``. Boolean cells read as
+True/False text, so a column of them becomes bool (object with blanks), as
+pd.read_csv makes it.
+
+The first non-blank row of each sheet is its header. Sheets must have the
+first sheet's columns (in any order) and are appended. Sheets with other
+columns (notes, lookups) are skipped with a warning, as are blank sheets and
+rows. Formula cells give their cached value, error cells (#N/A) are blank,
+and dates come back as Excel serial numbers (ISO dates, which few writers
+use, as their text). The columnar cache converts a workbook once (see
+columnar_cache.py).
+
+openpyxl is not used: ``load_workbook(read_only=True)`` with
+``iter_rows(values_only=True)`` still builds a cell object per value. It
+takes 38 s for 100,000 rows x 32 columns where this reader takes 11 s
+(``benchmarks/excel_ingest.py``; tests/test_excel_source.py checks the
+cell types it handles).
+"""
+import posixpath
+import warnings
+import zipfile
+from xml.etree import ElementTree
+from xml.parsers import expat
+
+import numpy as np
+import pandas as pd
+
+EXCEL_SUFFIXES = ('.xlsx', '.xlsm')
+CHUNK_ROWS = 8192
+BLOCK_BYTES = 1 << 16
+
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+RELATIONSHIP_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PACKAGE_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+TEXT, PHONETIC, STRING_ITEM = (MAIN_NS + tag for tag in ('t', 'rPh', 'si'))
+DIGITS = '0123456789'
+# text pd.read_csv reads as a missing value by default
+NA_STRINGS = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+])
+# text pd.read_csv reads as booleans by default
+TRUE_STRINGS = frozenset(['True', 'TRUE', 'true'])
+FALSE_STRINGS = frozenset(['False', 'FALSE', 'false'])
+BOOLEAN_TEXT = {'1': 'True', '0': 'False'}
+
+
+def is_excel(source_path):
+    return str(source_path).lower().endswith(EXCEL_SUFFIXES)
+
+
+def _part_path(target):
+    # relationship targets are relative to xl/ unless they start with /
+    if target.startswith('/'):
+        return target[1:]
+    return posixpath.normpath(posixpath.join('xl', target))
+
+
+def _workbook_parts(archive):
+    """Worksheet (name, path) pairs in workbook order, and the shared strings path."""
+    workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+    relationships = ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    targets, shared_strings = {}, None
+    for relationship in relationships.iter(PACKAGE_NS + 'Relationship'):
+        targets[relationship.get('Id')] = _part_path(relationship.get('Target'))
+        if relationship.get('Type', '').endswith('/sharedStrings'):
+            shared_strings = targets[relationship.get('Id')]
+    sheets = [(sheet.get('name'), targets[sheet.get(RELATIONSHIP_NS + 'id')])
+              for sheet in workbook.iter(MAIN_NS + 'sheet')]
+    return sheets, shared_strings
+
+
+def _string_item(element):
+    # plain text, or rich-text runs; phonetic hints are not part of the value
+    return ''.join(t.text or '' for child in element if child.tag != PHONETIC for t in child.iter(TEXT))
+
+
+def _shared_strings(archive, path):
+    if path is None or path not in archive.namelist():
+        return []
+    strings = []
+    with archive.open(path) as f:
+        for _, element in ElementTree.iterparse(f):
+            if element.tag == STRING_ITEM:
+                strings.append(_string_item(element))
+                element.clear()
+    return strings
+
+
+class _SheetParser:
+    """expat handlers that turn worksheet XML into {column index: text} rows.
+
+    Tags are matched with the prefix the sheet uses (none, or e.g. ``x:``),
+    which the root element tells, instead of resolving namespaces.
+    """
+
+    def __init__(self, shared):
+        self.shared = shared
+        self.parser = expat.ParserCreate()
+        self.parser.buffer_text = True
+        self.parser.StartElementHandler = self.root
+        self.parser.EndElementHandler = self.end
+        self.parser.CharacterDataHandler = self.data
+        self.rows, self.columns = [], {}
+        self.row, self.kind, self.index, self.text, self.phonetic = None, None, -1, None, False
+
+    def feed(self, block, final=False):
+        self.parser.Parse(block, final)
+        rows, self.rows = self.rows, []
+        return rows
+
+    def root(self, tag, attrs):
+        prefix = tag[:tag.index(':') + 1] if ':' in tag else ''
+        self.row_tag, self.cell_tag, self.value_tag, self.text_tag, self.phonetic_tag = (
+            prefix + name for name in ('row', 'c', 'v', 't', 'rPh')
+        )
+        self.parser.StartElementHandler = self.start
+
+    def start(self, tag, attrs):
+        if tag == self.cell_tag:
+            reference = attrs.get('r')
+            if reference:
+                # 'AB12' -> 27; the letters are converted once per column
+                letters = reference.rstrip(DIGITS)
+                index = self.columns.get(letters)
+                if index is None:
+                    index = 0
+                    for letter in letters:
+                        index = index * 26 + ord(letter) - 64
+                    index = self.columns[letters] = index - 1
+                self.index = index
+            else:
+                self.index += 1
+            self.kind = attrs.get('t')
+        elif tag == self.value_tag or (tag == self.text_tag and not self.phonetic):
+            self.text = []
+        elif tag == self.row_tag:
+            self.row, self.index = {}, -1
+        elif tag == self.phonetic_tag:
+            self.phonetic = True
+
+    def end(self, tag):
+        # empty values are blanks, as empty CSV fields are
+        if tag == self.value_tag:
+            value, self.text = ''.join(self.text), None
+            if self.kind == 's':
+                value = self.shared[int(value)]
+            elif self.kind == 'b':
+                value = BOOLEAN_TEXT.get(value, value)
+            if value and self.kind != 'e':
+                self.row[self.index] = value
+        elif tag == self.text_tag and self.text is not None:
+            # inline strings, possibly in several rich-text runs
+            value, self.text = ''.join(self.text), None
+            if value:
+                self.row[self.index] = self.row.get(self.index, '') + value
+        elif tag == self.row_tag:
+            if self.row:
+                self.rows.append(self.row)
+        elif tag == self.phonetic_tag:
+            self.phonetic = False
+
+    def data(self, text):
+        if self.text is not None:
+            self.text.append(text)
+
+
+def _sheet_rows(archive, path, shared):
+    """Each non-blank row of a worksheet as a {column index: text} dict."""
+    parser = _SheetParser(shared)
+    with archive.open(path) as f:
+        for block in iter(lambda: f.read(BLOCK_BYTES), b''):
+            yield from parser.feed(block)
+    yield from parser.feed(b'', final=True)
+
+
+def _header(values):
+    names = []
+    for i in range(max(values) + 1):
+        name = values.get(i)
+        name = f'Unnamed: {i}' if name is None else name.strip()
+        # repeated names get .1, .2, ... as pd.read_csv gives them
+        base, n = name, 0
+        while name in names:
+            n += 1
+            name = f'{base}.{n}'
+        names.append(name)
+    return names
+
+
+def _chunk_array(values, strings):
+    # None and numeric text convert with the numbers; anything else is text
+    try:
+        return np.array(values, dtype=float)
+    except ValueError:
+        pass
+    values = [None if v in NA_STRINGS else v for v in values]
+    try:
+        return np.array(values, dtype=float)
+    except ValueError:
+        return np.array([None if v is None else strings.setdefault(v, v) for v in values], dtype=object)
+
+
+def _text(value):
+    return str(int(value)) if value.is_integer() else str(value)
+
+
+def _join_column(chunks):
+    if all(chunk.dtype != object for chunk in chunks):
+        values = np.concatenate(chunks) if chunks else np.empty(0)
+        if len(values) and not np.isnan(values).any() and np.all(np.mod(values, 1) == 0) \
+                and np.abs(values).max() < 2 ** 53:
+            return values.astype('int64')
+        return values
+    # numbers from chunks without text become strings like the rest
+    values = np.concatenate([
+        chunk if chunk.dtype == object else
+        np.array([None if np.isnan(v) else _text(v) for v in chunk.tolist()], dtype=object)
+        for chunk in chunks
+    ])
+    blank = pd.isna(values)
+    text = set(values[~blank])
+    if text and text <= TRUE_STRINGS | FALSE_STRINGS:
+        booleans = np.isin(values, list(TRUE_STRINGS))
+        if not blank.any():
+            return booleans
+        values = booleans.astype(object)
+    values[blank] = np.nan
+    return values
+
+
+def read_xlsx(source_path, chunk_rows=CHUNK_ROWS):
+    """Read every sheet of the workbook at ``source_path`` into one DataFrame."""
+    columns, chunks, strings = None, None, {}
+    with zipfile.ZipFile(source_path) as archive:
+        sheets, shared_strings_path = _workbook_parts(archive)
+        shared = _shared_strings(archive, shared_strings_path)
+        for name, path in sheets:
+            rows = _sheet_rows(archive, path, shared)
+            first = next(rows, None)
+            if first is None:
+                continue
+            header = _header(first)
+            if columns is None:
+                columns, chunks = header, {column: [] for column in header}
+            elif sorted(header) != sorted(columns):
+                warnings.warn(f"{source_path}: skipping sheet {name!r}, "
+                              f"its columns differ from the first sheet's")
+                continue
+            width = len(header)
+            buffer = []
+
+            def flush():
+                for column, values in zip(header, zip(*buffer)):
+                    chunks[column].append(_chunk_array(values, strings))
+                buffer.clear()
+
+            for values in rows:
+                row = [None] * width
+                for index, value in values.items():
+                    if index < width:
+                        row[index] = value
+                if row.count(None) < width:
+                    buffer.append(row)
+                if len(buffer) >= chunk_rows:
+                    flush()
+            if buffer:
+                flush()
+
+    if columns is None:
+        raise ValueError(f"{source_path} has no sheet with a header row")
+    # copy=False keeps each joined column as its own block instead of copying
+    # them all into consolidated 2D blocks
+    return pd.DataFrame({column: _join_column(chunks.pop(column)) for column in columns}, columns=columns,
+                        copy=False)
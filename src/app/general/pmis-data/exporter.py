@@ -0,0 +1,198 @@
+"""Chunked data export in CSV, gzip CSV, Parquet and Excel.
+
+Exports never hold the whole selection as one string: rows are taken from the
+dataset ``EXPORT_CHUNK_ROWS`` at a time and appended to the output. Small CSV
+pulls can be streamed straight into a response with ``iter_csv``; everything
+else runs as a background job writing into its own directory under
+EXPORT_DIR, next to a ``status.json`` with its progress. Keeping job state on
+disk lets any worker process on the host report progress and serve the file.
+"""
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+EXPORT_DIR = os.environ.get('PMIS_EXPORT_DIR', os.path.join(tempfile.gettempdir(), 'pmis-exports'))
+EXPORT_CHUNK_ROWS = 20000
+EXPORT_TTL_SECONDS = 3600
+EXCEL_MAX_ROWS = 1048575  # one row is the header
+EXCEL_PROGRESS_ROWS = 1000
+
+EXPORT_FORMATS = {
+    'csv': ('filtered_data.csv', 'text/csv'),
+    'csv.gz': ('filtered_data.csv.gz', 'application/gzip'),
+    'parquet': ('filtered_data.parquet', 'application/vnd.apache.parquet'),
+    'xlsx': ('filtered_data.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='pmis-export')
+
+
+def _chunks(df, positions, chunk_rows=EXPORT_CHUNK_ROWS):
+    for start in range(0, len(positions), chunk_rows):
+        yield df.take(positions[start:start + chunk_rows])
+
+
+def iter_csv(df, positions, compress=False):
+    """Yield the CSV for ``positions`` as bytes, one chunk at a time."""
+    compressor = gzip.compress if compress else None
+    if len(positions) == 0:
+        header = df.iloc[:0].to_csv(index=False).encode()
+        yield compressor(header) if compressor else header
+        return
+    for i, chunk in enumerate(_chunks(df, positions)):
+        data = chunk.to_csv(index=False, header=(i == 0)).encode()
+        # concatenated gzip members form a valid gzip file
+        yield compressor(data) if compressor else data
+
+
+def _write_csv(df, positions, path, compress, progress):
+    opener = gzip.open if compress else open
+    with opener(path, 'wb') as f:
+        if len(positions) == 0:
+            f.write(df.iloc[:0].to_csv(index=False).encode())
+        for i, chunk in enumerate(_chunks(df, positions)):
+            f.write(chunk.to_csv(index=False, header=(i == 0)).encode())
+            progress(len(chunk))
+
+
+def _arrow_schema(df):
+    import pyarrow as pa
+
+    fields = []
+    for column in df.columns:
+        dtype = df[column].dtype
+        if dtype == object or isinstance(dtype, pd.CategoricalDtype):
+            arrow_type = pa.string()
+        else:
+            arrow_type = pa.from_numpy_dtype(dtype)
+        fields.append(pa.field(str(column), arrow_type))
+    return pa.schema(fields)
+
+
+def _write_parquet(df, positions, path, progress):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(df)
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in _chunks(df, positions):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            progress(len(chunk))
+
+
+def _write_xlsx(df, positions, path, progress):
+    from openpyxl import Workbook
+
+    if len(positions) > EXCEL_MAX_ROWS:
+        raise ValueError(f"{len(positions)} rows do not fit in one Excel sheet ({EXCEL_MAX_ROWS} max)")
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('PMIS')
+    sheet.append([str(c) for c in df.columns])
+    # openpyxl writes row by row, so report progress more often than per chunk
+    for chunk in _chunks(df, positions, chunk_rows=EXCEL_PROGRESS_ROWS):
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            sheet.append([v.item() if isinstance(v, np.generic) else v for v in row])
+        progress(len(chunk))
+    workbook.save(path)
+
+
+def write_export(df, positions, path, fmt, progress=lambda rows: None):
+    if fmt in ('csv', 'csv.gz'):
+        _write_csv(df, positions, path, fmt == 'csv.gz', progress)
+    elif fmt == 'parquet':
+        _write_parquet(df, positions, path, progress)
+    elif fmt == 'xlsx':
+        _write_xlsx(df, positions, path, progress)
+    else:
+        raise ValueError(f"Unsupported export format: {fmt!r}")
+
+
+def _job_dir(job_id):
+    # job ids are generated uuid hex strings; reject anything else before
+    # it reaches the filesystem
+    if not (len(job_id) == 32 and all(c in '0123456789abcdef' for c in job_id)):
+        raise KeyError(job_id)
+    return os.path.join(EXPORT_DIR, job_id)
+
+
+def _write_status(job_id, **status):
+    path = os.path.join(_job_dir(job_id), 'status.json')
+    tmp_path = f'{path}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(status, f)
+    os.replace(tmp_path, path)
+
+
+def job_status(job_id):
+    """Return a job's status dict; raises KeyError for unknown jobs."""
+    try:
+        with open(os.path.join(_job_dir(job_id), 'status.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        raise KeyError(job_id)
+
+
+def job_file(job_id):
+    """Return (path, download name, mimetype) of a finished job's output."""
+    status = job_status(job_id)
+    if status['state'] != 'done':
+        raise KeyError(job_id)
+    filename, mimetype = EXPORT_FORMATS[status['format']]
+    return os.path.join(_job_dir(job_id), filename), filename, mimetype
+
+
+def cleanup_jobs(max_age=EXPORT_TTL_SECONDS):
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def start_export(df, positions, fmt):
+    """Start exporting ``positions`` of ``df`` in the background; returns the job id."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt!r}")
+    cleanup_jobs()
+    job_id = uuid.uuid4().hex
+    os.makedirs(_job_dir(job_id))
+    total = len(positions)
+    status = {'id': job_id, 'format': fmt, 'state': 'queued', 'rows_done': 0, 'rows_total': total,
+              'error': None, 'started_at': time.time()}
+    _write_status(job_id, **status)
+
+    def run():
+        done = 0
+        last_report = 0.0
+
+        def progress(rows):
+            nonlocal done, last_report
+            done += rows
+            now = time.monotonic()
+            if now - last_report >= 0.25:
+                last_report = now
+                _write_status(job_id, **{**status, 'state': 'running', 'rows_done': min(done, total)})
+
+        filename, _ = EXPORT_FORMATS[fmt]
+        path = os.path.join(_job_dir(job_id), filename)
+        try:
+            write_export(df, positions, path, fmt, progress)
+        except Exception as e:
+            _write_status(job_id, **{**status, 'state': 'failed', 'error': f"{type(e).__name__}: {e}"})
+            return
+        _write_status(job_id, **{**status, 'state': 'done', 'rows_done': total, 'finished_at': time.time()})
+
+    _executor.submit(run)
+    return job_id
@@ -0,0 +1,78 @@
+"""Partial chart updates: static figures sent once, then only trace data.
+
+The line and bar charts keep the same traces, axes, legend and hover setup
+for every selection; only the yearly arrays, tick values and axis ranges
+change. The layout ships with the page as a static figure. Each Apply returns
+a Dash ``Patch`` that assigns just those values.
+
+A chart update is a plain dict, cacheable and picklable:
+
+    {'data': [{'x': ..., 'y': ...}, ...], 'layout': {'yaxis': {'range': [0, 100]}, ...}}
+
+``data`` is indexed like the figure's traces, and ``layout`` holds nested
+properties. ``figure_patch`` turns it into a Patch. ``apply_update`` merges
+it into a full figure dict for callers that need whole figures (exports,
+reports). Trace arrays are typed-array specs (``{'dtype': 'f4', 'bdata':
+...}``), which plotly.js decodes: years as int16 and scores as float32.
+"""
+import base64
+import copy
+
+import numpy as np
+from dash import Patch
+
+FLOAT_DTYPE = np.dtype('<f4')
+
+
+def typed_array(values):
+    """Plotly typed-array spec for ``values``; integers use the smallest type."""
+    array = np.asarray(values)
+    if array.dtype.kind in 'iu' and len(array):
+        for dtype in ('<i1', '<i2', '<i4'):
+            info = np.iinfo(dtype)
+            if info.min <= array.min() and array.max() <= info.max:
+                array = array.astype(dtype)
+                break
+        else:
+            array = array.astype(FLOAT_DTYPE)
+    else:
+        array = array.astype(FLOAT_DTYPE)
+    return {'dtype': f'{array.dtype.kind}{array.dtype.itemsize}', 'bdata': base64.b64encode(np.ascontiguousarray(array).tobytes()).decode('ascii')}
+
+
+def _leaves(value, path=()):
+    # (path, value) for every property of a nested update; typed arrays and
+    # lists are leaves
+    if isinstance(value, dict) and 'bdata' not in value:
+        for key, item in value.items():
+            yield from _leaves(item, path + (key,))
+    else:
+        yield path, value
+
+
+def update_leaves(update):
+    for index, trace in enumerate(update['data']):
+        yield from _leaves(trace, ('data', index))
+    yield from _leaves(update['layout'], ('layout',))
+
+
+def figure_patch(update):
+    """A Dash Patch assigning the traces and layout properties of ``update``."""
+    patch = Patch()
+    for path, value in update_leaves(update):
+        node = patch
+        for key in path[:-1]:
+            node = node[key]
+        node[path[-1]] = value
+    return patch
+
+
+def apply_update(figure, update):
+    """Full figure dict: ``figure`` (a static figure dict) with ``update`` applied."""
+    figure = copy.deepcopy(figure)
+    for path, value in update_leaves(update):
+        node = figure
+        for key in path[:-1]:
+            node = node[key] if isinstance(key, int) else node.setdefault(key, {})
+        node[path[-1]] = copy.deepcopy(value)
+    return figure
@@ -0,0 +1,98 @@
+"""Load-time filter index for DataHandler.
+
+Rows are partitioned by ``TX_SIGNED_HIGHWAY_RDBD_ID`` once, keeping each
+partition's row positions in ascending order. A query first narrows to the
+selected highways' partitions and then evaluates every remaining predicate in
+a single combined mask over just those rows, so its cost follows the size of
+the selected highway rather than the whole table. With an RMIntervalIndex
+attached, an ``rm_range`` filter (a ``[start, end]`` milepoint pair) narrows
+to the overlapping segments the same way.
+"""
+import numpy as np
+import pandas as pd
+
+HIGHWAY_COLUMN = 'TX_SIGNED_HIGHWAY_RDBD_ID'
+
+# filter key -> (column, predicate kind)
+FILTER_COLUMNS = {
+    'year': ('EFF_YEAR', 'isin'),
+    'begin_rm': ('TX_BEG_REF_MARKER_NBR', 'isin'),
+    'end_rm': ('TX_END_REF_MARKER_NBR', 'isin'),
+    'displacement1': ('TX_LENGTH', 'min'),
+    'displacement2': ('TX_LENGTH', 'max'),
+}
+
+
+def _as_list(value):
+    return value if isinstance(value, (list, tuple)) else [value]
+
+
+def _isin(values, allowed):
+    # pandas' hashtable isin keeps the old DataFrame.isin matching rules
+    # (e.g. 100 and '100' are different values)
+    return pd.Series(values, copy=False).isin(allowed).to_numpy()
+
+
+class FilterIndex:
+    def __init__(self, df, intervals=None):
+        self.n_rows = len(df)
+        self.intervals = intervals
+        codes, highways = pd.factorize(df[HIGHWAY_COLUMN], sort=False)
+        order = np.argsort(codes, kind='stable')
+        counts = np.bincount(codes[codes >= 0], minlength=len(highways))
+        # rows with a missing highway get code -1 and sort to the front
+        start = int((codes < 0).sum())
+        self.partitions = {}
+        for highway, count in zip(highways, counts):
+            self.partitions[highway] = order[start:start + count]
+            start += count
+        # categorical RM columns stay categorical: to_numpy() would build an
+        # object array of every row's value
+        self.columns = {
+            column: df[column].array if isinstance(df[column].dtype, pd.CategoricalDtype) else df[column].to_numpy()
+            for column, _ in FILTER_COLUMNS.values()
+        }
+
+    def highway_positions(self, highways):
+        parts = [self.partitions[h] for h in highways if h in self.partitions]
+        if not parts:
+            return np.empty(0, dtype=np.intp)
+        if len(parts) == 1:
+            return parts[0]
+        return np.sort(np.concatenate(parts))
+
+    def query(self, filters):
+        """Return the ascending row positions matching ``filters``.
+
+        Accepts the same filter dict as ``DataHandler.filter_data``; empty
+        values and the 'all' sentinel are ignored.
+        """
+        active = {key: value for key, value in filters.items() if value and value != 'all'}
+
+        if 'rm_range' in active:
+            if self.intervals is None:
+                raise ValueError("rm_range filters need an RMIntervalIndex")
+            start, end = active['rm_range']
+            positions = self.intervals.query(_as_list(active.get('highway') or []), start, end)
+        elif 'highway' in active:
+            positions = self.highway_positions(_as_list(active['highway']))
+        else:
+            positions = np.arange(self.n_rows)
+
+        mask = None
+        for key, (column, kind) in FILTER_COLUMNS.items():
+            if key not in active or len(positions) == 0:
+                continue
+            values = [v for v in _as_list(active[key]) if v != 'all']
+            if not values:
+                continue
+            column_values = self.columns[column][positions]
+            if kind == 'isin':
+                key_mask = _isin(column_values, values)
+            elif kind == 'min':
+                key_mask = column_values >= min(values)
+            else:
+                key_mask = column_values <= max(values)
+            mask = key_mask if mask is None else mask & key_mask
+
+        return positions if mask is None else positions[mask]
@@ -0,0 +1,141 @@
+"""Grouped statistics over segment rows from a single grouping.
+
+``grouped_statistics(frame, group_by, metrics)`` groups ``frame`` by the
+``group_by`` columns and computes ``(func, column)`` metrics:
+
+    count      rows where the column is present
+    sum        sum of the present values
+    mean       unweighted mean of the present values
+    wmean      TX_LENGTH-weighted mean over rows where the column is present
+    per_mile   sum of the column over the summed TX_LENGTH of the group
+    min, max   smallest and largest present value
+    p<q>       q-th percentile (0-100) of the present values, interpolated
+               linearly like pandas' quantile (p50 is the median)
+
+The grouping is computed once. Every metric is then derived from a few
+block reductions over it:
+- one sum over all the columns any metric needs summed (means, weighted
+  means, per-mile rates and sums);
+- one count over the columns that have missing values;
+- one min, one max and one quantile per percentile.
+So asking for a column's mean, weighted mean and per-mile rate costs little
+more than its sum. Groups where a metric has no values get NaN (0 for count
+and sum). A group with zero length gets NaN for per_mile.
+
+The result has the group keys in sorted order, then one ``func:column``
+column per metric. Rows whose key is missing are left out, as in
+``groupby``. Without group keys the result is a single row over the whole
+frame, even when it is empty.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+WEIGHT_COLUMN = 'TX_LENGTH'
+METRIC_FUNCTIONS = ('sum', 'mean', 'wmean', 'per_mile', 'min', 'max', 'count', 'p<q>')
+
+_PERCENTILE = re.compile(r'p(\d+(?:\.\d+)?)$')
+
+
+def percentile_of(func):
+    """The q of a ``p<q>`` metric function, or None for any other function."""
+    match = _PERCENTILE.match(func)
+    if match is None or float(match.group(1)) > 100:
+        return None
+    return float(match.group(1))
+
+
+def is_metric_function(func):
+    return func in METRIC_FUNCTIONS[:-1] or percentile_of(func) is not None
+
+
+def _weighted_names(column):
+    return f'wmean:{column}:num', f'wmean:{column}:den'
+
+
+def grouped_statistics(frame, group_by, metrics):
+    """Group ``frame`` by ``group_by`` and compute ``(func, column)`` metrics."""
+    group_by = list(group_by)
+    # dicts keep first-seen order without duplicates
+    summed, counted, minimum, maximum, percentiles = {}, {}, {}, {}, {}
+    # float32 columns (see column_schema.py) are summed, averaged and ranked
+    # as float64, so the results match a float64 table's exactly
+    narrow = [column for column in dict.fromkeys(column for _, column in metrics)
+              if column in frame.columns and frame[column].dtype == np.float32]
+    work = frame
+    if narrow:
+        work = frame.copy(deep=False)
+        for column in narrow:
+            work[column] = frame[column].astype(np.float64)
+    for func, column in metrics:
+        if func in ('sum', 'mean', 'per_mile'):
+            summed[column] = True
+        if func == 'per_mile':
+            summed[WEIGHT_COLUMN] = True
+        if func in ('mean', 'count'):
+            counted[column] = True
+        if func == 'wmean':
+            num, den = _weighted_names(column)
+            if work is frame:
+                work = frame.copy(deep=False)
+            work[num] = frame[column] * frame[WEIGHT_COLUMN]
+            work[den] = frame[WEIGHT_COLUMN].where(frame[column].notna())
+            summed[num] = summed[den] = True
+        if func == 'min':
+            minimum[column] = True
+        if func == 'max':
+            maximum[column] = True
+        if percentile_of(func) is not None:
+            percentiles.setdefault(percentile_of(func), {})[column] = True
+
+    # without keys a constant key makes the whole frame one group, and the
+    # reindex keeps that group when the frame is empty
+    grouped = work.groupby(group_by or np.zeros(len(work), dtype=np.int8), sort=True, observed=True)
+    sizes = grouped.size()
+    if not group_by:
+        sizes = sizes.reindex([0], fill_value=0)
+
+    def reduce(columns, how, *args):
+        reduced = getattr(grouped[list(columns)], how)(*args)
+        if not group_by:
+            reduced = reduced.reindex(sizes.index)
+        return {column: reduced[column].to_numpy() for column in reduced.columns}
+
+    sums = reduce(summed, 'sum') if summed else {}
+    if not group_by:
+        sums = {column: np.nan_to_num(values) for column, values in sums.items()}
+    incomplete = [column for column in counted if work[column].isna().any()]
+    counts = reduce(incomplete, 'count') if incomplete else {}
+    counts = {column: np.nan_to_num(counts[column]).astype('int64') if column in counts else sizes.to_numpy()
+              for column in counted}
+    minima = reduce(minimum, 'min') if minimum else {}
+    maxima = reduce(maximum, 'max') if maximum else {}
+    quantiles = {q: reduce(columns, 'quantile', q / 100) for q, columns in percentiles.items()}
+
+    def ratio(num, den):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(den != 0, num / den, np.nan)
+
+    columns = {}
+    for func, column in metrics:
+        name = f'{func}:{column}'
+        if func == 'count':
+            columns[name] = counts[column]
+        elif func == 'sum':
+            columns[name] = sums[column]
+        elif func == 'mean':
+            columns[name] = ratio(sums[column], counts[column])
+        elif func == 'wmean':
+            num, den = _weighted_names(column)
+            columns[name] = ratio(sums[num], sums[den])
+        elif func == 'per_mile':
+            columns[name] = ratio(sums[column], sums[WEIGHT_COLUMN])
+        elif func == 'min':
+            columns[name] = minima[column]
+        elif func == 'max':
+            columns[name] = maxima[column]
+        else:
+            columns[name] = quantiles[percentile_of(func)][column]
+    result = pd.DataFrame(columns, index=sizes.index)
+    return result.reset_index(drop=not group_by)[group_by + list(columns)]
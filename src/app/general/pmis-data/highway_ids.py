@@ -0,0 +1,41 @@
+"""Highway IDs as an ordered categorical in natural sort order.
+
+TX_SIGNED_HIGHWAY_RDBD_ID values look like ``IH0040 L``: a route prefix, a
+route number and a roadbed suffix. DataHandler converts the column once at
+load into a categorical whose categories are sorted by (prefix, number,
+suffix). The sorted highway list is then just the categories, and highway
+comparisons work on the integer codes instead of the strings.
+"""
+import numpy as np
+import pandas as pd
+
+_PARTS_PATTERN = r'^\s*(\D*?)\s*(\d+(?:\.\d+)?)?\s*(.*?)\s*$'
+
+
+def natural_argsort(values):
+    """Indices that sort ``values`` by prefix, route number and suffix."""
+    text = pd.Series(values, dtype=object).astype(str)
+    parts = text.str.extract(_PARTS_PATTERN)
+    # IDs without a number sort first within their prefix
+    numbers = pd.to_numeric(parts[1], errors='coerce').fillna(-1).to_numpy()
+    prefix_rank = pd.factorize(parts[0].fillna(''), sort=True)[0]
+    suffix_rank = pd.factorize(parts[2].fillna(''), sort=True)[0]
+    text_rank = pd.factorize(text, sort=True)[0]
+    return np.lexsort((text_rank, suffix_rank, numbers, prefix_rank))
+
+
+def highway_categorical(series):
+    """``series`` as an ordered categorical with naturally sorted categories."""
+    if isinstance(series.dtype, pd.CategoricalDtype) and series.cat.ordered:
+        return series
+    # sort the distinct IDs only, then relabel the row codes
+    codes, uniques = pd.factorize(series, sort=False)
+    order = natural_argsort(uniques)
+    rank = np.empty(len(order), dtype=codes.dtype)
+    rank[order] = np.arange(len(order))
+    new_codes = np.where(codes >= 0, rank[codes], -1)
+    categories = np.asarray(uniques, dtype=object)[order]
+    return pd.Series(
+        pd.Categorical.from_codes(new_codes, categories=categories, ordered=True),
+        index=series.index, name=series.name
+    )
@@ -0,0 +1,238 @@
+"""Request instrumentation: latency, phase, payload and row histograms.
+
+``instrument(server, app)`` hooks the Flask server, so every request records
+the following, labelled by route and Dash callback:
+- Wall time.
+- Response bytes.
+- Rows touched.
+- Time in each named phase.
+Dash callback requests all go to /_dash-update-component, so they are
+labelled by the function name that answered them. Code on the request path
+marks phases with ``with phase('filter'):`` and reports rows with
+``add_rows(n)``. Phases nest, and each phase's time includes the phases
+inside it. Streamed responses are measured when the last chunk has been
+sent.
+
+``/metrics`` serves the histograms and process memory in the Prometheus text
+format. Each worker process keeps its own numbers.
+
+Requests slower than PMIS_SLOW_REQUEST_SECONDS are logged to the
+``pmis.slow`` logger as one JSON object per line. The entry carries the
+phase breakdown and the normalized selection passed to ``set_selection``.
+PMIS_SLOW_LOG names a file for that logger.
+"""
+import bisect
+import contextvars
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, request
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 2.5e5, 1e6, 2.5e6, 1e7, 1e8)
+ROWS_BUCKETS = (0, 10, 100, 1e3, 1e4, 1e5, 1e6, 1e7)
+
+SLOW_REQUEST_SECONDS = float(os.environ.get('PMIS_SLOW_REQUEST_SECONDS', 1.0))
+DASH_CALLBACK_PATH = '/_dash-update-component'
+
+slow_log = logging.getLogger('pmis.slow')
+if os.environ.get('PMIS_SLOW_LOG'):
+    _handler = logging.FileHandler(os.environ['PMIS_SLOW_LOG'])
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    slow_log.addHandler(_handler)
+    slow_log.setLevel(logging.INFO)
+
+_current = contextvars.ContextVar('pmis_request_metrics', default=None)
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(float(b) for b in buckets)
+        self.label_names = label_names
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.get(labels, (None, 0.0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self._series[labels] = (counts, total + value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in series:
+            label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, labels))
+            prefix = label_text + ',' if label_text else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total:.6g}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_SECONDS = Histogram(
+    'pmis_request_seconds', 'Wall time per request.', SECONDS_BUCKETS, ('route', 'callback'))
+PHASE_SECONDS = Histogram(
+    'pmis_phase_seconds', 'Time per request spent in a phase (filter, aggregate, figure, serialize).',
+    SECONDS_BUCKETS, ('route', 'callback', 'phase'))
+RESPONSE_BYTES = Histogram(
+    'pmis_response_bytes', 'Response body size.', BYTES_BUCKETS, ('route', 'callback'))
+ROWS_TOUCHED = Histogram(
+    'pmis_rows_touched', 'Dataset rows matched by the filters of a request.', ROWS_BUCKETS, ('route', 'callback'))
+HISTOGRAMS = (REQUEST_SECONDS, PHASE_SECONDS, RESPONSE_BYTES, ROWS_TOUCHED)
+
+
+class RequestMetrics:
+    def __init__(self, route, callback=''):
+        self.route = route
+        self.callback = callback
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.rows = None
+        self.selection = None
+
+
+@contextmanager
+def phase(name):
+    """Time the enclosed block as ``name`` in the current request, if any."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.phases[name] = metrics.phases.get(name, 0.0) + time.perf_counter() - start
+
+
+def add_rows(count):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.rows = (metrics.rows or 0) + int(count)
+
+
+def set_selection(selection):
+    # Normalized filters of the request, kept for the slow-query log
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.selection = selection
+
+
+def finish(metrics, response_bytes):
+    elapsed = time.perf_counter() - metrics.start
+    labels = (metrics.route, metrics.callback)
+    REQUEST_SECONDS.observe(labels, elapsed)
+    if response_bytes is not None:
+        RESPONSE_BYTES.observe(labels, response_bytes)
+    if metrics.rows is not None:
+        ROWS_TOUCHED.observe(labels, metrics.rows)
+    for name, seconds in metrics.phases.items():
+        PHASE_SECONDS.observe(labels + (name,), seconds)
+
+    if elapsed >= SLOW_REQUEST_SECONDS:
+        slow_log.warning(json.dumps({
+            'route': metrics.route,
+            'callback': metrics.callback,
+            'seconds': round(elapsed, 4),
+            'phases': {name: round(seconds, 4) for name, seconds in metrics.phases.items()},
+            'bytes': response_bytes,
+            'rows': metrics.rows,
+            'selection': metrics.selection,
+        }, default=str))
+
+
+def _counted(chunks, metrics):
+    # Pass a streamed body through, recording once the last chunk is out
+    sent = 0
+    try:
+        for chunk in chunks:
+            sent += len(chunk)
+            yield chunk
+    finally:
+        _current.set(None)
+        finish(metrics, sent)
+
+
+def memory_lines():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    if sys.platform != 'darwin':
+        peak *= 1024
+    lines = [
+        '# HELP pmis_process_peak_resident_bytes Peak resident set size of this worker.',
+        '# TYPE pmis_process_peak_resident_bytes gauge',
+        f'pmis_process_peak_resident_bytes {peak}',
+    ]
+    try:
+        with open('/proc/self/statm') as f:
+            resident = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return lines
+    return lines + [
+        '# HELP pmis_process_resident_bytes Resident set size of this worker.',
+        '# TYPE pmis_process_resident_bytes gauge',
+        f'pmis_process_resident_bytes {resident}',
+    ]
+
+
+def render():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    lines.extend(memory_lines())
+    return '\n'.join(lines) + '\n'
+
+
+def instrument(server, app):
+    """Record every request to ``server``; Dash callbacks are named from ``app``."""
+
+    def callback_name(payload):
+        output = (payload or {}).get('output', '')
+        entry = app.callback_map.get(output)
+        return getattr(entry['callback'], '__name__', output) if entry else output
+
+    @server.before_request
+    def start_request():
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        callback = ''
+        if request.path == DASH_CALLBACK_PATH:
+            callback = callback_name(request.get_json(silent=True))
+        _current.set(RequestMetrics(route, callback))
+
+    @server.after_request
+    def end_request(response):
+        metrics = _current.get()
+        if metrics is None:
+            return response
+        if response.is_streamed and response.content_length is None:
+            # phases inside the stream still count towards this request
+            response.response = _counted(response.response, metrics)
+        else:
+            _current.set(None)
+            finish(metrics, response.content_length)
+        return response
+
+    @server.route('/metrics', methods=['GET'])
+    def get_metrics():
+        return Response(render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,121 @@
+"""Load-time index of the reference-marker options offered by the filters.
+
+update_filters lists the begin and end reference markers of the rows matching
+the current selection. Those lists only depend on which (highway, begin RM,
+end RM, length band) combinations exist, so the index keeps each distinct
+combination once. Within a highway the combinations are sorted by begin RM and
+then end RM, so each begin RM's slice is the list of end RMs reachable from
+it. Reference markers are stored as codes into their sorted unique values,
+which makes sorted option lists a plain ``np.unique`` over codes.
+
+Length bands are the aggregate cube's (see ``band_lengths``). A displacement
+threshold outside DISPLACEMENT_THRESHOLDS, or any filter other than those in
+INDEXED_FILTERS (a milepoint range, a year), makes ``options`` return
+NotImplemented and the caller falls back to the rows.
+"""
+import numpy as np
+import pandas as pd
+
+from aggregate_cube import DISPLACEMENT_THRESHOLDS, band_lengths
+from filter_index import HIGHWAY_COLUMN
+
+BEGIN_COLUMN = 'TX_BEG_REF_MARKER_NBR'
+END_COLUMN = 'TX_END_REF_MARKER_NBR'
+# filter keys the combinations can answer
+INDEXED_FILTERS = ('highway', 'begin_rm', 'end_rm', 'displacement1', 'displacement2')
+
+
+def _selected(value):
+    if not value or value == 'all':
+        return []
+    values = value if isinstance(value, (list, tuple)) else [value]
+    return [v for v in values if v != 'all']
+
+
+class OptionIndex:
+    def __init__(self, df):
+        self.begin_values = sorted(df[BEGIN_COLUMN].dropna().unique())
+        self.end_values = sorted(df[END_COLUMN].dropna().unique())
+        self._begin_lookup = pd.Index(self.begin_values)
+        self._end_lookup = pd.Index(self.end_values)
+
+        highway_codes, highway_names = pd.factorize(df[HIGHWAY_COLUMN], sort=False)
+        combos = pd.DataFrame({
+            'highway': highway_codes,
+            'begin': self._begin_lookup.get_indexer(df[BEGIN_COLUMN]),
+            'end': self._end_lookup.get_indexer(df[END_COLUMN]),
+            'length': band_lengths(df['TX_LENGTH']),
+        }).drop_duplicates()
+        combos = combos.sort_values(['highway', 'begin', 'end'], kind='stable')
+
+        self.begin = combos['begin'].to_numpy()
+        self.end = combos['end'].to_numpy()
+        self.length = combos['length'].to_numpy()
+        codes = combos['highway'].to_numpy()
+        # combinations of one highway are the slice partitions[highway]
+        starts = np.searchsorted(codes, np.arange(len(highway_names)), side='left')
+        ends = np.searchsorted(codes, np.arange(len(highway_names)), side='right')
+        self.partitions = {
+            highway: (int(start), int(end)) for highway, start, end in zip(highway_names, starts, ends)
+        }
+
+    def __len__(self):
+        return len(self.begin)
+
+    def _rows(self, highways, begin_codes):
+        if not highways:
+            rows = np.arange(len(self.begin))
+            if begin_codes is not None:
+                rows = rows[np.isin(self.begin, begin_codes)]
+            return rows
+
+        slices = [self.partitions[h] for h in highways if h in self.partitions]
+        if begin_codes is None:
+            ranges = slices
+        else:
+            # follow each selected begin RM to its end RMs
+            ranges = []
+            for start, end in slices:
+                begins = self.begin[start:end]
+                lo = start + np.searchsorted(begins, begin_codes, side='left')
+                hi = start + np.searchsorted(begins, begin_codes, side='right')
+                ranges.extend(zip(lo, hi))
+        parts = [np.arange(start, end) for start, end in ranges if end > start]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.intp)
+
+    def options(self, filters):
+        """Sorted begin and end RM values of the rows matching ``filters``.
+
+        Takes the same filter dict as ``DataHandler.filter_data`` and returns
+        ``(begin_values, end_values)``, or NotImplemented for filters outside
+        INDEXED_FILTERS and displacement thresholds the length bands cannot
+        answer.
+        """
+        if any(_selected(value) for key, value in filters.items() if key not in INDEXED_FILTERS):
+            return NotImplemented
+        displacement1 = _selected(filters.get('displacement1'))
+        displacement2 = _selected(filters.get('displacement2'))
+        if any(v not in DISPLACEMENT_THRESHOLDS for v in displacement1 + displacement2):
+            return NotImplemented
+
+        begin_rm = _selected(filters.get('begin_rm'))
+        begin_codes = None
+        if begin_rm:
+            begin_codes = np.unique(self._begin_lookup.get_indexer(pd.Index(begin_rm, dtype=object)))
+            begin_codes = begin_codes[begin_codes >= 0]
+        rows = self._rows(_selected(filters.get('highway')), begin_codes)
+
+        mask = np.ones(len(rows), dtype=bool)
+        end_rm = _selected(filters.get('end_rm'))
+        if end_rm:
+            end_codes = self._end_lookup.get_indexer(pd.Index(end_rm, dtype=object))
+            mask &= np.isin(self.end[rows], end_codes[end_codes >= 0])
+        if displacement1:
+            mask &= self.length[rows] >= min(displacement1)
+        if displacement2:
+            mask &= self.length[rows] <= max(displacement2)
+        rows = rows[mask]
+
+        begin_values = [self.begin_values[c] for c in np.unique(self.begin[rows]) if c >= 0]
+        end_values = [self.end_values[c] for c in np.unique(self.end[rows]) if c >= 0]
+        return begin_values, end_values
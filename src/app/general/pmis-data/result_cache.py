@@ -0,0 +1,111 @@
+"""Memoized results for update_charts_and_summary.
+
+Entries are keyed by a canonical form of the filter selection so that
+equivalent selections (different list order, 'all' sentinels, displacement
+values that reduce to the same TX_LENGTH bound) share one entry. The cache is
+bound to a dataset version and empties itself when a different version asks
+for a result. Dataset versions only grow, so lookups and stores from a
+request still running on an older snapshot are ignored instead of flushing
+the newer entries.
+"""
+import threading
+from collections import OrderedDict
+
+# marks a missing entry, since None is a result that can be cached
+_MISSING = object()
+
+
+def _sort_key(value):
+    # numbers sort numerically (0 < 0.5 < 0.7), everything else as text after them
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, value, '')
+    return (1, 0, str(value))
+
+
+def _canonical_values(values):
+    if values is None or values == 'all':
+        return ()
+    if not isinstance(values, (list, tuple)):
+        values = [values]
+    return tuple(sorted({v for v in values if v != 'all'}, key=_sort_key))
+
+
+def canonical_selection(highway, begin_rm, displacement1, end_rm, displacement2, rm_range=None):
+    # filter_data only uses the smallest displacement1 and the largest
+    # displacement2 value, so the rest of each list does not affect results
+    disp1 = _canonical_values(displacement1)
+    disp2 = _canonical_values(displacement2)
+    return (
+        _canonical_values(highway),
+        _canonical_values(begin_rm),
+        disp1[:1],
+        _canonical_values(end_rm),
+        disp2[-1:],
+        tuple(sorted(float(v) for v in rm_range)) if rm_range else (),
+    )
+
+
+class ResultCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _sync_version(self, version):
+        # Returns False for a stale version that must not touch the entries
+        if self.version is not None and version < self.version:
+            return False
+        if version != self.version:
+            self._entries.clear()
+            self.version = version
+        return True
+
+    def get(self, version, key, default=None):
+        with self._lock:
+            if self._sync_version(version) and key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, version, key, value):
+        with self._lock:
+            if not self._sync_version(version):
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, version, key, compute):
+        value = self.get(version, key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(version, key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': self.version,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,165 @@
+"""Per-highway interval index over segment milepoints.
+
+A segment runs from ``begin RM + begin displacement`` to ``end RM + end
+displacement``. Reference markers with a letter suffix (``100A``) are
+auxiliary markers placed after the numbered one. They are positioned at their
+number, so their segments order by displacement from there.
+
+Overlap queries have to find every segment crossing a milepoint range.
+Sorting by start alone does not bound where those segments begin, since one
+long segment can start far before the range. The index therefore splits
+each highway's segments into chains whose starts and ends both increase. A
+(highway, year) inventory is normally one chain. Within a chain the
+overlapping segments form one contiguous run, found with two binary searches.
+A query costs O(c log n + k) for c chains and k results.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from filter_index import HIGHWAY_COLUMN
+
+BEGIN_COLUMNS = ('TX_BEG_REF_MARKER_NBR', 'TX_BEG_REF_MRKR_DISP')
+END_COLUMNS = ('TX_END_REF_MARKER_NBR', 'TX_END_REF_MARKER_DISP')
+CHAIN_COLUMN = 'EFF_YEAR'
+
+_MARKER_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)')
+# '+' arrives as a space when a query string is not percent-encoded
+_RANGE_PATTERN = re.compile(r'^\s*(\w+)\s*(?:\+?\s*(\d+(?:\.\d+)?|\.\d+))?\s*$')
+
+
+def marker_positions(markers):
+    """Numeric position of each reference marker; NaN when it has no number."""
+    markers = pd.Series(markers, copy=False)
+    if markers.dtype.kind in 'iuf':
+        return markers.to_numpy(dtype=float)
+    # parse each distinct marker once
+    codes, uniques = pd.factorize(markers)
+    numbers = pd.Series(uniques, dtype=object).astype(str).str.extract(_MARKER_PATTERN, expand=False)
+    positions = np.append(pd.to_numeric(numbers, errors='coerce').to_numpy(dtype=float), np.nan)
+    return positions[codes]
+
+
+def milepoint(marker, displacement=0):
+    """Position of ``marker + displacement``, e.g. ``milepoint('290', 0.5)``."""
+    position = marker_positions([marker])[0]
+    if np.isnan(position):
+        raise ValueError(f"Invalid reference marker: {marker!r}")
+    return position + float(displacement or 0)
+
+
+def parse_milepoint(text):
+    """Parse ``"290+0.5"``, ``"290 0.5"`` or ``"290"`` into a milepoint."""
+    match = _RANGE_PATTERN.match(str(text))
+    if not match:
+        raise ValueError(f"Invalid milepoint {text!r}; expected RM or RM+displacement")
+    return milepoint(match.group(1), match.group(2) or 0)
+
+
+def _monotone_chains(starts, ends):
+    # Greedy split of start-sorted intervals into runs with non-decreasing
+    # ends; only used for the rare group that is not already one
+    chain_ends = []
+    labels = np.empty(len(starts), dtype=np.int64)
+    for i, end in enumerate(ends):
+        for chain, last in enumerate(chain_ends):
+            if end >= last:
+                chain_ends[chain] = end
+                labels[i] = chain
+                break
+        else:
+            labels[i] = len(chain_ends)
+            chain_ends.append(end)
+    return labels
+
+
+class RMIntervalIndex:
+    def __init__(self, df):
+        starts = marker_positions(df[BEGIN_COLUMNS[0]]) + df[BEGIN_COLUMNS[1]].to_numpy(dtype=float)
+        ends = marker_positions(df[END_COLUMNS[0]]) + df[END_COLUMNS[1]].to_numpy(dtype=float)
+        valid = ~(np.isnan(starts) | np.isnan(ends))
+        positions = np.flatnonzero(valid)
+
+        highway_codes, highways = pd.factorize(df[HIGHWAY_COLUMN], sort=False)
+        group_codes = pd.factorize(df[CHAIN_COLUMN], sort=False)[0]
+        highway_codes, group_codes = highway_codes[valid], group_codes[valid]
+        starts, ends = starts[valid], ends[valid]
+        # reversed segments (end before start) are indexed by their extent
+        starts, ends = np.minimum(starts, ends), np.maximum(starts, ends)
+
+        order = np.lexsort((ends, starts, group_codes, highway_codes))
+        highway_codes, group_codes = highway_codes[order], group_codes[order]
+        starts, ends, positions = starts[order], ends[order], positions[order]
+
+        # a chain breaks wherever the highway or group changes or an end
+        # steps backwards inside a group
+        new_group = np.ones(len(order), dtype=bool)
+        new_group[1:] = (highway_codes[1:] != highway_codes[:-1]) | (group_codes[1:] != group_codes[:-1])
+        group_ids = np.cumsum(new_group) - 1
+        bad = np.zeros(len(order), dtype=bool)
+        bad[1:] = ~new_group[1:] & (ends[1:] < ends[:-1])
+        group_bounds = np.append(np.flatnonzero(new_group), len(order))
+        sub_chains = np.zeros(len(order), dtype=np.int64)
+        for group in np.unique(group_ids[bad]):
+            lo, hi = group_bounds[group], group_bounds[group + 1]
+            sub_chains[lo:hi] = _monotone_chains(starts[lo:hi], ends[lo:hi])
+
+        order = np.lexsort((ends, starts, sub_chains, group_ids))
+        self.starts = starts[order]
+        self.ends = ends[order]
+        self.positions = positions[order]
+        chain_keys = np.stack([group_ids[order], sub_chains[order]])
+        chain_start = np.ones(len(order), dtype=bool)
+        chain_start[1:] = (chain_keys[:, 1:] != chain_keys[:, :-1]).any(axis=0)
+        self.chain_bounds = np.append(np.flatnonzero(chain_start), len(order))
+
+        chain_highways = highway_codes[order][self.chain_bounds[:-1]] if len(order) else np.empty(0, dtype=np.intp)
+        self.highways = {}
+        for code, highway in enumerate(highways):
+            chains = np.flatnonzero(chain_highways == code)
+            if len(chains):
+                self.highways[highway] = (int(chains[0]), int(chains[-1]) + 1)
+
+        markers = pd.concat([
+            pd.DataFrame({'highway': df[HIGHWAY_COLUMN], 'marker': df[column]})
+            for column in (BEGIN_COLUMNS[0], END_COLUMNS[0])
+        ]).dropna().drop_duplicates()
+        markers['position'] = marker_positions(markers['marker'])
+        markers['label'] = markers['marker'].astype(str)
+        markers = markers.sort_values(['highway', 'position', 'label'])
+        self._markers = {highway: list(group['marker']) for highway, group in markers.groupby('highway', sort=False, observed=True)}
+
+    def chains(self, highway=None):
+        if highway is None:
+            return range(len(self.chain_bounds) - 1)
+        if highway not in self.highways:
+            return range(0)
+        return range(*self.highways[highway])
+
+    def query(self, highways, start, end):
+        """Ascending row positions of segments overlapping ``[start, end]``.
+
+        Segments that only touch the range at an endpoint are left out, except
+        for a single-point range, which returns the segments containing it.
+        ``highways`` is a list of highway IDs, or empty for every highway.
+        """
+        start, end = min(start, end), max(start, end)
+        chains = [c for highway in highways for c in self.chains(highway)] if highways else self.chains()
+        point = start == end
+        parts = []
+        for chain in chains:
+            lo_bound, hi_bound = self.chain_bounds[chain], self.chain_bounds[chain + 1]
+            ends = self.ends[lo_bound:hi_bound]
+            starts = self.starts[lo_bound:hi_bound]
+            lo = np.searchsorted(ends, start, side='left' if point else 'right')
+            hi = np.searchsorted(starts, end, side='right' if point else 'left')
+            if hi > lo:
+                parts.append(self.positions[lo_bound + lo:lo_bound + hi])
+        if not parts:
+            return np.empty(0, dtype=np.intp)
+        return np.sort(np.concatenate(parts))
+
+    def markers(self, highway):
+        """Reference markers used on ``highway``, ordered by position."""
+        return self._markers.get(highway, [])
@@ -0,0 +1,369 @@
+"""Spatial index and simplified geometry for the /api/segments endpoints.
+
+Every ``*.geojson`` file in the layer directory is a layer named after the
+file (``pmis_data``, ``polygons_aggregated``, ...). A layer is read once, on
+first use. Its features go into a uniform grid of about GRID_CELLS x
+GRID_CELLS cells over the layer's extent, each cell listing the features
+whose bounding box touches it. A bbox query reads the cells it covers, then
+checks each candidate's bounding box. It also filters by highway
+(TX_SIGNED_HIGHWAY_RDBD_ID) and year (EFF_YEAR).
+
+/api/segments query parameters (list values may be repeated or comma-separated):
+
+    layer          layer name (default pmis_data)
+    bbox           min_lon,min_lat,max_lon,max_lat
+    highway, year  exact-match filters
+    zoom           web map zoom level; simplifies and quantizes geometry
+    fields         property projection (default: all properties)
+
+With ``zoom``, lines and rings are simplified (Douglas-Peucker) to
+SIMPLIFY_PIXELS at that zoom and coordinates are rounded to the fewest
+decimals that keep them within half a pixel. Without it geometry is
+returned as stored.
+
+/api/segments/tiles/<z>/<x>/<y>.mvt answers the same filters (without bbox
+and zoom) as a Mapbox vector tile. Lines and polygons that cross the tile
+edge are not clipped; a renderer clips them to the tile.
+"""
+import glob
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+from data_api import parse_int, split_param
+from vector_tile import EXTENT, LINESTRING, POINT, POLYGON, encode_geometry, encode_tile, ring_area, tile_bounds, to_tile
+
+DEFAULT_LAYER = 'pmis_data'
+GRID_CELLS = 64
+SIMPLIFY_PIXELS = 1.0
+MAX_ZOOM = 22
+# features whose bbox is within this many tile pixels of the tile edge go in the tile
+TILE_BUFFER_PIXELS = 4
+
+HIGHWAY_PROPERTY = 'TX_SIGNED_HIGHWAY_RDBD_ID'
+YEAR_PROPERTY = 'EFF_YEAR'
+
+GEOMETRY_TYPES = {
+    'Point': POINT, 'MultiPoint': POINT,
+    'LineString': LINESTRING, 'MultiLineString': LINESTRING,
+    'Polygon': POLYGON, 'MultiPolygon': POLYGON,
+}
+
+
+def _clean(value):
+    # NaN is not valid JSON; the files store missing values either way
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _parts(geometry):
+    """Coordinate arrays of a geometry and which of them start a polygon.
+
+    Points are one array; lines and rings one array each. ``exteriors``
+    flags the first ring of each polygon (all False for points and lines).
+    """
+    kind, coords = geometry['type'], geometry['coordinates']
+    if kind == 'Point':
+        coords = [[coords]]
+    elif kind in ('MultiPoint', 'LineString'):
+        coords = [coords]
+    if kind == 'Polygon':
+        coords = [coords]
+    if kind in ('Polygon', 'MultiPolygon'):
+        parts = [np.array(ring, dtype=float) for polygon in coords for ring in polygon]
+        exteriors = [j == 0 for polygon in coords for j in range(len(polygon))]
+        return parts, exteriors
+    return [np.array(part, dtype=float) for part in coords], [False] * len(coords)
+
+
+def simplify(points, tolerance):
+    """Douglas-Peucker: drop points closer than ``tolerance`` to the simplified line."""
+    if tolerance <= 0 or len(points) <= 2:
+        return points
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        inner = points[start + 1:end]
+        origin = points[start]
+        direction = points[end] - origin
+        length = math.hypot(direction[0], direction[1])
+        if length == 0:
+            distance = np.hypot(inner[:, 0] - origin[0], inner[:, 1] - origin[1])
+        else:
+            distance = np.abs(
+                direction[0] * (inner[:, 1] - origin[1]) - direction[1] * (inner[:, 0] - origin[0])
+            ) / length
+        farthest = int(np.argmax(distance))
+        if distance[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return points[keep]
+
+
+def _dedupe(points):
+    if len(points) < 2:
+        return points
+    moved = np.any(points[1:] != points[:-1], axis=1)
+    return points[np.concatenate(([True], moved))]
+
+
+def zoom_precision(zoom):
+    """Simplification tolerance (degrees) and coordinate decimals for a zoom level."""
+    pixel = 360 / (256 * 2 ** zoom)
+    decimals = min(7, max(0, math.ceil(-math.log10(pixel / 2))))
+    return SIMPLIFY_PIXELS * pixel, decimals
+
+
+def _reduce_part(part, geom_type, tolerance, round_to):
+    """Simplify and snap one line or ring; keeps the original when it would collapse."""
+    reduced = _dedupe(round_to(simplify(part, tolerance)))
+    minimum = 4 if geom_type == POLYGON else 2
+    if len(reduced) < minimum:
+        reduced = _dedupe(round_to(part))
+    return reduced
+
+
+class SegmentLayer:
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        with open(path) as f:
+            collection = json.load(f)
+
+        self.properties, self.geometry_types, self.parts, self.exteriors = [], [], [], []
+        bounds = []
+        for feature in collection['features']:
+            geometry = feature.get('geometry')
+            if not geometry or geometry['type'] not in GEOMETRY_TYPES:
+                continue
+            parts, exteriors = _parts(geometry)
+            stacked = np.concatenate(parts)
+            self.properties.append({k: _clean(v) for k, v in (feature.get('properties') or {}).items()})
+            self.geometry_types.append(geometry['type'])
+            self.parts.append(parts)
+            self.exteriors.append(exteriors)
+            bounds.append((*stacked.min(axis=0), *stacked.max(axis=0)))
+        self.bounds = np.array(bounds, dtype=float).reshape(-1, 4)
+        self.fields = list(dict.fromkeys(k for props in self.properties for k in props))
+        self.highways = np.array([p.get(HIGHWAY_PROPERTY) for p in self.properties], dtype=object)
+        self.years = np.array([p.get(YEAR_PROPERTY) for p in self.properties], dtype=float)
+        self._build_grid()
+
+    def __len__(self):
+        return len(self.properties)
+
+    def _build_grid(self):
+        if not len(self):
+            self.origin, self.cell, self.cells = np.zeros(2), 1.0, {}
+            return
+        self.origin = self.bounds[:, :2].min(axis=0)
+        extent = self.bounds[:, 2:].max(axis=0) - self.origin
+        self.cell = max(float(extent.max()) / GRID_CELLS, 1e-9)
+        low = self._cell_of(self.bounds[:, :2])
+        high = self._cell_of(self.bounds[:, 2:])
+        cells = {}
+        for i, ((x0, y0), (x1, y1)) in enumerate(zip(low.tolist(), high.tolist())):
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    cells.setdefault((cx, cy), []).append(i)
+        self.cells = {key: np.array(ids) for key, ids in cells.items()}
+
+    def _cell_of(self, points):
+        return np.clip(np.floor((points - self.origin) / self.cell).astype(int), 0, GRID_CELLS)
+
+    def query(self, bbox=None, highways=None, years=None):
+        """Sorted ids of features that intersect ``bbox`` and match the filters."""
+        if bbox is None:
+            ids = np.arange(len(self))
+        else:
+            (x0, y0), (x1, y1) = self._cell_of(np.array([bbox[:2], bbox[2:]], dtype=float)).tolist()
+            found = [self.cells[key] for key in
+                     ((cx, cy) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1)) if key in self.cells]
+            ids = np.unique(np.concatenate(found)) if found else np.array([], dtype=int)
+            b = self.bounds[ids]
+            ids = ids[(b[:, 0] <= bbox[2]) & (b[:, 2] >= bbox[0]) & (b[:, 1] <= bbox[3]) & (b[:, 3] >= bbox[1])]
+        if highways:
+            ids = ids[np.isin(self.highways[ids], list(highways))]
+        if years:
+            ids = ids[np.isin(self.years[ids], list(years))]
+        return ids
+
+    def _properties(self, i, fields):
+        props = self.properties[i]
+        return props if fields is None else {k: props.get(k) for k in fields}
+
+    def geojson(self, ids, zoom=None, fields=None):
+        """FeatureCollection text for ``ids``, simplified and quantized for ``zoom``."""
+        if zoom is None:
+            tolerance, round_to = 0, lambda points: points
+        else:
+            tolerance, decimals = zoom_precision(zoom)
+            round_to = lambda points: np.round(points, decimals)
+        features = []
+        for i in ids.tolist():
+            kind = self.geometry_types[i]
+            geom_type = GEOMETRY_TYPES[kind]
+            if geom_type == POINT:
+                parts = [round_to(part) for part in self.parts[i]]
+            else:
+                parts = [_reduce_part(part, geom_type, tolerance, round_to) for part in self.parts[i]]
+            features.append({
+                'type': 'Feature',
+                'id': i,
+                'geometry': {'type': kind, 'coordinates': _coordinates(kind, parts, self.exteriors[i])},
+                'properties': self._properties(i, fields),
+            })
+        return json.dumps({'type': 'FeatureCollection', 'features': features}, separators=(',', ':'))
+
+    def tile(self, z, x, y, highways=None, years=None, fields=None):
+        """Mapbox vector tile bytes for tile z/x/y."""
+        west, south, east, north = tile_bounds(z, x, y)
+        buffer = TILE_BUFFER_PIXELS / 256 * (east - west)
+        ids = self.query((west - buffer, south - buffer, east + buffer, north + buffer), highways, years)
+        tolerance = SIMPLIFY_PIXELS * EXTENT / 256
+        features = []
+        for i in ids.tolist():
+            geom_type = GEOMETRY_TYPES[self.geometry_types[i]]
+            parts = [to_tile(part, z, x, y) for part in self.parts[i]]
+            if geom_type == POINT:
+                points = np.round(np.concatenate(parts)).astype(np.int64)
+                points = points[((points >= 0) & (points < EXTENT)).all(axis=1)]
+                if not len(points):
+                    continue
+                geometry = encode_geometry(POINT, points)
+            else:
+                parts = _tile_parts(parts, self.exteriors[i], geom_type, tolerance)
+                if not parts:
+                    continue
+                geometry = encode_geometry(geom_type, parts)
+            features.append((i, geom_type, geometry, self._properties(i, fields)))
+        return encode_tile(self.name, features)
+
+
+def _tile_parts(parts, exteriors, geom_type, tolerance):
+    """Integer tile parts: lines with 2+ points, rings open and wound for MVT."""
+    snap = lambda points: np.round(points).astype(np.int64)
+    out = []
+    skip_holes = False
+    for part, exterior in zip(parts, exteriors):
+        reduced = _reduce_part(part, geom_type, tolerance, snap)
+        if geom_type == LINESTRING:
+            if len(reduced) >= 2:
+                out.append(reduced)
+            continue
+        if exterior:
+            skip_holes = False
+        elif skip_holes:
+            continue
+        if len(reduced) and (reduced[0] == reduced[-1]).all():
+            reduced = reduced[:-1]
+        area = ring_area(reduced) if len(reduced) >= 3 else 0
+        if area == 0:
+            # a polygon smaller than the tile grid goes, holes and all
+            skip_holes = exterior
+            continue
+        if (area > 0) != exterior:
+            reduced = reduced[::-1]
+        out.append(reduced)
+    return out
+
+
+def _coordinates(kind, parts, exteriors):
+    if kind == 'Point':
+        return parts[0][0].tolist()
+    if kind in ('MultiPoint', 'LineString'):
+        return parts[0].tolist()
+    if kind == 'MultiLineString':
+        return [part.tolist() for part in parts]
+    polygons = []
+    for part, exterior in zip(parts, exteriors):
+        if exterior:
+            polygons.append([])
+        polygons[-1].append(part.tolist())
+    return polygons[0] if kind == 'Polygon' else polygons
+
+
+class SegmentIndex:
+    """The layers in ``directory``, each loaded on first use."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._layers = {}
+        self._lock = threading.Lock()
+
+    def names(self):
+        return sorted(os.path.splitext(os.path.basename(p))[0]
+                      for p in glob.glob(os.path.join(self.directory, '*.geojson')))
+
+    def layer(self, name):
+        with self._lock:
+            if name not in self._layers:
+                if name not in self.names():
+                    raise KeyError(name)
+                self._layers[name] = SegmentLayer(os.path.join(self.directory, name + '.geojson'))
+            return self._layers[name]
+
+
+def _parse_bbox(raw):
+    try:
+        bbox = tuple(float(v) for v in raw.split(','))
+    except ValueError:
+        bbox = ()
+    if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+        raise ValueError(f"Invalid bbox {raw!r}; expected min_lon,min_lat,max_lon,max_lat")
+    return bbox
+
+
+def parse_segment_request(args, index):
+    """Turn /api/segments query parameters into a layer, bbox, filters and zoom.
+
+    Raises ValueError with a user-facing message for malformed parameters.
+    """
+    name = args.get('layer') or DEFAULT_LAYER
+    try:
+        layer = index.layer(name)
+    except KeyError:
+        raise ValueError(f"Unknown layer {name!r}; expected one of {index.names()}")
+
+    highways = split_param(args, 'highway')
+    if highways and HIGHWAY_PROPERTY not in layer.fields:
+        raise ValueError(f"Layer {name!r} has no {HIGHWAY_PROPERTY} property")
+    try:
+        years = [float(v) for v in split_param(args, 'year')]
+    except ValueError:
+        raise ValueError(f"Invalid value for {YEAR_PROPERTY}: {split_param(args, 'year')}")
+    if years and YEAR_PROPERTY not in layer.fields:
+        raise ValueError(f"Layer {name!r} has no {YEAR_PROPERTY} property")
+
+    fields = split_param(args, 'fields') or None
+    unknown = [f for f in fields or () if f not in layer.fields]
+    if unknown:
+        raise ValueError(f"Unknown fields: {unknown}")
+
+    zoom = parse_int(args, 'zoom')
+    if zoom is not None and zoom > MAX_ZOOM:
+        raise ValueError(f"zoom must be between 0 and {MAX_ZOOM}")
+
+    return {
+        'layer': layer,
+        'bbox': _parse_bbox(args['bbox']) if args.get('bbox') else None,
+        'highways': tuple(sorted(set(highways))),
+        'years': tuple(sorted(set(years))),
+        'fields': tuple(fields) if fields else None,
+        'zoom': zoom,
+    }
+
+
+def check_tile(z, x, y):
+    if not 0 <= z <= MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise ValueError(f"No tile {z}/{x}/{y}")
@@ -0,0 +1,65 @@
+"""Read-only dataset snapshots that request threads can share.
+
+A DataHandler is built once per dataset version, and then every request
+thread reads it without locks. That is only safe while nothing writes to it,
+so construction ends by freezing it:
+- ``frozen_frame`` rebuilds the DataFrame on read-only column arrays, so
+  ``df.loc[...] = ...`` or a write through ``to_numpy()`` raises ValueError
+  instead of changing rows another request is reading;
+- ``freeze_arrays`` marks the numpy arrays held by the indexes read-only;
+- DataHandler refuses new public attributes after construction.
+
+Filtering, ``take`` and groupby always return new objects, so reading code
+is unaffected. Memory-mapped columns (PMIS_SHARED_DATA) are read-only
+already. A hot reload builds a new snapshot and swaps it in
+(dataset_registry.py), so no snapshot is ever updated in place.
+"""
+import numpy as np
+import pandas as pd
+
+
+def _readonly(values):
+    values.flags.writeable = False
+    return values
+
+
+def frozen_frame(df):
+    """``df`` on read-only column arrays, without copying them.
+
+    Each column becomes its own block, as with the memory-mapped cache.
+    Extension columns other than categoricals are kept as they are.
+    """
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = _readonly(series.cat.codes.to_numpy())
+            columns[column] = pd.Categorical.from_codes(codes, dtype=series.dtype)
+        elif isinstance(series.dtype, np.dtype):
+            columns[column] = _readonly(series.to_numpy())
+        else:
+            columns[column] = series.array
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+
+def freeze_arrays(value, _seen=None):
+    """Mark every numpy array reachable from ``value``'s attributes read-only.
+
+    Follows object attributes, dicts, lists and tuples; pandas objects are
+    left to ``frozen_frame``.
+    """
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, dict):
+        for item in value.values():
+            freeze_arrays(item, seen)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            freeze_arrays(item, seen)
+    elif hasattr(value, '__dict__') and not isinstance(value, (pd.DataFrame, pd.Series, pd.Index, type)):
+        for item in vars(value).values():
+            freeze_arrays(item, seen)
@@ -0,0 +1,34 @@
+"""Shared setup: a small synthetic PMIS table (see benchmarks/synthetic.py).
+
+app.py loads PMIS_DATA_PATH when it is imported, so the table is written and
+the variable set here, before any test module imports it.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+# appended: benchmarks/ has modules named like the app's (figure_updates.py)
+sys.path.append(os.path.join(APP_DIR, 'benchmarks'))
+
+from synthetic import write_csv  # noqa: E402
+
+DATA_ROWS = 20000
+DATA_DIR = tempfile.mkdtemp(prefix='pmis-tests-')
+DATA_PATH = write_csv(os.path.join(DATA_DIR, 'pmis.csv'), DATA_ROWS, seed=1)
+os.environ['PMIS_DATA_PATH'] = DATA_PATH
+os.environ['PMIS_EXPORT_DIR'] = os.path.join(DATA_DIR, 'exports')
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def handler():
+    import app
+    return app.dataset.current()
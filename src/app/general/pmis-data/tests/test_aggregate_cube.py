@@ -0,0 +1,153 @@
+"""The aggregate cube against the pandas path it replaced.
+
+The oracle is the dashboard's original code: ``filter_data`` masking a copy
+of the table, then ``groupby('EFF_YEAR').agg(mean / sum)``. It runs on a
+float64 ``pd.read_csv`` of the fixture, the table that code read. (On the
+compact table the scores are float32, and the same groupby returns float32
+means up to 5e-8 away; the cube widens to float64 first.)
+``yearly_aggregates_from_rows`` is checked against the cube as well.
+
+The cube adds its cells with math.fsum, which is correctly rounded, while
+pandas sums the rows with Kahan summation in row order, so a mean can differ
+in its last bits (about 2e-16 relative on the fixture). Floats are compared
+with a relative tolerance of RTOL; row counts, years and the summary text
+must match exactly.
+"""
+import random
+
+import pandas as pd
+import pytest
+
+import app
+from aggregate_cube import DISPLACEMENT_THRESHOLDS, yearly_aggregates_from_rows
+from conftest import DATA_PATH
+
+RTOL = 1e-12
+N_SELECTIONS = 200
+
+
+class Baseline:
+    """yearly_aggregates as the dashboard computed them before the cube."""
+
+    def __init__(self, path):
+        self.df = pd.read_csv(path, low_memory=False)
+
+    def filter_data(self, filters):
+        filtered_df = self.df.copy()
+        for key, value in filters.items():
+            if value and value != 'all':
+                if key == 'year':
+                    filtered_df = filtered_df[filtered_df['EFF_YEAR'].isin(value if isinstance(value, list) else [value])]
+                elif key == 'highway':
+                    filtered_df = filtered_df[filtered_df['TX_SIGNED_HIGHWAY_RDBD_ID'].isin(value if isinstance(value, list) else [value])]
+                elif key == 'begin_rm':
+                    filtered_df = filtered_df[filtered_df['TX_BEG_REF_MARKER_NBR'].isin(value)]
+                elif key == 'end_rm':
+                    filtered_df = filtered_df[filtered_df['TX_END_REF_MARKER_NBR'].isin(value)]
+                elif key == 'displacement1':
+                    min_disp = min(v for v in value if v != 'all')
+                    filtered_df = filtered_df[filtered_df['TX_LENGTH'] >= min_disp]
+                elif key == 'displacement2':
+                    max_disp = max(v for v in value if v != 'all')
+                    filtered_df = filtered_df[filtered_df['TX_LENGTH'] <= max_disp]
+        return filtered_df
+
+    def calculate_condition_score(self, filtered_df):
+        if filtered_df.empty or filtered_df['TX_LENGTH'].sum() == 0:
+            return 0
+        return (filtered_df['TX_CONDITION_SCORE'] * filtered_df['TX_LENGTH']).sum() / filtered_df['TX_LENGTH'].sum()
+
+    def yearly_aggregates(self, filters):
+        filtered_df = self.filter_data(filters)
+        if filtered_df.empty:
+            return None
+        yearly_data = filtered_df.groupby('EFF_YEAR').agg({
+            'TX_DISTRESS_SCORE': 'mean',
+            'TX_CONDITION_SCORE': 'mean',
+            'TX_RIDE_SCORE': 'mean'
+        }).reset_index()
+        bar_data = filtered_df.groupby('EFF_YEAR').agg({
+            'TX_CRCP_SPALLED_CRACKS_QTY': 'sum',
+            'TX_JCP_PCC_PATCHES_QTY': 'sum',
+            'TX_CRCP_PUNCHOUT_QTY': 'sum',
+            'TX_CRCP_ACP_PATCHES_QTY': 'sum',
+            'TX_LENGTH': 'sum'
+        }).reset_index()
+        # named as aggregate_cube.add_per_mile names them
+        for column in ('TX_CRCP_SPALLED_CRACKS_QTY', 'TX_JCP_PCC_PATCHES_QTY',
+                       'TX_CRCP_PUNCHOUT_QTY', 'TX_CRCP_ACP_PATCHES_QTY'):
+            bar_data[f'per_mile:{column}'] = bar_data[column] / bar_data['TX_LENGTH']
+        return {
+            'rows': len(filtered_df),
+            'yearly_data': yearly_data,
+            'bar_data': bar_data,
+            'condition_score': self.calculate_condition_score(filtered_df),
+        }
+
+
+@pytest.fixture(scope='module')
+def baseline():
+    return Baseline(DATA_PATH)
+
+
+def selections(handler, n, seed=0):
+    """Random (highway, begin RM, disp1, end RM, disp2, milepoints) selections."""
+    rng = random.Random(seed)
+    highways = list(handler.get_unique_values('TX_SIGNED_HIGHWAY_RDBD_ID'))
+    thresholds = list(DISPLACEMENT_THRESHOLDS)
+    result = [((), (), (), (), (), ()), ((), (), (0.5,), (), (), ())]
+    for _ in range(n):
+        picked = tuple(rng.sample(highways, rng.choice([1, 1, 1, 2])))
+        begin, end = handler.filter_options({'highway': list(picked)})
+        result.append((
+            picked,
+            tuple(rng.sample(list(begin), min(len(begin), rng.randint(0, 3)))),
+            tuple(rng.sample(thresholds, rng.randint(0, 1))),
+            tuple(rng.sample(list(end), min(len(end), rng.randint(0, 3)))),
+            tuple(rng.sample(thresholds, rng.randint(0, 1))),
+            (),
+        ))
+    return result
+
+
+def assert_frames_close(cube, expected):
+    pd.testing.assert_frame_equal(cube.reset_index(drop=True), expected.reset_index(drop=True),
+                                  check_dtype=False, check_exact=False, check_like=True, rtol=RTOL, atol=0)
+
+
+def assert_aggregates_close(cube, expected, selection):
+    assert cube is not NotImplemented, selection
+    if expected is None:
+        assert cube is None, selection
+        return
+    assert cube['rows'] == expected['rows'], selection
+    assert_frames_close(cube['yearly_data'], expected['yearly_data'])
+    assert_frames_close(cube['bar_data'], expected['bar_data'])
+    assert cube['condition_score'] == pytest.approx(expected['condition_score'], rel=RTOL, abs=0)
+
+
+def test_cube_matches_baseline(handler, baseline):
+    for selection in selections(handler, N_SELECTIONS):
+        filters = app.selection_filters(selection)
+        assert_aggregates_close(handler.yearly_aggregates(filters), baseline.yearly_aggregates(filters), selection)
+
+
+def test_cube_matches_rows(handler):
+    for selection in selections(handler, N_SELECTIONS, seed=2):
+        filters = app.selection_filters(selection)
+        rows = yearly_aggregates_from_rows(handler.filter_data(filters))
+        assert_aggregates_close(handler.yearly_aggregates(filters), rows, selection)
+
+
+def test_summary_matches_baseline(handler, baseline):
+    for selection in selections(handler, N_SELECTIONS, seed=1):
+        cube = app.compute_chart_results(handler, selection)
+        expected = app.compute_chart_results(baseline, selection)
+        assert cube['summary'] == expected['summary'], selection
+        assert cube['key_insights'] == expected['key_insights'], selection
+
+
+def test_unsupported_filters_fall_back():
+    cube = app.dataset.current().cube
+    assert cube.yearly_aggregates({'displacement1': [0.3]}) is NotImplemented
+    assert cube.yearly_aggregates({'rm_range': [0, 10]}) is NotImplemented
@@ -0,0 +1,40 @@
+"""The compact table against the source as pd.read_csv gives it.
+
+Exports and /api/data write the loaded table, so with the default
+PMIS_COLUMNS it must hold every source column with unchanged values.
+"""
+import pandas as pd
+import pytest
+
+import app
+from column_schema import SCHEMA, parse_keep
+from conftest import DATA_PATH
+
+
+@pytest.fixture(scope='module')
+def source():
+    return pd.read_csv(DATA_PATH, low_memory=False)
+
+
+def test_default_keeps_every_column(handler, source):
+    assert list(handler.df.columns) == list(source.columns)
+
+
+def test_export_matches_source(handler, source):
+    rows = slice(0, 5000)
+    exported = handler.df.iloc[rows].to_csv(index=False)
+    assert exported == source.iloc[rows].to_csv(index=False)
+
+
+def test_schema_setting_narrows(source):
+    narrow = app.DataHandler(DATA_PATH, columns=parse_keep('schema,TX_AADT_CURRENT'))
+    expected = [column for column in source.columns if column in SCHEMA or column == 'TX_AADT_CURRENT']
+    assert list(narrow.df.columns) == expected
+
+
+@pytest.mark.parametrize('value, keep', [
+    (None, 'all'), ('', 'all'), (' ALL ', 'all'), ('schema', []),
+    ('schema, TX_AADT_CURRENT', ['TX_AADT_CURRENT']), ('TX_AADT_CURRENT', ['TX_AADT_CURRENT']),
+])
+def test_parse_keep(value, keep):
+    assert parse_keep(value) == keep
@@ -0,0 +1,136 @@
+"""The out-of-core store against DataHandler on the same source."""
+import json
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+from werkzeug.datastructures import MultiDict
+
+pytest.importorskip('pyarrow')
+
+import app  # noqa: E402
+from columnar_store import ColumnarStore  # noqa: E402
+
+RM_COLUMNS = ('TX_BEG_REF_MARKER_NBR', 'TX_END_REF_MARKER_NBR')
+
+
+@pytest.fixture(scope='module', params=['text', 'integer'])
+def backends(request, tmp_path_factory):
+    df = pd.read_csv(app.DATA_PATH, low_memory=False)
+    if request.param == 'integer':
+        # markers without '100A'-style suffixes load as int64
+        for column in RM_COLUMNS:
+            df[column] = pd.to_numeric(df[column].astype(str).str.rstrip('A'))
+    path = str(tmp_path_factory.mktemp(request.param) / 'pmis.csv')
+    df.to_csv(path, index=False)
+    handler = app.DataHandler(path)
+    # small chunks, so the markers' dtype is settled across several of them
+    store = ColumnarStore.for_source(path, chunk_rows=3000)
+    return handler, store
+
+
+def kind(value):
+    # DataHandler holds integers in the smallest type that fits (column_schema.py)
+    return 'number' if isinstance(value, (int, float, np.number)) else type(value).__name__
+
+
+def selections(handler, n, seed=0):
+    rng = random.Random(seed)
+    highways = list(handler.get_unique_values('TX_SIGNED_HIGHWAY_RDBD_ID'))
+    result = [{}]
+    for _ in range(n):
+        picked = rng.sample(highways, rng.choice([1, 1, 2]))
+        begin, end = handler.filter_options({'highway': picked})
+        result.append({
+            'highway': picked,
+            'begin_rm': rng.sample(list(begin), min(len(begin), rng.randint(0, 3))),
+            'end_rm': rng.sample(list(end), min(len(end), rng.randint(0, 2))),
+            'displacement1': rng.sample([0, 0.5, 0.7], rng.randint(0, 1)),
+        })
+    return result
+
+
+def test_rm_dtype_matches(backends):
+    handler, store = backends
+    for column in RM_COLUMNS:
+        values = store.get_unique_values(column)
+        assert values == list(handler.get_unique_values(column))
+        assert {kind(v) for v in values} == {kind(v) for v in handler.get_unique_values(column)}
+
+
+def test_filter_options_match(backends):
+    handler, store = backends
+    for filters in selections(handler, 30):
+        expected = handler.filter_options(filters)
+        actual = store.filter_options(filters)
+        assert [list(v) for v in actual] == [list(v) for v in expected], filters
+
+
+def test_filter_data_match(backends):
+    handler, store = backends
+    for filters in selections(handler, 10, seed=1):
+        expected = handler.filter_data(filters)
+        actual = store.filter_data(filters, list(expected.columns))
+        assert len(actual) == len(expected), filters
+        for column in RM_COLUMNS:
+            assert sorted(actual[column]) == sorted(expected[column]), filters
+        assert np.isclose(store.calculate_condition_score(actual), handler.calculate_condition_score(expected))
+
+
+def test_sparse_and_mixed_columns(tmp_path):
+    # columns blank for whole chunks, or numbers in early chunks and text later
+    df = pd.read_csv(app.DATA_PATH, low_memory=False).iloc[:6000]
+    df['NOTE'] = np.where(np.arange(len(df)) < 4000, None, 'x')
+    df['CODE'] = np.where(np.arange(len(df)) < 4000, '7', 'B')
+    df['COUNT'] = np.where(np.arange(len(df)) < 2500, np.nan, 3)
+    path = str(tmp_path / 'pmis.csv')
+    df.to_csv(path, index=False)
+    store = ColumnarStore.for_source(path, chunk_rows=1000)
+    expected = pd.read_csv(path, low_memory=False)
+    actual = store.filter_data({})
+    assert list(actual.columns) == list(expected.columns)
+    for column in ('NOTE', 'CODE', 'COUNT'):
+        assert actual[column].dtype == expected[column].dtype
+        counts = actual[column].value_counts(dropna=False)
+        assert counts.sort_index().equals(expected[column].value_counts(dropna=False).sort_index())
+
+
+@pytest.fixture
+def store_backend(monkeypatch, handler):
+    # the app as PMIS_BACKEND=store starts it, on the test dataset
+    monkeypatch.setattr(app, 'BACKEND', 'store')
+    store = app.load_dataset(app.DATA_PATH)
+    monkeypatch.setattr(app.dataset, '_current', store)
+    return store
+
+
+def test_dashboard_on_store(store_backend, handler):
+    assert isinstance(store_backend, ColumnarStore)
+    assert store_backend.version > handler.version
+    for filters in selections(handler, 15, seed=3):
+        selection = app.canonical_selection(filters.get('highway'), filters.get('begin_rm'),
+                                            filters.get('displacement1'), filters.get('end_rm'), None)
+        expected = app.compute_chart_results(handler, selection)
+        actual = app.compute_chart_results(store_backend, selection)
+        assert (actual['summary'], actual['key_insights']) == (expected['summary'], expected['key_insights'])
+    for highway in handler.get_unique_values('TX_SIGNED_HIGHWAY_RDBD_ID')[:20]:
+        assert store_backend.range_markers(highway) == list(handler.range_markers(highway))
+
+
+def test_routes_on_store(store_backend, handler):
+    client = app.server.test_client()
+    args = MultiDict({'group_by': 'EFF_YEAR', 'metric': 'wmean:TX_CONDITION_SCORE',
+                      'highway': handler.get_unique_values('TX_SIGNED_HIGHWAY_RDBD_ID')[0]})
+    response = client.get('/api/aggregate', query_string=args)
+    assert response.status_code == 200
+    params = app.parse_aggregate_request(args, handler.df)
+    expected = app.columnar_json(handler.aggregate(params['filters'], params['group_by'], params['metrics']))
+    assert response.get_json()['data'] == json.loads(expected)['data']
+    assert client.get('/api/aggregate?metric=p90:TX_RIDE_SCORE').status_code == 400
+    assert client.get('/api/dataset').get_json()['rows'] == len(handler)
+    for method, url in (('get', '/api/data'), ('get', '/api/export'), ('post', '/api/export/jobs'),
+                        ('get', '/api/deterioration'), ('get', '/api/memory')):
+        response = getattr(client, method)(url)
+        assert response.status_code == 501
+        assert 'PMIS_BACKEND=store' in response.get_json()['error']
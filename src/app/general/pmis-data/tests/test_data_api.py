@@ -0,0 +1,12 @@
+import json
+
+import app
+
+
+def test_aggregate_repeated_keys_and_metrics():
+    client = app.server.test_client()
+    repeated = client.get('/api/aggregate?group_by=EFF_YEAR,EFF_YEAR'
+                          '&metric=mean:TX_CONDITION_SCORE,mean:TX_CONDITION_SCORE')
+    single = client.get('/api/aggregate?group_by=EFF_YEAR&metric=mean:TX_CONDITION_SCORE')
+    assert repeated.status_code == 200
+    assert json.loads(repeated.data) == json.loads(single.data)
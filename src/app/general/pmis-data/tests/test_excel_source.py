@@ -0,0 +1,120 @@
+"""read_xlsx on small workbooks, against pd.read_csv and pd.read_excel.
+
+Workbooks written by openpyxl cover shared strings, booleans, dates and
+several sheets; hand-written sheet XML covers what openpyxl never writes
+(inline and rich-text strings, cells without references).
+"""
+import datetime
+import io
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from excel_source import read_xlsx
+
+MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+RELATIONSHIPS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PACKAGE = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+
+def openpyxl_book(path, sheets):
+    book = Workbook()
+    book.remove(book.active)
+    for name, rows in sheets.items():
+        sheet = book.create_sheet(name)
+        for row in rows:
+            sheet.append(row)
+    book.save(path)
+    return path
+
+
+def xml_book(path, sheets):
+    """A workbook holding ``sheets`` ({name: <sheetData> XML}) as written."""
+    entries = ''.join(f'<sheet name="{name}" sheetId="{i}" r:id="rId{i}"/>'
+                      for i, name in enumerate(sheets, 1))
+    targets = ''.join(f'<Relationship Id="rId{i}" Target="worksheets/sheet{i}.xml" '
+                      f'Type="{RELATIONSHIPS}/worksheet"/>' for i in range(1, len(sheets) + 1))
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('xl/workbook.xml', f'<workbook xmlns="{MAIN}" xmlns:r="{RELATIONSHIPS}">'
+                                            f'<sheets>{entries}</sheets></workbook>')
+        archive.writestr('xl/_rels/workbook.xml.rels', f'<Relationships xmlns="{PACKAGE}">{targets}</Relationships>')
+        for i, rows in enumerate(sheets.values(), 1):
+            archive.writestr(f'xl/worksheets/sheet{i}.xml',
+                             f'<worksheet xmlns="{MAIN}"><sheetData>{rows}</sheetData></worksheet>')
+    return path
+
+
+def as_csv(rows):
+    return pd.read_csv(io.StringIO('\n'.join(','.join('' if v is None else str(v) for v in row) for row in rows)))
+
+
+def test_types_match_read_csv(tmp_path):
+    rows = [
+        ('EFF_YEAR', 'TX_BEG_REF_MARKER_NBR', 'TX_RIDE_SCORE', 'HIGHWAY', 'FLAG'),
+        (2020, 598, 3.5, 'IH0040 L', True),
+        (2021, '100A', None, 'IH0040 L', False),
+        (2022, 600, 4.25, 'NA', True),
+    ]
+    df = read_xlsx(openpyxl_book(tmp_path / 'book.xlsx', {'PMIS': rows}))
+    pd.testing.assert_frame_equal(df, as_csv(rows))
+    assert df['TX_BEG_REF_MARKER_NBR'].tolist() == ['598', '100A', '600']
+    assert df['FLAG'].dtype == bool
+
+
+def test_booleans_with_blanks(tmp_path):
+    rows = [('FLAG', 'N'), (True, 1), (None, 2), (False, 3)]
+    df = read_xlsx(openpyxl_book(tmp_path / 'book.xlsx', {'PMIS': rows}))
+    pd.testing.assert_frame_equal(df, as_csv(rows))
+
+
+def test_dates_are_serial_numbers(tmp_path):
+    rows = [('DATE', 'N'), (datetime.datetime(2020, 1, 1), 1), (datetime.datetime(2020, 1, 2, 12), 2)]
+    df = read_xlsx(openpyxl_book(tmp_path / 'book.xlsx', {'PMIS': rows}))
+    assert df['DATE'].tolist() == [43831.0, 43832.5]
+    # the same dates as pd.read_excel gives them, counted from Excel's epoch
+    dates = pd.read_excel(tmp_path / 'book.xlsx')['DATE']
+    assert (pd.Timestamp('1899-12-30') + pd.to_timedelta(df['DATE'], unit='D')).equals(dates)
+
+
+def test_sheets_are_appended(tmp_path):
+    sheets = {
+        '2020': [('EFF_YEAR', 'SCORE'), (2020, 90), (2020, 80)],
+        'notes': [('NOTE',), ('not PMIS data',)],
+        'empty': [],
+        '2021': [('SCORE', 'EFF_YEAR'), (70, 2021)],
+    }
+    with pytest.warns(UserWarning, match="skipping sheet 'notes'"):
+        df = read_xlsx(openpyxl_book(tmp_path / 'book.xlsx', sheets))
+    assert df.to_dict('list') == {'EFF_YEAR': [2020, 2020, 2021], 'SCORE': [90, 80, 70]}
+
+
+def test_inline_strings_and_sparse_cells(tmp_path):
+    rows = (
+        '<row r="1"><c r="A1" t="inlineStr"><is><t>HIGHWAY</t></is></c>'
+        '<c r="B1" t="inlineStr"><is><t>N</t></is></c><c r="D1" t="inlineStr"><is><t>NOTE</t></is></c></row>'
+        '<row r="2"/>'
+        # rich text in runs, a phonetic hint that is not part of the value
+        '<row r="3"><c r="A3" t="inlineStr"><is><r><t>IH0040</t></r><r><t xml:space="preserve"> L</t></r>'
+        '<rPh sb="0" eb="1"><t>hint</t></rPh></is></c><c r="B3"><v>1</v></c></row>'
+        # cells without references follow the previous one; an error is a blank
+        '<row r="5"><c t="inlineStr"><is><t>US0054 K</t></is></c><c><v>2.5</v></c>'
+        '<c t="e"><v>#N/A</v></c><c t="b"><v>1</v></c></row>'
+        '<row r="6"><c r="B6"><v>3</v></c><c r="F6"><v>9</v></c></row>'
+    )
+    df = read_xlsx(xml_book(tmp_path / 'book.xlsx', {'PMIS': rows}))
+    assert list(df.columns) == ['HIGHWAY', 'N', 'Unnamed: 2', 'NOTE']
+    assert df['HIGHWAY'].tolist()[:2] == ['IH0040 L', 'US0054 K']
+    assert np.isnan(df['HIGHWAY'][2])
+    assert df['N'].tolist() == [1.0, 2.5, 3.0]
+    assert df['Unnamed: 2'].isna().all()
+    assert df['NOTE'].tolist()[1] is True
+
+
+def test_chunks_join_like_one_column(tmp_path):
+    # numbers in early chunks and text in a later one: strings throughout
+    rows = [('RM',)] + [(i,) for i in range(10)] + [('100A',)]
+    df = read_xlsx(openpyxl_book(tmp_path / 'book.xlsx', {'PMIS': rows}), chunk_rows=4)
+    pd.testing.assert_frame_equal(df, as_csv(rows))
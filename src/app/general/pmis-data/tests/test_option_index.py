@@ -0,0 +1,38 @@
+"""RM option lists from the option index against the matching rows."""
+import random
+
+import numpy as np
+
+
+def row_options(handler, filters):
+    rows = handler.filter_data(filters)
+    return (sorted(rows['TX_BEG_REF_MARKER_NBR'].unique()), sorted(rows['TX_END_REF_MARKER_NBR'].unique()))
+
+
+def test_options_match_rows(handler):
+    rng = random.Random(0)
+    highways = list(handler.get_unique_values('TX_SIGNED_HIGHWAY_RDBD_ID'))
+    for _ in range(100):
+        highway = rng.choice(highways)
+        begin, end = handler.filter_options({'highway': [highway]})
+        filters = {
+            'highway': [highway],
+            'begin_rm': rng.sample(list(begin), min(len(begin), rng.randint(0, 3))),
+            'end_rm': rng.sample(list(end), min(len(end), rng.randint(0, 3))),
+            'displacement1': rng.sample([0, 0.5, 0.7], rng.randint(0, 1)),
+            'displacement2': rng.sample([0, 0.5, 0.7], rng.randint(0, 1)),
+        }
+        assert handler.option_index.options(filters) == row_options(handler, filters), filters
+
+
+def test_unindexed_filters_fall_back(handler):
+    highway = handler.get_unique_values('TX_SIGNED_HIGHWAY_RDBD_ID')[0]
+    years = handler.get_unique_values('EFF_YEAR')
+    for filters in ({'highway': [highway], 'year': [1800]}, {'highway': [highway], 'year': [int(years[-1])]},
+                    {'highway': [highway], 'rm_range': [0, 10]}, {'displacement1': [0.3]}):
+        assert handler.option_index.options(filters) is NotImplemented, filters
+        assert handler.filter_options(filters) == row_options(handler, filters), filters
+    assert handler.filter_options({'highway': [highway], 'year': [1800]}) == ([], [])
+    assert handler.option_index.options({'highway': [highway], 'year': 'all'}) is not NotImplemented
+    assert np.array_equal(handler.option_index.options({'highway': [highway], 'year': []})[0],
+                          handler.option_index.options({'highway': [highway]})[0])
@@ -0,0 +1,23 @@
+from result_cache import ResultCache
+
+
+def test_cached_none_is_a_hit():
+    cache = ResultCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return None
+
+    assert cache.get_or_compute(1, 'key', compute) is None
+    assert cache.get_or_compute(1, 'key', compute) is None
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_get_default():
+    cache = ResultCache()
+    marker = object()
+    assert cache.get(1, 'key', marker) is marker
+    cache.put(1, 'key', None)
+    assert cache.get(1, 'key', marker) is None
@@ -0,0 +1,158 @@
+"""Web Mercator tile math and a minimal Mapbox Vector Tile (MVT 2.1) encoder.
+
+Only the parts /api/segments/tiles needs: one layer per tile; point,
+line and polygon features; and string, number and bool properties. The
+protobuf messages are written by hand, so no protobuf library is required.
+Coordinates are integers in the tile's ``extent`` grid, y pointing down.
+"""
+import math
+
+import numpy as np
+
+EXTENT = 4096
+MAX_LATITUDE = 85.0511287798
+
+POINT, LINESTRING, POLYGON = 1, 2, 3
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+
+
+def tile_bounds(z, x, y):
+    """(min_lon, min_lat, max_lon, max_lat) of tile z/x/y."""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return (x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y))
+
+
+def to_tile(coords, z, x, y, extent=EXTENT):
+    """Project lon/lat ``coords`` (n x 2) into tile z/x/y as float grid units."""
+    n = 2 ** z
+    lat = np.radians(np.clip(coords[:, 1], -MAX_LATITUDE, MAX_LATITUDE))
+    world_x = (coords[:, 0] + 180) / 360 * n
+    world_y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / math.pi) / 2 * n
+    return np.column_stack(((world_x - x) * extent, (world_y - y) * extent))
+
+
+def _varint(value, out):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(number, wire_type, out):
+    _varint((number << 3) | wire_type, out)
+
+
+def _embedded(number, payload, out):
+    _key(number, 2, out)
+    _varint(len(payload), out)
+    out.extend(payload)
+
+
+def _packed(number, values, out):
+    payload = bytearray()
+    for value in values:
+        _varint(value, payload)
+    _embedded(number, payload, out)
+
+
+def _command(command_id, count):
+    return (command_id & 0x7) | (count << 3)
+
+
+def ring_area(ring):
+    """Twice the signed area; positive for the MVT exterior winding (y down)."""
+    x, y = ring[:, 0], ring[:, 1]
+    return float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+
+def encode_geometry(geom_type, parts):
+    """Command stream for integer ``parts``.
+
+    Points come as one n x 2 array. Lines and polygons come as a list of
+    arrays; polygon rings are open (no repeated first point) and already
+    wound exterior-positive, holes negative.
+    """
+    commands = []
+    cursor = [0, 0]
+
+    def add_points(points):
+        for px, py in points.tolist():
+            commands.append(_zigzag(px - cursor[0]))
+            commands.append(_zigzag(py - cursor[1]))
+            cursor[0], cursor[1] = px, py
+
+    if geom_type == POINT:
+        commands.append(_command(MOVE_TO, len(parts)))
+        add_points(parts)
+        return commands
+    for part in parts:
+        commands.append(_command(MOVE_TO, 1))
+        add_points(part[:1])
+        commands.append(_command(LINE_TO, len(part) - 1))
+        add_points(part[1:])
+        if geom_type == POLYGON:
+            commands.append(_command(CLOSE_PATH, 1))
+    return commands
+
+
+def _value(value):
+    out = bytearray()
+    if isinstance(value, bool):
+        _key(7, 0, out)
+        _varint(int(value), out)
+    elif isinstance(value, int):
+        _key(6, 0, out)
+        _varint(_zigzag(value) & 0xffffffffffffffff, out)
+    elif isinstance(value, float):
+        _key(3, 1, out)
+        out.extend(np.float64(value).tobytes())
+    else:
+        _embedded(1, str(value).encode('utf-8'), out)
+    return bytes(out)
+
+
+def encode_tile(layer_name, features, extent=EXTENT):
+    """Encode ``features`` as a one-layer tile.
+
+    Each feature is ``(id, geom_type, geometry_commands, properties)``;
+    properties whose value is None are left out.
+    """
+    keys, values = {}, {}
+    layer = bytearray()
+    _key(15, 0, layer)
+    _varint(2, layer)
+    _embedded(1, layer_name.encode('utf-8'), layer)
+    for feature_id, geom_type, geometry, properties in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault(_value(value), len(values)))
+        feature = bytearray()
+        _key(1, 0, feature)
+        _varint(feature_id, feature)
+        if tags:
+            _packed(2, tags, feature)
+        _key(3, 0, feature)
+        _varint(geom_type, feature)
+        _packed(4, geometry, feature)
+        _embedded(2, feature, layer)
+    for key in keys:
+        _embedded(3, key.encode('utf-8'), layer)
+    for value in values:
+        _embedded(4, value, layer)
+    _key(5, 0, layer)
+    _varint(extent, layer)
+
+    tile = bytearray()
+    _embedded(3, layer, tile)
+    return bytes(tile)